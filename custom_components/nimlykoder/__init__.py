@@ -2,7 +2,6 @@
 from __future__ import annotations
 
 import logging
-from datetime import date, timedelta
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant, callback
@@ -19,15 +18,42 @@ from .const import (
     CONF_RESERVED_SLOTS,
     CONF_AUTO_EXPIRE,
     CONF_CLEANUP_TIME,
+    CONF_CLEANUP_WINDOW,
     CONF_OVERWRITE_PROTECTION,
+    CONF_SAVE_DELAY,
+    CONF_COMMAND_SPACING,
+    CONF_MAX_IN_FLIGHT,
+    CONF_ACK_TIMEOUT,
     DEFAULT_SLOT_MIN,
     DEFAULT_SLOT_MAX,
     DEFAULT_RESERVED_SLOTS,
     DEFAULT_AUTO_EXPIRE,
     DEFAULT_CLEANUP_TIME,
+    DEFAULT_CLEANUP_WINDOW,
     DEFAULT_OVERWRITE_PROTECTION,
+    DEFAULT_SAVE_DELAY,
+    DEFAULT_COMMAND_SPACING,
+    DEFAULT_MAX_IN_FLIGHT,
+    DEFAULT_ACK_TIMEOUT,
+    STORAGE_KEY,
+    STORAGE_VERSION,
+    OUTBOX_STORAGE_KEY,
+    OUTBOX_STORAGE_VERSION,
+    JOURNAL_STORAGE_KEY,
+    JOURNAL_STORAGE_VERSION,
+    DATA_CLEANUP_LIMITER,
+    DATA_TRANSLATIONS,
 )
-from .storage import NimlykoderStorage
+from .cleanup import async_cleanup_expired, cleanup_offset, get_cleanup_limiter
+from .storage import NimlykoderStorage, async_migrate_store
+from .allocator import SlotAllocator
+from .scheduler import ExpiryScheduler
+from .outbox import NimlykoderOutbox
+from .reconcile import LockReconciler
+from .journal import IntentJournal
+from .feed import CodeFeed
+from .localization import async_load_panel_translations
+from .manager import CodeManager
 from .adapters.mqtt_z2m import MqttZ2mAdapter
 from .services import async_setup_services, async_unload_services
 from .websocket import async_register_websocket_handlers
@@ -36,6 +62,11 @@ from .panel import async_register_panel, async_unregister_panel
 _LOGGER = logging.getLogger(__name__)
 
 
+def _entry_key(key: str, entry_id: str) -> str:
+    """Return the storage key of a lock's file."""
+    return f"{key}.{entry_id}"
+
+
 def _get_mqtt_topic_from_entity(hass: HomeAssistant, entity_id: str) -> str | None:
     """Derive MQTT topic from a lock entity ID.
     
@@ -203,9 +234,18 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         CONF_RESERVED_SLOTS: options.get(CONF_RESERVED_SLOTS, DEFAULT_RESERVED_SLOTS),
         CONF_AUTO_EXPIRE: options.get(CONF_AUTO_EXPIRE, DEFAULT_AUTO_EXPIRE),
         CONF_CLEANUP_TIME: options.get(CONF_CLEANUP_TIME, DEFAULT_CLEANUP_TIME),
+        CONF_CLEANUP_WINDOW: int(
+            options.get(CONF_CLEANUP_WINDOW, DEFAULT_CLEANUP_WINDOW)
+        ),
         CONF_OVERWRITE_PROTECTION: options.get(
             CONF_OVERWRITE_PROTECTION, DEFAULT_OVERWRITE_PROTECTION
         ),
+        CONF_SAVE_DELAY: float(options.get(CONF_SAVE_DELAY, DEFAULT_SAVE_DELAY)),
+        CONF_COMMAND_SPACING: float(
+            options.get(CONF_COMMAND_SPACING, DEFAULT_COMMAND_SPACING)
+        ),
+        CONF_MAX_IN_FLIGHT: int(options.get(CONF_MAX_IN_FLIGHT, DEFAULT_MAX_IN_FLIGHT)),
+        CONF_ACK_TIMEOUT: float(options.get(CONF_ACK_TIMEOUT, DEFAULT_ACK_TIMEOUT)),
     }
     
     _LOGGER.info(
@@ -216,15 +256,67 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         config[CONF_AUTO_EXPIRE],
     )
 
+    # Entries created before multi-lock support used the domain as unique id
+    # and unsuffixed storage files; move those files over to this entry
+    if entry.unique_id == DOMAIN:
+        for version, key in (
+            (STORAGE_VERSION, STORAGE_KEY),
+            (OUTBOX_STORAGE_VERSION, OUTBOX_STORAGE_KEY),
+            (JOURNAL_STORAGE_VERSION, JOURNAL_STORAGE_KEY),
+        ):
+            await async_migrate_store(
+                hass, version, key, _entry_key(key, entry.entry_id)
+            )
+        hass.config_entries.async_update_entry(
+            entry, unique_id=lock_entity or mqtt_topic
+        )
+
     # Initialize storage
     _LOGGER.debug("[async_setup_entry] Initializing storage...")
-    storage = NimlykoderStorage(hass)
+    storage = NimlykoderStorage(
+        hass, config[CONF_SAVE_DELAY], _entry_key(STORAGE_KEY, entry.entry_id)
+    )
     await storage.async_load()
     _LOGGER.info("[async_setup_entry] Storage loaded with %d entries", len(storage.list_entries()))
 
+    # Intents of lock changes, written before each command is sent
+    journal = IntentJournal(
+        hass, storage, _entry_key(JOURNAL_STORAGE_KEY, entry.entry_id)
+    )
+    await journal.async_load()
+
+    # Build the free-slot allocator and keep it in sync with storage
+    allocator = SlotAllocator(
+        config[CONF_SLOT_MIN],
+        config[CONF_SLOT_MAX],
+        config[CONF_RESERVED_SLOTS],
+        storage.occupied_slots(),
+    )
+    allocator_unsub = storage.async_add_listener(allocator.async_storage_changed)
+    _LOGGER.debug(
+        "[async_setup_entry] Slot allocator ready with %d free slots",
+        allocator.free_count,
+    )
+
     # Initialize MQTT adapter
     _LOGGER.debug("[async_setup_entry] Initializing MQTT adapter...")
-    mqtt_adapter = MqttZ2mAdapter(hass, config[CONF_MQTT_TOPIC])
+    mqtt_adapter = MqttZ2mAdapter(
+        hass,
+        config[CONF_MQTT_TOPIC],
+        config[CONF_COMMAND_SPACING],
+        config[CONF_MAX_IN_FLIGHT],
+        config[CONF_ACK_TIMEOUT],
+    )
+
+    # Commands that fail or go unconfirmed are retried from a durable outbox
+    outbox = NimlykoderOutbox(
+        hass,
+        mqtt_adapter.async_deliver,
+        lambda: mqtt_adapter.available,
+        _entry_key(OUTBOX_STORAGE_KEY, entry.entry_id),
+    )
+    await outbox.async_load()
+    mqtt_adapter.outbox = outbox
 
     # Verify MQTT is available
     mqtt_available = await mqtt_adapter.verify_connection()
@@ -236,31 +328,84 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         )
     else:
         _LOGGER.info("[async_setup_entry] MQTT connection verified successfully")
+    # Listen on the lock's state and availability topics, as soon as MQTT is up
+    await mqtt_adapter.async_start()
+
+    # Services and WebSocket commands share one validate/allocate/send/store path
+    manager = CodeManager(
+        hass, storage, allocator, mqtt_adapter, journal, config, entry.entry_id
+    )
 
-    # Store data
-    hass.data.setdefault(DOMAIN, {})
-    hass.data[DOMAIN] = {
+    # Compares the lock's user table with storage, a few slots at a time
+    reconciler = LockReconciler(
+        hass,
+        storage,
+        mqtt_adapter,
+        outbox,
+        manager,
+        config[CONF_SLOT_MIN],
+        config[CONF_SLOT_MAX],
+        config[CONF_RESERVED_SLOTS],
+    )
+
+    # Pushes code changes, cleanups and availability to panel subscriptions
+    feed = CodeFeed(hass, entry.entry_id, storage, mqtt_adapter, outbox)
+    feed.async_start()
+
+    # Finish or undo changes a crash interrupted between the lock and storage;
+    # in the background, as it may wait on the lock. Operations wait for it.
+    manager.async_start_recovery(entry)
+
+    # Store data; every lock has its own storage, adapter, queue and schedulers
+    locks = hass.data.setdefault(DOMAIN, {})
+    locks[entry.entry_id] = data = {
         "storage": storage,
+        "allocator": allocator,
         "mqtt_adapter": mqtt_adapter,
+        "outbox": outbox,
+        "reconciler": reconciler,
+        "manager": manager,
+        "journal": journal,
+        "feed": feed,
         "config": config,
         "entry": entry,
         "cleanup_unsub": None,
+        "allocator_unsub": allocator_unsub,
+        "expiry_scheduler": None,
     }
 
-    # Register services
-    _LOGGER.debug("[async_setup_entry] Registering services...")
-    await async_setup_services(hass)
-
-    # Register WebSocket handlers
-    async_register_websocket_handlers(hass)
-
-    # Register panel
-    await async_register_panel(hass)
-
-    # Set up scheduler for expired code cleanup
+    # Services, WebSocket commands and the panel are shared by all locks and
+    # set up with the first one
+    if len(locks) == 1:
+        await async_load_panel_translations(hass)
+        _LOGGER.debug("[async_setup_entry] Registering services...")
+        await async_setup_services(hass)
+        async_register_websocket_handlers(hass)
+        await async_register_panel(hass)
+
+    # Set up schedulers for expired code cleanup: a timer for the next expiry,
+    # plus the daily sweep as a backstop. Both are spread over the cleanup
+    # window by the same per-lock offset
     if config[CONF_AUTO_EXPIRE]:
-        unsub = await async_setup_cleanup_scheduler(hass, config[CONF_CLEANUP_TIME])
-        hass.data[DOMAIN]["cleanup_unsub"] = unsub
+        scheduler = ExpiryScheduler(
+            hass,
+            storage,
+            lambda: _async_cleanup_expired_codes(hass, entry.entry_id),
+            offset=cleanup_offset(entry.entry_id, config[CONF_CLEANUP_WINDOW]),
+            jitter=get_cleanup_limiter(hass).jitter,
+        )
+        scheduler.async_start()
+        data["expiry_scheduler"] = scheduler
+        data["cleanup_unsub"] = await async_setup_cleanup_scheduler(
+            hass,
+            entry.entry_id,
+            config[CONF_CLEANUP_TIME],
+            config[CONF_CLEANUP_WINDOW],
+        )
+
+    # Start retrying commands left over from before a restart
+    outbox.async_start()
+    reconciler.async_start()
 
     # Listen for options updates
     entry.async_on_unload(entry.add_update_listener(async_update_options))
@@ -272,18 +417,30 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     # Cancel cleanup scheduler
-    data = hass.data.get(DOMAIN)
+    locks = hass.data.get(DOMAIN, {})
+    data = locks.pop(entry.entry_id, None)
     if data and data.get("cleanup_unsub"):
         data["cleanup_unsub"]()
-
-    # Unregister services
-    await async_unload_services(hass)
-
-    # Unregister panel
-    await async_unregister_panel(hass)
-
-    # Clean up data
-    hass.data.pop(DOMAIN, None)
+    if data and data.get("expiry_scheduler"):
+        data["expiry_scheduler"].async_stop()
+
+    # Write any coalesced changes before the storage object goes away
+    if data:
+        data["reconciler"].async_stop()
+        data["feed"].async_stop()
+        data["outbox"].async_stop()
+        data["mqtt_adapter"].async_stop()
+        data["allocator_unsub"]()
+        await data["storage"].async_flush()
+        await data["journal"].async_flush()
+
+    # Shared services and panel go with the last lock
+    if not locks:
+        await async_unload_services(hass)
+        await async_unregister_panel(hass)
+        hass.data.pop(DOMAIN, None)
+        hass.data.pop(DATA_CLEANUP_LIMITER, None)
+        hass.data.pop(DATA_TRANSLATIONS, None)
 
     _LOGGER.info("Nimlykoder integration unloaded")
     return True
@@ -294,19 +451,34 @@ async def async_update_options(hass: HomeAssistant, entry: ConfigEntry) -> None:
     await hass.config_entries.async_reload(entry.entry_id)
 
 
-async def async_setup_cleanup_scheduler(hass: HomeAssistant, cleanup_time: str):
-    """Set up daily cleanup scheduler. Returns unsub function."""
+async def async_setup_cleanup_scheduler(
+    hass: HomeAssistant, entry_id: str, cleanup_time: str, window: int = 0
+):
+    """Set up daily cleanup scheduler for one lock. Returns unsub function.
+
+    The sweep runs at a fixed offset of up to `window` seconds after the
+    cleanup time, so locks sharing a cleanup time do not all start at once.
+    """
     try:
         # Parse cleanup time (format: HH:MM:SS)
         time_parts = cleanup_time.split(":")
-        hour = int(time_parts[0])
-        minute = int(time_parts[1]) if len(time_parts) > 1 else 0
-        second = int(time_parts[2]) if len(time_parts) > 2 else 0
+        start = (
+            int(time_parts[0]) * 3600
+            + (int(time_parts[1]) * 60 if len(time_parts) > 1 else 0)
+            + (int(time_parts[2]) if len(time_parts) > 2 else 0)
+            + cleanup_offset(entry_id, window)
+        ) % 86400
+        hour, minute, second = start // 3600, start % 3600 // 60, start % 60
 
         @callback
         def cleanup_expired_codes(now):
             """Clean up expired guest codes."""
-            hass.async_create_task(_async_cleanup_expired_codes(hass))
+            data = hass.data.get(DOMAIN, {}).get(entry_id) or {}
+            if scheduler := data.get("expiry_scheduler"):
+                # Run through the scheduler so the sweep never overlaps a timed run
+                hass.async_create_task(scheduler.async_run())
+            else:
+                hass.async_create_task(_async_cleanup_expired_codes(hass, entry_id))
 
         # Schedule daily cleanup
         unsub = async_track_time_change(
@@ -314,8 +486,9 @@ async def async_setup_cleanup_scheduler(hass: HomeAssistant, cleanup_time: str):
         )
 
         _LOGGER.info(
-            "Scheduled daily expired code cleanup at %02d:%02d:%02d",
-            hour, minute, second
+            "Scheduled daily expired code cleanup at %02d:%02d:%02d "
+            "(%s, window %ds)",
+            hour, minute, second, entry_id, window
         )
         return unsub
 
@@ -324,10 +497,10 @@ async def async_setup_cleanup_scheduler(hass: HomeAssistant, cleanup_time: str):
         return None
 
 
-async def _async_cleanup_expired_codes(hass: HomeAssistant) -> None:
-    """Clean up expired guest codes."""
+async def _async_cleanup_expired_codes(hass: HomeAssistant, entry_id: str) -> None:
+    """Clean up expired guest codes on one lock."""
     try:
-        data = hass.data.get(DOMAIN)
+        data = hass.data.get(DOMAIN, {}).get(entry_id)
         if not data:
             _LOGGER.warning("Nimlykoder data not available for cleanup")
             return
@@ -337,42 +510,7 @@ async def _async_cleanup_expired_codes(hass: HomeAssistant) -> None:
             _LOGGER.debug("Auto-expire is disabled, skipping cleanup")
             return
 
-        storage = data["storage"]
-        mqtt_adapter = data["mqtt_adapter"]
-
-        today = date.today()
-        expired_slots = storage.expired_guest_slots(today)
-
-        if not expired_slots:
-            _LOGGER.debug("No expired guest codes to clean up")
-            return
-
-        _LOGGER.info("Starting cleanup of %d expired guest codes", len(expired_slots))
-        removed_count = 0
-
-        for slot in expired_slots:
-            try:
-                entry = storage.get(slot)
-                name = entry.name if entry else f"Slot {slot}"
-                
-                # Remove from MQTT/lock
-                await mqtt_adapter.remove_code(slot)
-                # Remove from storage
-                await storage.remove(slot)
-                
-                _LOGGER.info(
-                    "Removed expired code '%s' from slot %s", name, slot
-                )
-                removed_count += 1
-            except Exception as err:
-                _LOGGER.error(
-                    "Failed to remove expired code from slot %s: %s", slot, err
-                )
-
-        _LOGGER.info(
-            "Cleanup completed: removed %d of %d expired codes",
-            removed_count, len(expired_slots)
-        )
+        await async_cleanup_expired(hass, data)
 
     except Exception as err:
         _LOGGER.error("Error during cleanup: %s", err)
@@ -0,0 +1,131 @@
+"""Cached reachability of a lock through MQTT and Zigbee2MQTT."""
+from __future__ import annotations
+
+from collections.abc import Callable
+import json
+import logging
+from typing import Any
+
+from homeassistant.core import callback
+from homeassistant.util import dt as dt_util
+
+_LOGGER = logging.getLogger(__name__)
+
+# Called with the new availability whenever it flips
+AvailabilityListener = Callable[[bool], None]
+
+
+def parse_availability(payload: str | bytes | dict[str, Any]) -> bool | None:
+    """Parse a Z2M `<device>/availability` payload.
+
+    Zigbee2MQTT publishes either a bare `online`/`offline` string (legacy)
+    or `{"state": "online"}`. Returns None for anything else.
+    """
+    if isinstance(payload, bytes):
+        payload = payload.decode(errors="ignore")
+    if isinstance(payload, str):
+        state = payload.strip()
+        if state.startswith("{"):
+            try:
+                payload = json.loads(state)
+            except ValueError:
+                return None
+        else:
+            payload = {"state": state}
+    if not isinstance(payload, dict):
+        return None
+    state = payload.get("state")
+    if state == "online":
+        return True
+    if state == "offline":
+        return False
+    return None
+
+
+class LockAvailability:
+    """Broker connectivity and Z2M device availability in one place.
+
+    Both inputs are pushed to this object by subscriptions, so reading it is
+    free. A lock whose availability has not been reported yet (Z2M
+    availability is optional) counts as online as long as the broker is
+    connected.
+    """
+
+    def __init__(self, name: str) -> None:
+        """Initialize the state.
+
+        Args:
+            name: Name used in logs, usually the lock topic
+        """
+        self.name = name
+        self.broker_connected = False
+        self.lock_online: bool | None = None
+        self.changed_at = dt_util.utcnow()
+        self._listeners: list[AvailabilityListener] = []
+
+    @property
+    def available(self) -> bool:
+        """Return True if commands can reach the lock."""
+        return self.broker_connected and self.lock_online is not False
+
+    @callback
+    def async_add_listener(self, listener: AvailabilityListener) -> Callable[[], None]:
+        """Listen for availability changes. Returns a function that removes the listener."""
+        self._listeners.append(listener)
+
+        @callback
+        def remove_listener() -> None:
+            self._listeners.remove(listener)
+
+        return remove_listener
+
+    @callback
+    def async_set_broker(self, connected: bool) -> None:
+        """Record the MQTT broker connection state."""
+        self._async_update(broker_connected=connected)
+
+    @callback
+    def async_set_lock(self, payload: str | bytes | dict[str, Any]) -> None:
+        """Record a Z2M availability message for the lock."""
+        online = parse_availability(payload)
+        if online is None:
+            _LOGGER.debug(
+                "[LockAvailability] %s: ignoring availability payload %r",
+                self.name,
+                payload,
+            )
+            return
+        self._async_update(lock_online=online)
+
+    @callback
+    def _async_update(self, **changes: Any) -> None:
+        """Apply changes and notify listeners if availability flipped."""
+        was_available = self.available
+        for key, value in changes.items():
+            setattr(self, key, value)
+        if self.available == was_available:
+            return
+        self.changed_at = dt_util.utcnow()
+        _LOGGER.info(
+            "[LockAvailability] %s is now %s (broker_connected=%s, lock_online=%s)",
+            self.name,
+            "available" if self.available else "unavailable",
+            self.broker_connected,
+            self.lock_online,
+        )
+        for listener in list(self._listeners):
+            try:
+                listener(self.available)
+            except Exception:
+                _LOGGER.exception(
+                    "[LockAvailability] %s: listener failed", self.name
+                )
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the state as a dictionary."""
+        return {
+            "available": self.available,
+            "broker_connected": self.broker_connected,
+            "lock_online": self.lock_online,
+            "changed_at": self.changed_at.isoformat(),
+        }
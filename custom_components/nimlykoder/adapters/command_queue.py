@@ -0,0 +1,286 @@
+"""Paced command queue for a single lock."""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+import logging
+import time
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
+
+from .congestion import AimdController
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class LockCommand:
+    """A command waiting to be sent to the lock."""
+
+    slot: int
+    action: str
+    payload: dict[str, Any]
+    future: asyncio.Future = field(repr=False)
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class TimingStat:
+    """Running count/total/max of a duration in seconds."""
+
+    __slots__ = ("count", "total", "max", "last")
+
+    def __init__(self) -> None:
+        """Initialize the stat."""
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def record(self, value: float) -> None:
+        """Record a sample."""
+        self.count += 1
+        self.total += value
+        self.last = value
+        if value > self.max:
+            self.max = value
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the stat as a dictionary."""
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 4) if self.count else None,
+            "max": round(self.max, 4),
+            "last": round(self.last, 4),
+        }
+
+
+class CommandQueue:
+    """FIFO queue that paces commands to one lock.
+
+    Commands are sent in submission order, at least `spacing` seconds apart,
+    with no more than `max_in_flight` outstanding at once, or fewer when an
+    AimdController is attached. A command never starts while an earlier
+    command for the same slot is still in flight, so per-slot ordering holds
+    regardless of the in-flight limit.
+
+    While the queue is held (the lock is unreachable) commands accumulate
+    without being sent; releasing it sends them as one paced burst.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        name: str,
+        send: Callable[[LockCommand], Awaitable[Any]],
+        spacing: float,
+        max_in_flight: int,
+        controller: AimdController | None = None,
+    ) -> None:
+        """Initialize the queue.
+
+        Args:
+            hass: Home Assistant instance
+            name: Name used in logs and task names, usually the lock topic
+            send: Coroutine function that delivers one command
+            spacing: Minimum seconds between the start of two commands
+            max_in_flight: Maximum commands outstanding at once
+            controller: Optional adaptive limit below max_in_flight
+        """
+        self.hass = hass
+        self.name = name
+        self._send = send
+        self.spacing = spacing
+        self.max_in_flight = max(1, max_in_flight)
+        self.controller = controller
+        self._pending: deque[LockCommand] = deque()
+        self._wakeup = asyncio.Event()
+        self._slot_free = asyncio.Event()
+        # Set while sends are allowed; cleared by async_hold()
+        self._open = asyncio.Event()
+        self._open.set()
+        self._held_since: float | None = None
+        self._holds = 0
+        self._hold_time = TimingStat()
+        self._in_flight: dict[int, asyncio.Task] = {}
+        self._worker: asyncio.Task | None = None
+        self._last_dispatch = 0.0
+        self._wait_time = TimingStat()
+        self._send_time = TimingStat()
+        self._failures = 0
+
+    @property
+    def depth(self) -> int:
+        """Return the number of commands waiting to be sent."""
+        return len(self._pending)
+
+    @property
+    def capacity(self) -> int:
+        """Return how many commands may be in flight right now."""
+        if self.controller is None:
+            return self.max_in_flight
+        return min(self.max_in_flight, self.controller.allowed)
+
+    @property
+    def held(self) -> bool:
+        """Return True if sends are being held."""
+        return not self._open.is_set()
+
+    @property
+    def in_flight(self) -> int:
+        """Return the number of commands currently being sent."""
+        return len(self._in_flight)
+
+    async def async_submit(
+        self, slot: int, action: str, payload: dict[str, Any]
+    ) -> Any:
+        """Queue a command and wait for it to be sent.
+
+        Returns whatever the send function returns and raises what it raises.
+        """
+        self._ensure_worker()
+        command = LockCommand(
+            slot=slot,
+            action=action,
+            payload=payload,
+            future=self.hass.loop.create_future(),
+        )
+        self._pending.append(command)
+        self._wakeup.set()
+        _LOGGER.debug(
+            "[CommandQueue] %s: queued %s for slot %d (depth=%d)",
+            self.name,
+            action,
+            slot,
+            len(self._pending),
+        )
+        return await command.future
+
+    @callback
+    def async_hold(self) -> None:
+        """Stop sending; queued and new commands wait until released."""
+        if self.held:
+            return
+        self._open.clear()
+        self._held_since = time.monotonic()
+        self._holds += 1
+        _LOGGER.info("[CommandQueue] %s: holding sends", self.name)
+
+    @callback
+    def async_release(self) -> None:
+        """Resume sending, starting with everything held."""
+        if not self.held:
+            return
+        self._open.set()
+        if self._held_since is not None:
+            self._hold_time.record(time.monotonic() - self._held_since)
+            self._held_since = None
+        _LOGGER.info(
+            "[CommandQueue] %s: releasing %d held commands",
+            self.name,
+            len(self._pending),
+        )
+
+    @callback
+    def async_stop(self) -> None:
+        """Stop the worker and fail every command still waiting."""
+        if self._worker:
+            self._worker.cancel()
+            self._worker = None
+        for task in list(self._in_flight.values()):
+            task.cancel()
+        while self._pending:
+            command = self._pending.popleft()
+            if not command.future.done():
+                command.future.set_exception(
+                    HomeAssistantError("Lock command queue stopped")
+                )
+
+    def metrics(self) -> dict[str, Any]:
+        """Return queue metrics."""
+        return {
+            "depth": self.depth,
+            "in_flight": self.in_flight,
+            "spacing": self.spacing,
+            "max_in_flight": self.max_in_flight,
+            "capacity": self.capacity,
+            "held": self.held,
+            "holds": self._holds,
+            "hold_time": self._hold_time.as_dict(),
+            "failures": self._failures,
+            "wait_time": self._wait_time.as_dict(),
+            "send_time": self._send_time.as_dict(),
+        }
+
+    @callback
+    def _ensure_worker(self) -> None:
+        """Start the worker task if it is not running."""
+        if self._worker is None or self._worker.done():
+            self._worker = self.hass.async_create_background_task(
+                self._async_worker(), f"nimlykoder command queue {self.name}"
+            )
+
+    async def _async_worker(self) -> None:
+        """Dispatch queued commands, respecting spacing and limits."""
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            # Wait while the lock is unreachable
+            if not self._open.is_set():
+                await self._open.wait()
+                continue
+
+            # Respect the in-flight limit and per-slot ordering
+            command = self._pending[0]
+            while (
+                len(self._in_flight) >= self.capacity
+                or command.slot in self._in_flight
+            ):
+                self._slot_free.clear()
+                await self._slot_free.wait()
+
+            # Pace consecutive sends
+            delay = self._last_dispatch + self.spacing - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            # The lock may have gone away while we waited
+            if not self._open.is_set():
+                continue
+
+            self._pending.popleft()
+            self._last_dispatch = time.monotonic()
+            self._wait_time.record(self._last_dispatch - command.enqueued_at)
+            self._in_flight[command.slot] = self.hass.async_create_background_task(
+                self._async_dispatch(command),
+                f"nimlykoder command {self.name} slot {command.slot}",
+            )
+
+    async def _async_dispatch(self, command: LockCommand) -> None:
+        """Send one command and resolve its future."""
+        started = time.monotonic()
+        try:
+            result = await self._send(command)
+        except asyncio.CancelledError:
+            if not command.future.done():
+                command.future.set_exception(
+                    HomeAssistantError("Lock command queue stopped")
+                )
+            raise
+        except Exception as err:
+            self._failures += 1
+            if not command.future.done():
+                command.future.set_exception(err)
+        else:
+            if not command.future.done():
+                command.future.set_result(result)
+        finally:
+            self._send_time.record(time.monotonic() - started)
+            self._in_flight.pop(command.slot, None)
+            self._slot_free.set()
@@ -0,0 +1,109 @@
+"""Adaptive concurrency control for lock commands."""
+from __future__ import annotations
+
+from collections import deque
+import logging
+import math
+from typing import Any
+
+_LOGGER = logging.getLogger(__name__)
+
+# Number of recent confirmation latencies kept for percentiles
+LATENCY_WINDOW = 50
+
+# Fraction of the ack timeout below which a confirmation counts as fast,
+# and above which it counts as slow
+FAST_FRACTION = 0.25
+SLOW_FRACTION = 0.5
+
+# Multiplicative decrease factors
+TIMEOUT_BACKOFF = 0.5
+SLOW_BACKOFF = 0.75
+
+
+def _percentile(ordered: list[float], fraction: float) -> float | None:
+    """Return the nearest-rank percentile of an ordered list."""
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+class AimdController:
+    """Additive-increase/multiplicative-decrease limit on commands in flight.
+
+    Each fast confirmation grows the limit by 1/limit, so it rises by about
+    one per round of confirmations. A timeout halves it and a slow
+    confirmation trims it. The limit never drops below one command or goes
+    above the configured ceiling.
+    """
+
+    def __init__(self, name: str, max_limit: int, ack_timeout: float) -> None:
+        """Initialize the controller.
+
+        Args:
+            name: Name used in logs, usually the lock topic
+            max_limit: Ceiling for commands in flight
+            ack_timeout: Confirmation timeout the latency thresholds scale from
+        """
+        self.name = name
+        self.max_limit = max(1, max_limit)
+        self._fast = ack_timeout * FAST_FRACTION
+        self._slow = ack_timeout * SLOW_FRACTION
+        self._limit = 1.0
+        self._latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._increases = 0
+        self._decreases = 0
+
+    @property
+    def allowed(self) -> int:
+        """Return the number of commands currently allowed in flight."""
+        return int(self._limit)
+
+    def on_confirmed(self, latency: float) -> None:
+        """Record a confirmed command and adjust the limit."""
+        self._latencies.append(latency)
+        if latency <= self._fast:
+            if self._limit < self.max_limit:
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+                self._increases += 1
+        elif latency > self._slow:
+            self._decrease(SLOW_BACKOFF, "slow confirmation")
+
+    def on_timeout(self) -> None:
+        """Record an unconfirmed command and cut the limit."""
+        self._decrease(TIMEOUT_BACKOFF, "timeout")
+
+    def _decrease(self, factor: float, reason: str) -> None:
+        """Multiplicatively decrease the limit."""
+        limit = max(1.0, self._limit * factor)
+        if limit < self._limit:
+            self._decreases += 1
+            _LOGGER.debug(
+                "[AimdController] %s: %s, limit %.2f -> %.2f",
+                self.name,
+                reason,
+                self._limit,
+                limit,
+            )
+        self._limit = limit
+
+    def percentiles(self) -> dict[str, float | None]:
+        """Return p50/p95 of recent confirmation latencies in seconds."""
+        ordered = sorted(self._latencies)
+        return {
+            "p50": _percentile(ordered, 0.50),
+            "p95": _percentile(ordered, 0.95),
+        }
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return controller state for diagnostics."""
+        return {
+            "limit": round(self._limit, 2),
+            "allowed": self.allowed,
+            "max_limit": self.max_limit,
+            "increases": self._increases,
+            "decreases": self._decreases,
+            "samples": len(self._latencies),
+            "latency": self.percentiles(),
+        }
@@ -1,34 +1,329 @@
 """MQTT adapter for Zigbee2MQTT communication with Nimly locks."""
 from __future__ import annotations
 
+import asyncio
+from collections.abc import Callable
+from dataclasses import dataclass
 import json
 import logging
+import time
 from typing import Any
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.exceptions import HomeAssistantError
 
+from ..const import (
+    DEFAULT_ACK_TIMEOUT,
+    DEFAULT_COMMAND_SPACING,
+    DEFAULT_MAX_IN_FLIGHT,
+    MQTT_RETRY_INTERVAL,
+)
+from .availability import LockAvailability
+from .command_queue import CommandQueue, LockCommand, TimingStat
+from .congestion import AimdController
+
 _LOGGER = logging.getLogger(__name__)
 
 # Set to True to enable actual MQTT communication
 # Set to False for development/testing without MQTT
 MQTT_ENABLED = True
 
+# Z2M lock programming events and the action they confirm
+_PROGRAMMING_EVENTS = {
+    "pin_code_added": "add",
+    "pin_code_deleted": "remove",
+}
+
+# Z2M user status (from a pin_code read-back) and the action it confirms
+_USER_STATUS = {
+    "enabled": "add",
+    "available": "remove",
+}
+
+# Z2M user statuses that mean a code is programmed in the slot
+USER_OCCUPIED = ("enabled", "disabled")
+
+# Seconds a read waits after the first report of its slot for a fresher one
+READ_SETTLE = 2.0
+
+
+@dataclass(slots=True)
+class CommandResult:
+    """Outcome of a lock command.
+
+    timed_out is set when the lock was expected to confirm but did not;
+    queued is set when the command was handed to the outbox for retry.
+    status is the Z2M user status returned by a read.
+    """
+
+    confirmed: bool
+    latency: float | None = None
+    timed_out: bool = False
+    queued: bool = False
+    status: str | None = None
+
+
+def parse_confirmations(payload: dict[str, Any]) -> list[tuple[int, str]]:
+    """Extract (slot, action) programming events from a Z2M state message.
+
+    Only the `action`/`action_user` pair is an event. The `users` map is
+    Zigbee2MQTT's cached state, republished with every message, so it is
+    not a confirmation by itself; see MqttZ2mAdapter.async_handle_state_payload.
+    """
+    action = _PROGRAMMING_EVENTS.get(payload.get("action"))
+    if action is None or payload.get("action_user") is None:
+        return []
+    try:
+        return [(int(payload["action_user"]), action)]
+    except (TypeError, ValueError):
+        return []
+
+
+def parse_user_statuses(payload: dict[str, Any]) -> dict[int, str]:
+    """Extract slot -> user status from the `users` map of a Z2M state message."""
+    statuses: dict[int, str] = {}
+    users = payload.get("users")
+    if not isinstance(users, dict):
+        return statuses
+    for user, info in users.items():
+        if not isinstance(info, dict) or not isinstance(info.get("status"), str):
+            continue
+        try:
+            statuses[int(user)] = info["status"]
+        except (TypeError, ValueError):
+            continue
+    return statuses
 
-class MqttZ2mAdapter:
-    """Adapter for communicating with Nimly locks via Zigbee2MQTT."""
 
-    def __init__(self, hass: HomeAssistant, base_topic: str) -> None:
+@dataclass(slots=True)
+class PendingAck:
+    """A published command waiting for the lock to answer.
+
+    baseline is the slot's user status last reported before the command
+    was published; a report only answers the command once it differs. It is
+    None for a slot Z2M has not reported yet, so any report is a change.
+    """
+
+    action: str
+    future: asyncio.Future
+    baseline: str | None
+    # Latest status reported for the slot since publishing, and the timer
+    # that settles a read on it
+    seen: str | None = None
+    settle: asyncio.TimerHandle | None = None
+
+
+class MqttZ2mAdapter:
+    """Adapter for communicating with Nimly locks via Zigbee2MQTT.
+
+    All commands go through a per-lock CommandQueue so a battery powered lock
+    is never flooded, however many callers submit at once. An AimdController
+    adapts how many commands are in flight to the latency this particular
+    lock shows: it starts at one and grows on fast confirmations up to
+    max_in_flight, so a lock that never confirms gets one command at a time.
+
+    Broker connectivity and the Z2M availability topic feed a cached
+    LockAvailability. While the lock is unreachable the queue is held, and
+    when it returns everything held goes out as one paced burst.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        base_topic: str,
+        command_spacing: float = DEFAULT_COMMAND_SPACING,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        ack_timeout: float = DEFAULT_ACK_TIMEOUT,
+    ) -> None:
         """Initialize the adapter."""
         self.hass = hass
         self.base_topic = base_topic.rstrip("/")
+        self.ack_timeout = ack_timeout
+        # Durable retry for failed commands, attached by the integration
+        self.outbox: Any = None
+        self.availability = LockAvailability(self.base_topic)
+        self._mqtt: Any = None
+        self._connect_task: asyncio.Task | None = None
+        self._state_unsub: Callable[[], None] | None = None
+        self._availability_unsubs: list[Callable[[], None]] = []
+        # One outstanding confirmation per slot; the queue never has two
+        # commands for the same slot in flight
+        self._awaiting_ack: dict[int, PendingAck] = {}
+        # Last user status Z2M reported per slot, the baseline new commands
+        # are confirmed against
+        self._user_status: dict[int, str] = {}
+        self._ack_latency = TimingStat()
+        self._confirmed = 0
+        self._timeouts = 0
+        self._controller = AimdController(self.base_topic, max_in_flight, ack_timeout)
+        self._queue = CommandQueue(
+            hass,
+            self.base_topic,
+            self._async_send,
+            command_spacing,
+            max_in_flight,
+            self._controller,
+        )
         _LOGGER.info(
-            "[MqttZ2mAdapter] Initialized with base_topic='%s', MQTT_ENABLED=%s",
+            "[MqttZ2mAdapter] Initialized with base_topic='%s', MQTT_ENABLED=%s, "
+            "command_spacing=%.2fs, max_in_flight=%d",
             self.base_topic,
             MQTT_ENABLED,
+            command_spacing,
+            max_in_flight,
         )
 
-    async def add_code(self, slot: int, pin_code: str, user_type: str = "unrestricted") -> None:
+    async def async_start(self) -> None:
+        """Subscribe to the lock's state and availability topics.
+
+        Runs in the background until it succeeds: while the MQTT integration
+        is not ready, or a subscription fails, it tries again every
+        MQTT_RETRY_INTERVAL seconds. Until then commands fail to send, and
+        without the state subscription they are sent but never confirmed.
+        Without availability the lock is assumed reachable whenever the
+        broker is connected.
+        """
+        if (
+            not MQTT_ENABLED
+            or self._connect_task is not None
+            or self._state_unsub is not None
+        ):
+            return
+        self._connect_task = self.hass.async_create_background_task(
+            self._async_connect(), f"nimlykoder mqtt connect {self.base_topic}"
+        )
+
+    async def _async_connect(self) -> None:
+        """Connect to MQTT, retrying until the state topic is subscribed."""
+        while not await self._async_try_connect():
+            await asyncio.sleep(MQTT_RETRY_INTERVAL)
+        self._connect_task = None
+        # Anything that failed while MQTT was missing can go out now
+        if self.outbox is not None:
+            await self.outbox.async_flush()
+
+    async def _async_try_connect(self) -> bool:
+        """Make one attempt at whatever is not connected yet."""
+        if self._mqtt is None:
+            try:
+                from homeassistant.components import mqtt
+
+                ready = await mqtt.async_wait_for_mqtt_client(self.hass)
+            except Exception as err:
+                _LOGGER.warning(
+                    "[MqttZ2mAdapter] MQTT is not available, retrying in %ds: %s",
+                    MQTT_RETRY_INTERVAL,
+                    err,
+                )
+                return False
+            if not ready:
+                _LOGGER.warning(
+                    "[MqttZ2mAdapter] MQTT is not ready, retrying in %ds",
+                    MQTT_RETRY_INTERVAL,
+                )
+                return False
+            self._mqtt = mqtt
+
+            self._availability_unsubs.append(
+                self.availability.async_add_listener(self._async_availability_changed)
+            )
+            await self._async_track_availability()
+            if not self.availability.available:
+                self._queue.async_hold()
+
+        try:
+            self._state_unsub = await self._mqtt.async_subscribe(
+                self.hass, self.base_topic, self._async_handle_state_message, qos=1
+            )
+        except Exception as err:
+            _LOGGER.warning(
+                "[MqttZ2mAdapter] Could not subscribe to '%s', commands will not be "
+                "confirmed; retrying in %ds: %s",
+                self.base_topic,
+                MQTT_RETRY_INTERVAL,
+                err,
+            )
+            return False
+        _LOGGER.info(
+            "[MqttZ2mAdapter] Subscribed to state topic '%s' for confirmations",
+            self.base_topic,
+        )
+        return True
+
+    async def _async_track_availability(self) -> None:
+        """Follow the broker connection and the Z2M availability topic."""
+        mqtt = self._mqtt
+        try:
+            self._availability_unsubs.append(
+                mqtt.async_subscribe_connection_status(
+                    self.hass, self.availability.async_set_broker
+                )
+            )
+            self.availability.async_set_broker(mqtt.is_connected(self.hass))
+        except Exception as err:
+            # Older MQTT versions: assume the broker is there
+            _LOGGER.warning(
+                "[MqttZ2mAdapter] Could not track MQTT connection status: %s", err
+            )
+            self.availability.async_set_broker(True)
+
+        topic = f"{self.base_topic}/availability"
+        try:
+            self._availability_unsubs.append(
+                await mqtt.async_subscribe(
+                    self.hass,
+                    topic,
+                    self._async_handle_availability_message,
+                    qos=1,
+                )
+            )
+            _LOGGER.info(
+                "[MqttZ2mAdapter] Subscribed to availability topic '%s'", topic
+            )
+        except Exception as err:
+            _LOGGER.warning(
+                "[MqttZ2mAdapter] Could not subscribe to '%s', lock availability unknown: %s",
+                topic,
+                err,
+            )
+
+    @callback
+    def _async_handle_availability_message(self, msg: Any) -> None:
+        """Handle a message on the lock's availability topic."""
+        self.availability.async_set_lock(msg.payload)
+
+    @callback
+    def _async_availability_changed(self, available: bool) -> None:
+        """Hold sends while the lock is unreachable and flush when it returns."""
+        if not available:
+            self._queue.async_hold()
+            return
+        self._queue.async_release()
+        if self.outbox is not None:
+            self.hass.async_create_task(self.outbox.async_flush())
+
+    @property
+    def available(self) -> bool:
+        """Return True if commands can reach the lock right now.
+
+        Until MQTT is connected nothing is known, so sends are attempted and
+        fail loudly if MQTT is missing.
+        """
+        if not MQTT_ENABLED or self._mqtt is None:
+            return True
+        return self.availability.available
+
+    def availability_state(self) -> dict[str, Any]:
+        """Return the cached availability and how many commands it is holding."""
+        return {
+            **self.availability.as_dict(),
+            "available": self.available,
+            "held": self._queue.depth if self._queue.held else 0,
+        }
+
+    async def add_code(
+        self, slot: int, pin_code: str, user_type: str = "unrestricted"
+    ) -> CommandResult:
         """Add a PIN code to the lock.
 
         Args:
@@ -37,11 +332,12 @@ class MqttZ2mAdapter:
             user_type: Type of user - unrestricted (default/owner), year_day_schedule,
                        week_day_schedule, master, or non_access
 
+        Returns:
+            Whether the lock confirmed the change, and how long it took
+
         Raises:
             HomeAssistantError: If MQTT publish fails
         """
-        topic = f"{self.base_topic}/set"
-        
         # Nimly documentation: https://www.zigbee2mqtt.io/devices/Nimly.html
         # pin_code composite: {"user": VALUE, "user_type": VALUE, "user_enabled": VALUE, "pin_code": VALUE}
         payload = {
@@ -54,77 +350,26 @@ class MqttZ2mAdapter:
         }
 
         _LOGGER.info(
-            "[MqttZ2mAdapter] add_code() called - slot=%d, pin_code=%s (masked), user_type=%s, topic='%s'",
+            "[MqttZ2mAdapter] add_code() called - slot=%d, pin_code=%s (masked), user_type=%s",
             slot,
             "*" * len(pin_code),
             user_type,
-            topic,
         )
-        _LOGGER.debug("[MqttZ2mAdapter] add_code() payload: %s", json.dumps(payload))
 
-        if not MQTT_ENABLED:
-            _LOGGER.warning(
-                "[MqttZ2mAdapter] DEV MODE - MQTT disabled. Would publish to '%s': %s",
-                topic,
-                json.dumps(payload),
-            )
-            return
+        return await self._async_submit(slot, "add", payload)
 
-        try:
-            from homeassistant.components import mqtt
-
-            # Check if MQTT is available
-            if mqtt.DOMAIN not in self.hass.config.components:
-                _LOGGER.error(
-                    "[MqttZ2mAdapter] MQTT integration not loaded! Cannot publish."
-                )
-                raise HomeAssistantError(
-                    "MQTT integration not loaded. Please configure MQTT in Home Assistant."
-                )
-
-            _LOGGER.debug(
-                "[MqttZ2mAdapter] Publishing to MQTT topic '%s' with QoS=1...", topic
-            )
-
-            # Publish as JSON string
-            await mqtt.async_publish(
-                self.hass, topic, json.dumps(payload), qos=1, retain=False
-            )
-
-            _LOGGER.info(
-                "[MqttZ2mAdapter] Successfully published add_code for slot %d to '%s'",
-                slot,
-                topic,
-            )
-
-        except HomeAssistantError:
-            raise
-        except ImportError as err:
-            _LOGGER.error(
-                "[MqttZ2mAdapter] Failed to import MQTT module: %s", err
-            )
-            raise HomeAssistantError(
-                f"MQTT module not available: {err}"
-            ) from err
-        except Exception as err:
-            _LOGGER.error(
-                "[MqttZ2mAdapter] Failed to publish add_code to MQTT: %s (type: %s)",
-                err,
-                type(err).__name__,
-            )
-            raise HomeAssistantError(f"Failed to add code via MQTT: {err}") from err
-
-    async def remove_code(self, slot: int) -> None:
+    async def remove_code(self, slot: int) -> CommandResult:
         """Remove a PIN code from the lock.
 
         Args:
             slot: User slot number to clear
 
+        Returns:
+            Whether the lock confirmed the change, and how long it took
+
         Raises:
             HomeAssistantError: If MQTT publish fails
         """
-        topic = f"{self.base_topic}/set"
-        
         # Nimly documentation: "set pincode to null to clear"
         # https://www.zigbee2mqtt.io/devices/Nimly.html
         payload = {
@@ -135,28 +380,212 @@ class MqttZ2mAdapter:
             }
         }
 
-        _LOGGER.info(
-            "[MqttZ2mAdapter] remove_code() called - slot=%d, topic='%s'",
-            slot,
+        _LOGGER.info("[MqttZ2mAdapter] remove_code() called - slot=%d", slot)
+
+        return await self._async_submit(slot, "remove", payload)
+
+    @property
+    def can_read(self) -> bool:
+        """Return True if slot reads can be answered (state topic subscribed)."""
+        return self._state_unsub is not None
+
+    async def async_read_slot(self, slot: int) -> CommandResult:
+        """Read one user slot back from the lock.
+
+        Sends a Z2M `get` for the slot's pin_code through the command queue, so
+        reads are paced like writes, and waits for the `users` entry in the
+        state reply.
+
+        Returns:
+            The result; status is None if the lock did not answer in time
+
+        Raises:
+            HomeAssistantError: If MQTT publish fails
+        """
+        _LOGGER.debug("[MqttZ2mAdapter] Reading slot %d from lock", slot)
+        return await self._queue.async_submit(
+            slot, "read", {"pin_code": {"user": slot}}
+        )
+
+    async def async_deliver(
+        self, slot: int, action: str, payload: dict[str, Any]
+    ) -> CommandResult:
+        """Send a command without outbox handling. Used by the outbox itself."""
+        return await self._queue.async_submit(slot, action, payload)
+
+    async def _async_submit(
+        self, slot: int, action: str, payload: dict[str, Any]
+    ) -> CommandResult:
+        """Send a command, handing it to the outbox if it cannot be delivered.
+
+        A new command for a slot supersedes anything waiting in the outbox
+        for it. Commands the lock did not confirm in time are retried. A removal that fails
+        to publish is retried instead of raising, since the caller's intent
+        is for the code to be gone; a failed add still raises so nothing is
+        stored for a code that never reached the lock.
+        """
+        if self.outbox is not None:
+            await self.outbox.async_discard(slot)
+            if not self.available:
+                # Keep it durable instead of holding the caller until the
+                # lock returns; the outbox flushes on reconnect
+                await self.outbox.async_enqueue(slot, action, payload, "lock offline")
+                return CommandResult(confirmed=False, queued=True)
+
+        try:
+            result = await self._queue.async_submit(slot, action, payload)
+        except HomeAssistantError as err:
+            if self.outbox is None or action != "remove":
+                raise
+            await self.outbox.async_enqueue(slot, action, payload, str(err))
+            return CommandResult(confirmed=False, queued=True)
+
+        # Only a lock that can confirm can time out; without confirmations a
+        # retry could never tell delivery apart from failure
+        if result.timed_out and self.can_read and self.outbox is not None:
+            await self.outbox.async_enqueue(
+                slot, action, payload, "not confirmed by lock"
+            )
+            result.queued = True
+        return result
+
+    def metrics(self) -> dict[str, Any]:
+        """Return command queue and confirmation metrics."""
+        return {
+            "availability": self.availability_state(),
+            "queue": self._queue.metrics(),
+            "acks": {
+                "subscribed": self._state_unsub is not None,
+                "timeout": self.ack_timeout,
+                "confirmed": self._confirmed,
+                "timeouts": self._timeouts,
+                "awaiting": len(self._awaiting_ack),
+                "latency": self._ack_latency.as_dict(),
+            },
+            "congestion": self._controller.as_dict(),
+        }
+
+    @callback
+    def async_stop(self) -> None:
+        """Stop the command queue and the subscriptions."""
+        if self._connect_task is not None:
+            self._connect_task.cancel()
+            self._connect_task = None
+        self._queue.async_stop()
+        if self._state_unsub is not None:
+            self._state_unsub()
+            self._state_unsub = None
+        while self._availability_unsubs:
+            self._availability_unsubs.pop()()
+        self._mqtt = None
+        for pending in self._awaiting_ack.values():
+            if pending.settle is not None:
+                pending.settle.cancel()
+            if not pending.future.done():
+                pending.future.cancel()
+        self._awaiting_ack.clear()
+
+    @callback
+    def _async_handle_state_message(self, msg: Any) -> None:
+        """Handle a message on the lock's state topic."""
+        self.async_handle_state_payload(msg.payload)
+
+    @callback
+    def async_handle_state_payload(self, payload: str | bytes | dict[str, Any]) -> None:
+        """Match a Z2M state payload against commands awaiting confirmation.
+
+        A programming event confirms an add or remove outright. The `users`
+        map is Z2M's cached state and is republished unchanged with every
+        message, so it only confirms a command when the slot's status has
+        changed to the expected one since the command was published. A read
+        resolves on such a change too; if the status stays the same, it
+        resolves with it READ_SETTLE seconds after the first report, in case
+        that report was the cached copy and the reply is still on its way.
+        """
+        if not isinstance(payload, dict):
+            try:
+                payload = json.loads(payload)
+            except (TypeError, ValueError):
+                return
+            if not isinstance(payload, dict):
+                return
+
+        for slot, status in parse_user_statuses(payload).items():
+            self._user_status[slot] = status
+            pending = self._awaiting_ack.get(slot)
+            if pending is None or pending.future.done():
+                continue
+            changed = status != pending.baseline
+            if pending.action == "read":
+                pending.seen = status
+                if changed:
+                    self._resolve(slot, pending, status)
+                elif pending.settle is None:
+                    pending.settle = self.hass.loop.call_later(
+                        READ_SETTLE, self._resolve, slot, pending, status
+                    )
+            elif changed and _USER_STATUS.get(status) == pending.action:
+                self._resolve(slot, pending, None)
+
+        for slot, action in parse_confirmations(payload):
+            pending = self._awaiting_ack.get(slot)
+            if pending is not None and pending.action == action:
+                self._resolve(slot, pending, None)
+
+    @callback
+    def _resolve(self, slot: int, pending: PendingAck, status: str | None) -> None:
+        """Answer a pending command; a settling read answers with the latest status."""
+        if pending.future.done():
+            return
+        if pending.settle is not None:
+            pending.settle.cancel()
+            if pending.action == "read":
+                status = pending.seen
+        _LOGGER.debug(
+            "[MqttZ2mAdapter] Lock answered %s for slot %d", pending.action, slot
+        )
+        pending.future.set_result(status)
+
+    async def _async_send(self, command: LockCommand) -> CommandResult:
+        """Publish one queued command and wait for the lock to confirm it.
+
+        A missing confirmation is not an error: the result reports
+        confirmed=False once ack_timeout has passed.
+
+        Raises:
+            HomeAssistantError: If MQTT publish fails
+        """
+        topic = f"{self.base_topic}/{'get' if command.action == 'read' else 'set'}"
+        _LOGGER.debug(
+            "[MqttZ2mAdapter] Sending %s for slot %d to '%s'",
+            command.action,
+            command.slot,
             topic,
         )
-        _LOGGER.debug("[MqttZ2mAdapter] remove_code() payload: %s", json.dumps(payload))
 
         if not MQTT_ENABLED:
             _LOGGER.warning(
-                "[MqttZ2mAdapter] DEV MODE - MQTT disabled. Would publish to '%s': %s",
+                "[MqttZ2mAdapter] DEV MODE - MQTT disabled. Would publish %s for slot %d to '%s'",
+                command.action,
+                command.slot,
                 topic,
-                json.dumps(payload),
             )
-            return
+            return CommandResult(confirmed=False)
+
+        # Register before publishing so a fast confirmation is not missed
+        ack: asyncio.Future | None = None
+        if self._state_unsub is not None:
+            ack = self.hass.loop.create_future()
+            self._awaiting_ack[command.slot] = PendingAck(
+                command.action, ack, self._user_status.get(command.slot)
+            )
 
         try:
-            from homeassistant.components import mqtt
-
-            # Check if MQTT is available
-            if mqtt.DOMAIN not in self.hass.config.components:
+            mqtt = self._mqtt
+            # Availability is tracked by subscription, nothing to probe here
+            if mqtt is None or not self.availability.broker_connected:
                 _LOGGER.error(
-                    "[MqttZ2mAdapter] MQTT integration not loaded! Cannot publish."
+                    "[MqttZ2mAdapter] MQTT is not connected! Cannot publish."
                 )
                 raise HomeAssistantError(
                     "MQTT integration not loaded. Please configure MQTT in Home Assistant."
@@ -167,38 +596,80 @@ class MqttZ2mAdapter:
             )
 
             # Publish as JSON string
+            sent_at = time.monotonic()
             await mqtt.async_publish(
-                self.hass, topic, json.dumps(payload), qos=1, retain=False
+                self.hass, topic, json.dumps(command.payload), qos=1, retain=False
             )
 
             _LOGGER.info(
-                "[MqttZ2mAdapter] Successfully published remove_code for slot %d to '%s'",
-                slot,
+                "[MqttZ2mAdapter] Successfully published %s_code for slot %d to '%s'",
+                command.action,
+                command.slot,
                 topic,
             )
 
         except HomeAssistantError:
+            self._awaiting_ack.pop(command.slot, None)
             raise
-        except ImportError as err:
-            _LOGGER.error(
-                "[MqttZ2mAdapter] Failed to import MQTT module: %s", err
-            )
-            raise HomeAssistantError(
-                f"MQTT module not available: {err}"
-            ) from err
         except Exception as err:
+            self._awaiting_ack.pop(command.slot, None)
             _LOGGER.error(
-                "[MqttZ2mAdapter] Failed to publish remove_code to MQTT: %s (type: %s)",
+                "[MqttZ2mAdapter] Failed to publish %s_code to MQTT: %s (type: %s)",
+                command.action,
                 err,
                 type(err).__name__,
             )
             raise HomeAssistantError(
-                f"Failed to remove code via MQTT: {err}"
+                f"Failed to {command.action} code via MQTT: {err}"
             ) from err
 
+        if ack is None:
+            return CommandResult(confirmed=False)
+
+        return await self._async_wait_for_ack(command, ack, sent_at)
+
+    async def _async_wait_for_ack(
+        self, command: LockCommand, ack: asyncio.Future, sent_at: float
+    ) -> CommandResult:
+        """Wait for the lock to confirm a published command."""
+        try:
+            async with asyncio.timeout(self.ack_timeout):
+                status = await ack
+        except TimeoutError:
+            self._timeouts += 1
+            self._controller.on_timeout()
+            _LOGGER.warning(
+                "[MqttZ2mAdapter] No confirmation from lock for %s on slot %d within %.1fs",
+                command.action,
+                command.slot,
+                self.ack_timeout,
+            )
+            return CommandResult(confirmed=False, timed_out=True)
+        finally:
+            pending = self._awaiting_ack.get(command.slot)
+            if pending is not None and pending.future is ack:
+                if pending.settle is not None:
+                    pending.settle.cancel()
+                del self._awaiting_ack[command.slot]
+
+        latency = time.monotonic() - sent_at
+        self._confirmed += 1
+        self._ack_latency.record(latency)
+        self._controller.on_confirmed(latency)
+        _LOGGER.info(
+            "[MqttZ2mAdapter] Lock confirmed %s for slot %d after %.2fs",
+            command.action,
+            command.slot,
+            latency,
+        )
+        return CommandResult(confirmed=True, latency=latency, status=status)
+
     async def verify_connection(self) -> bool:
         """Verify MQTT connection is available.
 
+        Once started this answers from the cached availability state; before
+        that it checks whether the MQTT integration is loaded.
+
         Returns:
             True if MQTT is available, False otherwise
         """
@@ -210,6 +681,9 @@ class MqttZ2mAdapter:
             )
             return True
 
+        if self._mqtt is not None:
+            return self.availability.broker_connected
+
         try:
             from homeassistant.components import mqtt
 
@@ -0,0 +1,156 @@
+"""Slot allocation for Nimlykoder."""
+from __future__ import annotations
+
+import heapq
+import logging
+from collections.abc import Iterable
+
+from homeassistant.core import callback
+
+from .storage import CodeEntry
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class SlotAllocator:
+    """Track free slots for a lock and hand out short-lived reservations.
+
+    Free slots are a set plus a min-heap over it with lazy deletion: a slot
+    taken out of the set stays in the heap until it reaches the top and is
+    dropped there. Taking the lowest free slot and returning one are both
+    amortized O(log n), and the next k free slots are read in O(k log n). Slots listed
+    in the reserved config are never handed out automatically but can still
+    be claimed explicitly. A reservation holds a slot while an add is in
+    flight so a concurrent request cannot be given the same slot.
+    """
+
+    def __init__(
+        self,
+        slot_min: int,
+        slot_max: int,
+        reserved_slots: Iterable[int],
+        occupied_slots: Iterable[int],
+    ) -> None:
+        """Initialize the allocator from config and the slots in storage."""
+        self.slot_min = slot_min
+        self.slot_max = slot_max
+        self._reserved = frozenset(reserved_slots)
+        self._occupied = set(occupied_slots)
+        self._held: set[int] = set()
+        self._free = {
+            slot
+            for slot in range(slot_min, slot_max + 1)
+            if slot not in self._reserved and slot not in self._occupied
+        }
+        # Ascending already, so a valid heap; may hold slots no longer free
+        self._heap = sorted(self._free)
+        self._in_heap = set(self._free)
+
+    def in_range(self, slot: int) -> bool:
+        """Return True if the slot is within the configured range."""
+        return self.slot_min <= slot <= self.slot_max
+
+    def is_held(self, slot: int) -> bool:
+        """Return True if an in-flight request holds the slot."""
+        return slot in self._held
+
+    def next_free(self, count: int) -> list[int]:
+        """Return up to `count` free slots in ascending order."""
+        # Take them off the heap and put them back
+        slots: list[int] = []
+        while len(slots) < count and (slot := self._pop_free()) is not None:
+            slots.append(slot)
+        for slot in slots:
+            self._push_free(slot)
+        return slots
+
+    @property
+    def free_count(self) -> int:
+        """Return the number of slots available for automatic assignment."""
+        return len(self._free)
+
+    @callback
+    def reserve_first_free(self) -> int | None:
+        """Reserve and return the lowest free slot, or None if full."""
+        if (slot := self._pop_free()) is None:
+            return None
+        self._held.add(slot)
+        _LOGGER.debug("[SlotAllocator] Reserved first free slot %d", slot)
+        return slot
+
+    @callback
+    def reserve_free(self, count: int) -> list[int] | None:
+        """Reserve the `count` lowest free slots at once.
+
+        Returns None, reserving nothing, if fewer than `count` are free.
+        """
+        if count > len(self._free):
+            return None
+        slots = [self._pop_free() for _ in range(count)]
+        self._held.update(slots)
+        _LOGGER.debug("[SlotAllocator] Reserved free slots %s", slots)
+        return slots
+
+    @callback
+    def reserve(self, slot: int) -> bool:
+        """Reserve a specific slot.
+
+        Returns False if another in-flight request already holds it. The
+        slot may be occupied; overwrite policy is up to the caller.
+        """
+        if slot in self._held:
+            return False
+        self._discard_free(slot)
+        self._held.add(slot)
+        _LOGGER.debug("[SlotAllocator] Reserved slot %d", slot)
+        return True
+
+    @callback
+    def release(self, slot: int) -> None:
+        """Release a reservation, returning the slot to the pool if unused."""
+        if slot not in self._held:
+            return
+        self._held.discard(slot)
+        if slot not in self._occupied:
+            self._add_free(slot)
+        _LOGGER.debug("[SlotAllocator] Released slot %d", slot)
+
+    @callback
+    def async_storage_changed(
+        self, slot: int, old: CodeEntry | None, new: CodeEntry | None
+    ) -> None:
+        """Keep occupancy in sync with storage."""
+        if new is not None:
+            self._occupied.add(slot)
+            self._discard_free(slot)
+        else:
+            self._occupied.discard(slot)
+            if slot not in self._held:
+                self._add_free(slot)
+
+    def _add_free(self, slot: int) -> None:
+        """Return a slot to the free pool if it is assignable."""
+        if not self.in_range(slot) or slot in self._reserved:
+            return
+        self._push_free(slot)
+
+    def _discard_free(self, slot: int) -> None:
+        """Take a slot out of the free pool; its heap entry goes lazily."""
+        self._free.discard(slot)
+
+    def _push_free(self, slot: int) -> None:
+        """Mark a slot free, adding it to the heap unless it is still there."""
+        self._free.add(slot)
+        if slot not in self._in_heap:
+            self._in_heap.add(slot)
+            heapq.heappush(self._heap, slot)
+
+    def _pop_free(self) -> int | None:
+        """Take the lowest free slot out of the pool, dropping stale entries."""
+        while self._heap:
+            slot = heapq.heappop(self._heap)
+            self._in_heap.discard(slot)
+            if slot in self._free:
+                self._free.discard(slot)
+                return slot
+        return None
@@ -0,0 +1,146 @@
+"""Operation schemas and validation for Nimlykoder code changes."""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+
+import voluptuous as vol
+
+from .const import (
+    CONF_OVERWRITE_PROTECTION,
+    TYPE_PERMANENT,
+    TYPE_GUEST,
+    BULK_MAX_OPERATIONS,
+)
+
+OP_ADD = "add"
+OP_REMOVE = "remove"
+OP_UPDATE = "update"
+
+# One operation in a bulk request; shared by the service and WebSocket API
+OPERATION_SCHEMA = vol.Schema(
+    {
+        vol.Required("op"): vol.In([OP_ADD, OP_REMOVE, OP_UPDATE]),
+        vol.Optional("slot"): vol.All(vol.Coerce(int), vol.Range(min=0)),
+        vol.Optional("name"): str,
+        vol.Optional("pin_code"): vol.Coerce(str),
+        vol.Optional("type"): vol.In([TYPE_PERMANENT, TYPE_GUEST]),
+        vol.Optional("expiry"): vol.Any(None, str),
+        vol.Optional("force", default=False): bool,
+    }
+)
+
+OPERATIONS_SCHEMA = vol.All(
+    [OPERATION_SCHEMA], vol.Length(min=1, max=BULK_MAX_OPERATIONS)
+)
+
+# Fields a patch may change; pin_code goes to the lock, the rest to storage
+PATCH_FIELDS = ("name", "expiry", "type", "pin_code")
+
+
+@dataclass(slots=True)
+class BulkItem:
+    """One operation and its outcome."""
+
+    index: int
+    op: str
+    data: dict[str, Any]
+    slot: int | None = None
+    error: str | None = None
+    result: Any = None
+    entry: dict[str, Any] | None = None
+    reserved: bool = field(default=False, repr=False)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the per-item result."""
+        item: dict[str, Any] = {
+            "index": self.index,
+            "op": self.op,
+            "slot": self.slot,
+            "success": self.error is None,
+        }
+        if self.error is not None:
+            item["error"] = self.error
+        if self.result is not None:
+            item["confirmed"] = self.result.confirmed
+            item["queued"] = self.result.queued
+        if self.entry is not None:
+            item["entry"] = self.entry
+        return item
+
+
+def validate_pin(pin_code: str | None) -> str | None:
+    """Return an error message for an invalid PIN."""
+    if pin_code is None or not pin_code.isdigit() or len(pin_code) != 6:
+        return "PIN code must be exactly 6 digits"
+    return None
+
+
+def validate_expiry(expiry: str | None) -> str | None:
+    """Return an error message for an unparseable expiry."""
+    if not expiry:
+        return None
+    try:
+        datetime.fromisoformat(expiry)
+    except ValueError as err:
+        return f"Invalid expiry date format: {err}"
+    return None
+
+
+def validate_changes(entry: Any, changes: dict[str, Any]) -> str | None:
+    """Check a patch of name/expiry/type/pin_code against an existing entry."""
+    if not any(key in changes for key in PATCH_FIELDS):
+        return "Nothing to update"
+    if "name" in changes and not (changes["name"] or "").strip():
+        return "Name cannot be empty"
+    if "pin_code" in changes and (error := validate_pin(changes["pin_code"])):
+        return error
+    if "type" in changes and changes["type"] not in (TYPE_PERMANENT, TYPE_GUEST):
+        return f"Invalid type: {changes['type']}"
+    if error := validate_expiry(changes.get("expiry")):
+        return error
+    code_type = changes.get("type", entry.type)
+    expiry = changes["expiry"] if "expiry" in changes else entry.expiry
+    if code_type == TYPE_GUEST and not expiry:
+        return "Guest codes must have an expiry date"
+    return None
+
+
+def validate_item(item: BulkItem, storage: Any, allocator: Any, config: dict) -> str | None:
+    """Check one operation against storage and policy. Returns an error or None."""
+    data = item.data
+    slot = data.get("slot")
+
+    if slot is not None and not allocator.in_range(slot):
+        return f"Slot {slot} outside configured range"
+
+    if item.op == OP_ADD:
+        if not (data.get("name") or "").strip():
+            return "Name cannot be empty"
+        if data.get("type") is None:
+            return "Type is required"
+        if error := validate_pin(data.get("pin_code")):
+            return error
+        if data["type"] == TYPE_GUEST and not data.get("expiry"):
+            return "Guest codes must have an expiry date"
+        if error := validate_expiry(data.get("expiry")):
+            return error
+        if (
+            slot is not None
+            and storage.is_slot_occupied(slot)
+            and not data["force"]
+            and config.get(CONF_OVERWRITE_PROTECTION, True)
+        ):
+            return f"Slot {slot} is occupied. Use force to overwrite"
+        return None
+
+    if slot is None:
+        return "Slot is required"
+    entry = storage.get(slot)
+    if entry is None:
+        return f"Slot {slot} not found"
+
+    if item.op == OP_UPDATE:
+        return validate_changes(entry, data)
+    return None
@@ -0,0 +1,127 @@
+"""Pacing of expired code cleanup across locks."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+import logging
+import random
+import time
+from typing import Any
+import zlib
+
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from .adapters.command_queue import TimingStat
+from .const import (
+    CLEANUP_COMMAND_JITTER,
+    CLEANUP_MAX_CONCURRENT,
+    DATA_CLEANUP_LIMITER,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def cleanup_offset(entry_id: str, window: int) -> int:
+    """Return a lock's delay in seconds from the cleanup time.
+
+    The offset is derived from the entry id, so it is the same after every
+    restart and differs between locks sharing a cleanup time.
+    """
+    if window <= 0:
+        return 0
+    return zlib.crc32(entry_id.encode()) % (window + 1)
+
+
+class CleanupLimiter:
+    """Cap the removal commands all locks' cleanups have in flight.
+
+    Locks share one Zigbee coordinator, so sweeps running on several locks
+    at once would still produce a burst. Each removal waits a random jitter
+    and then takes one of `max_concurrent` permits shared by every lock.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = CLEANUP_MAX_CONCURRENT,
+        jitter: float = CLEANUP_COMMAND_JITTER,
+    ) -> None:
+        """Initialize the limiter."""
+        self.max_concurrent = max_concurrent
+        self.jitter = jitter
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._active = 0
+
+    @property
+    def active(self) -> int:
+        """Return the number of removals holding a permit."""
+        return self._active
+
+    @asynccontextmanager
+    async def async_slot(self) -> AsyncIterator[float]:
+        """Wait for jitter and a free permit; yields the seconds waited."""
+        started = time.monotonic()
+        if self.jitter > 0:
+            await asyncio.sleep(random.uniform(0, self.jitter))
+        async with self._semaphore:
+            self._active += 1
+            try:
+                yield time.monotonic() - started
+            finally:
+                self._active -= 1
+
+
+def get_cleanup_limiter(hass: HomeAssistant) -> CleanupLimiter:
+    """Return the limiter shared by every lock, creating it on first use."""
+    if (limiter := hass.data.get(DATA_CLEANUP_LIMITER)) is None:
+        limiter = hass.data[DATA_CLEANUP_LIMITER] = CleanupLimiter()
+    return limiter
+
+
+@dataclass(slots=True)
+class SweepReport:
+    """Outcome and timings of one cleanup sweep on one lock.
+
+    `removed` holds every slot the lock accepted a removal for, `confirmed`
+    those it also confirmed. `skipped` slots were busy with another request.
+    """
+
+    started: str
+    expired: int = 0
+    removed: list[int] = field(default_factory=list)
+    confirmed: list[int] = field(default_factory=list)
+    failed: list[int] = field(default_factory=list)
+    skipped: list[int] = field(default_factory=list)
+    elapsed: float = 0.0
+    waited: float = 0.0
+    per_slot: TimingStat = field(default_factory=TimingStat)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the report."""
+        return {
+            "started": self.started,
+            "expired": self.expired,
+            "removed": len(self.removed),
+            "slots": self.removed,
+            "confirmed": self.confirmed,
+            "failed": self.failed,
+            "failures": len(self.failed),
+            "skipped": self.skipped,
+            "elapsed": round(self.elapsed, 3),
+            "waited": round(self.waited, 3),
+            "per_slot": self.per_slot.as_dict(),
+        }
+
+
+async def async_cleanup_expired(
+    hass: HomeAssistant, lock: dict[str, Any]
+) -> SweepReport:
+    """Remove a lock's expired codes, paced with every other lock's cleanup.
+
+    Shared by the scheduled cleanup and the cleanup_expired service.
+    """
+    return await lock["manager"].async_remove_expired(
+        dt_util.now(), get_cleanup_limiter(hass)
+    )
@@ -19,13 +19,23 @@ from .const import (
     CONF_RESERVED_SLOTS,
     CONF_AUTO_EXPIRE,
     CONF_CLEANUP_TIME,
+    CONF_CLEANUP_WINDOW,
     CONF_OVERWRITE_PROTECTION,
+    CONF_SAVE_DELAY,
+    CONF_COMMAND_SPACING,
+    CONF_MAX_IN_FLIGHT,
+    CONF_ACK_TIMEOUT,
     DEFAULT_SLOT_MIN,
     DEFAULT_SLOT_MAX,
     DEFAULT_RESERVED_SLOTS,
     DEFAULT_AUTO_EXPIRE,
     DEFAULT_CLEANUP_TIME,
+    DEFAULT_CLEANUP_WINDOW,
     DEFAULT_OVERWRITE_PROTECTION,
+    DEFAULT_SAVE_DELAY,
+    DEFAULT_COMMAND_SPACING,
+    DEFAULT_MAX_IN_FLIGHT,
+    DEFAULT_ACK_TIMEOUT,
 )
 
 _LOGGER = logging.getLogger(__name__)
@@ -63,8 +73,8 @@ class NimlykoderConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             if user_input[CONF_SLOT_MIN] > user_input[CONF_SLOT_MAX]:
                 errors["base"] = "invalid_slot_range"
             else:
-                # Check if already configured
-                await self.async_set_unique_id(DOMAIN)
+                # One entry per lock
+                await self.async_set_unique_id(user_input[CONF_LOCK_ENTITY])
                 self._abort_if_unique_id_configured()
 
                 # Convert reserved_slots from string to list
@@ -162,9 +172,24 @@ class NimlykoderOptionsFlow(config_entries.OptionsFlow):
         if auto_expire is None:
             auto_expire = DEFAULT_AUTO_EXPIRE
         cleanup_time = options.get(CONF_CLEANUP_TIME) or DEFAULT_CLEANUP_TIME
+        cleanup_window = options.get(CONF_CLEANUP_WINDOW)
+        if cleanup_window is None:
+            cleanup_window = DEFAULT_CLEANUP_WINDOW
         overwrite_protection = options.get(CONF_OVERWRITE_PROTECTION)
         if overwrite_protection is None:
             overwrite_protection = DEFAULT_OVERWRITE_PROTECTION
+        save_delay = options.get(CONF_SAVE_DELAY)
+        if save_delay is None:
+            save_delay = DEFAULT_SAVE_DELAY
+        command_spacing = options.get(CONF_COMMAND_SPACING)
+        if command_spacing is None:
+            command_spacing = DEFAULT_COMMAND_SPACING
+        max_in_flight = options.get(CONF_MAX_IN_FLIGHT)
+        if max_in_flight is None:
+            max_in_flight = DEFAULT_MAX_IN_FLIGHT
+        ack_timeout = options.get(CONF_ACK_TIMEOUT)
+        if ack_timeout is None:
+            ack_timeout = DEFAULT_ACK_TIMEOUT
 
         data_schema = vol.Schema(
             {
@@ -198,10 +223,48 @@ class NimlykoderOptionsFlow(config_entries.OptionsFlow):
                     CONF_CLEANUP_TIME,
                     default=cleanup_time,
                 ): selector.TimeSelector(),
+                vol.Required(
+                    CONF_CLEANUP_WINDOW,
+                    default=cleanup_window,
+                ): selector.NumberSelector(
+                    selector.NumberSelectorConfig(
+                        min=0, max=21600, mode="box", unit_of_measurement="s"
+                    )
+                ),
                 vol.Required(
                     CONF_OVERWRITE_PROTECTION,
                     default=overwrite_protection,
                 ): bool,
+                vol.Required(
+                    CONF_SAVE_DELAY,
+                    default=save_delay,
+                ): selector.NumberSelector(
+                    selector.NumberSelectorConfig(
+                        min=0, max=300, mode="box", unit_of_measurement="s"
+                    )
+                ),
+                vol.Required(
+                    CONF_COMMAND_SPACING,
+                    default=command_spacing,
+                ): selector.NumberSelector(
+                    selector.NumberSelectorConfig(
+                        min=0, max=30, step=0.1, mode="box", unit_of_measurement="s"
+                    )
+                ),
+                vol.Required(
+                    CONF_MAX_IN_FLIGHT,
+                    default=max_in_flight,
+                ): selector.NumberSelector(
+                    selector.NumberSelectorConfig(min=1, max=10, mode="box")
+                ),
+                vol.Required(
+                    CONF_ACK_TIMEOUT,
+                    default=ack_timeout,
+                ): selector.NumberSelector(
+                    selector.NumberSelectorConfig(
+                        min=1, max=120, mode="box", unit_of_measurement="s"
+                    )
+                ),
             }
         )
 
@@ -9,7 +9,12 @@ CONF_SLOT_MAX = "slot_max"
 CONF_RESERVED_SLOTS = "reserved_slots"
 CONF_AUTO_EXPIRE = "auto_expire"
 CONF_CLEANUP_TIME = "cleanup_time"
+CONF_CLEANUP_WINDOW = "cleanup_window"
 CONF_OVERWRITE_PROTECTION = "overwrite_protection"
+CONF_SAVE_DELAY = "save_delay"
+CONF_COMMAND_SPACING = "command_spacing"
+CONF_MAX_IN_FLIGHT = "max_in_flight"
+CONF_ACK_TIMEOUT = "ack_timeout"
 
 # Legacy config key (for migration)
 CONF_MQTT_TOPIC = "mqtt_topic"
@@ -20,11 +25,67 @@ DEFAULT_SLOT_MAX = 99
 DEFAULT_RESERVED_SLOTS = [1, 2, 3]
 DEFAULT_AUTO_EXPIRE = True
 DEFAULT_CLEANUP_TIME = "03:00:00"
+DEFAULT_CLEANUP_WINDOW = 1800
 DEFAULT_OVERWRITE_PROTECTION = True
+DEFAULT_SAVE_DELAY = 10
+DEFAULT_COMMAND_SPACING = 1.0
+# Ceiling for the adaptive in-flight limit, which starts at one command and
+# only grows while the lock confirms quickly
+DEFAULT_MAX_IN_FLIGHT = 3
+DEFAULT_ACK_TIMEOUT = 15
+
+# Seconds between attempts to reach the MQTT integration when it is not ready
+MQTT_RETRY_INTERVAL = 60
+
+# Seconds to wait before retrying removal of a guest code that is past expiry
+EXPIRY_RETRY_INTERVAL = 300
+
+# Daily cleanups of different locks start at a fixed offset within the
+# window; each removal waits up to CLEANUP_COMMAND_JITTER seconds, and at
+# most CLEANUP_MAX_CONCURRENT removals run across all locks at once
+CLEANUP_COMMAND_JITTER = 5.0
+CLEANUP_MAX_CONCURRENT = 2
+DATA_CLEANUP_LIMITER = "nimlykoder_cleanup_limiter"
+
+# Fired with the report of every cleanup run that sent removals
+EVENT_CLEANUP_COMPLETED = "nimlykoder_cleanup_completed"
 
 # Storage
 STORAGE_VERSION = 1
 STORAGE_KEY = "nimlykoder_codes"
+OUTBOX_STORAGE_VERSION = 1
+OUTBOX_STORAGE_KEY = "nimlykoder_outbox"
+JOURNAL_STORAGE_VERSION = 1
+JOURNAL_STORAGE_KEY = "nimlykoder_journal"
+
+# Seconds to coalesce journal writes that only mark intents committed or done
+JOURNAL_SAVE_DELAY = 1
+
+# Outbox retry backoff in seconds: doubles from the base up to the max
+OUTBOX_RETRY_BASE = 30
+OUTBOX_RETRY_MAX = 3600
+
+# A command is given up after this many attempts or this many seconds in the
+# outbox, whichever comes first; the most recent failures are kept (without
+# the PIN) for diagnostics
+OUTBOX_MAX_ATTEMPTS = 10
+OUTBOX_MAX_AGE = 86400
+OUTBOX_FAILED_KEEP = 20
+
+# Background reconciliation reads this many lock slots every interval (seconds)
+RECONCILE_INTERVAL = 300
+RECONCILE_BATCH = 3
+
+# Upper bound on operations in one bulk request
+BULK_MAX_OPERATIONS = 100
+
+# Sort orders of a code query, and the most codes one page may hold
+SORT_SLOT = "slot"
+SORT_NAME = "name"
+SORT_EXPIRY = "expiry"
+QUERY_MAX_LIMIT = 500
+# Name search results returned unless the request asks for another number
+SEARCH_DEFAULT_LIMIT = 20
 
 # Entry types
 TYPE_PERMANENT = "permanent"
@@ -38,6 +99,18 @@ SERVICE_UPDATE_NAME = "update_name"
 SERVICE_UPDATE_PIN = "update_pin"
 SERVICE_LIST_CODES = "list_codes"
 SERVICE_CLEANUP_EXPIRED = "cleanup_expired"
+SERVICE_RECONCILE = "reconcile"
+SERVICE_BULK_APPLY = "bulk_apply"
+SERVICE_UPDATE_CODE = "update_code"
+SERVICE_FAN_OUT = "fan_out"
+
+# Service and WebSocket fields that pick the lock(s) to act on
+ATTR_ENTRY_ID = "entry_id"
+ATTR_LOCK = "lock"
+ATTR_ENTRY_IDS = "entry_ids"
+ATTR_LOCKS = "locks"
+# Links the copies of one code on several locks
+ATTR_GROUP = "group"
 
 # WebSocket commands
 WS_TYPE_LIST = "nimlykoder/list"
@@ -49,6 +122,17 @@ WS_TYPE_UPDATE_PIN = "nimlykoder/update_pin"
 WS_TYPE_SUGGEST_SLOTS = "nimlykoder/suggest_slots"
 WS_TYPE_CONFIG = "nimlykoder/config"
 WS_TYPE_TRANSLATIONS = "nimlykoder/translations"
+WS_TYPE_RECONCILE = "nimlykoder/reconcile"
+WS_TYPE_BATCH = "nimlykoder/batch"
+WS_TYPE_UPDATE = "nimlykoder/update"
+WS_TYPE_LOCKS = "nimlykoder/locks"
+WS_TYPE_FAN_OUT = "nimlykoder/fan_out"
+WS_TYPE_SUBSCRIBE = "nimlykoder/subscribe"
+WS_TYPE_BOOTSTRAP = "nimlykoder/bootstrap"
+WS_TYPE_SEARCH = "nimlykoder/search"
+
+# Serialized panel translations by language, shared by all locks
+DATA_TRANSLATIONS = "nimlykoder_translations"
 
 # Panel
 PANEL_NAME = "nimlykoder"
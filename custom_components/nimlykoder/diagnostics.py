@@ -0,0 +1,35 @@
+"""Diagnostics support for Nimlykoder."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    data = hass.data.get(DOMAIN, {}).get(entry.entry_id)
+    if not data:
+        return {"loaded": False}
+
+    storage = data["storage"]
+
+    return {
+        "loaded": True,
+        "config": data["config"],
+        "storage": {
+            "entries": len(storage.list_entries()),
+            **storage.save_stats,
+        },
+        "mqtt_adapter": data["mqtt_adapter"].metrics(),
+        "outbox": data["outbox"].metrics(),
+        "reconciler": data["reconciler"].metrics(),
+        "manager": data["manager"].metrics(),
+        "journal": data["journal"].metrics(),
+        "feed": data["feed"].metrics(),
+    }
@@ -0,0 +1,200 @@
+"""Apply one logical code to several locks at once."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+from dataclasses import dataclass, field
+import logging
+import time
+from typing import Any
+import uuid
+
+from .bulk import OP_ADD, OP_REMOVE, OP_UPDATE, validate_expiry, validate_pin
+from .const import TYPE_GUEST
+from .manager import CodeOperationError
+
+_LOGGER = logging.getLogger(__name__)
+
+# Fields an update may push to every copy of a code
+_UPDATE_FIELDS = ("name", "expiry", "type", "pin_code")
+
+
+@dataclass(slots=True)
+class LockResult:
+    """Outcome of a fan-out operation on one lock."""
+
+    entry_id: str
+    title: str
+    success: bool = False
+    slots: list[int] = field(default_factory=list)
+    error: str | None = None
+    code: str | None = None
+    confirmed: bool | None = None
+    queued: bool = False
+    elapsed: float = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the per-lock result."""
+        result: dict[str, Any] = {
+            "entry_id": self.entry_id,
+            "title": self.title,
+            "success": self.success,
+            "slots": self.slots,
+            "confirmed": self.confirmed,
+            "queued": self.queued,
+            "elapsed": round(self.elapsed, 3),
+        }
+        if self.error is not None:
+            result["error"] = self.error
+            result["code"] = self.code
+        return result
+
+
+def new_group_id() -> str:
+    """Return a fresh identity for a code shared by several locks."""
+    return uuid.uuid4().hex
+
+
+def validate_fan_out(op: str, group: str | None, data: dict[str, Any]) -> str | None:
+    """Check a fan-out request before anything is sent. Returns an error or None."""
+    if op == OP_ADD:
+        if not (data.get("name") or "").strip():
+            return "Name cannot be empty"
+        if data.get("type") is None:
+            return "Type is required"
+        if error := validate_pin(data.get("pin_code")):
+            return error
+        if data["type"] == TYPE_GUEST and not data.get("expiry"):
+            return "Guest codes must have an expiry date"
+        return validate_expiry(data.get("expiry"))
+
+    if not group:
+        return "Group is required"
+    if op == OP_UPDATE:
+        if not any(key in data for key in _UPDATE_FIELDS):
+            return "Nothing to update"
+        if "pin_code" in data and (error := validate_pin(data["pin_code"])):
+            return error
+        return validate_expiry(data.get("expiry"))
+    return None
+
+
+async def async_fan_out(
+    targets: list[dict[str, Any]],
+    op: str,
+    data: dict[str, Any],
+    group: str | None = None,
+    on_result: Callable[[LockResult], None] | None = None,
+) -> dict[str, Any]:
+    """Apply one add/update/remove to every target lock concurrently.
+
+    Each lock goes through its own code manager and paced command queue, so
+    the whole operation takes about as long as the slowest lock. Copies of
+    an added code share `group` (a new one is made if not given); updates
+    and removals find the code on each lock by that group.
+
+    Args:
+        targets: Runtime data of the locks to act on
+        op: add, update or remove
+        data: name, pin_code, type, expiry, slot and force as for add_code
+        group: Group identity of the code
+        on_result: Called with each lock's result as soon as it is known
+
+    Returns:
+        {"group", "op", "succeeded", "failed", "elapsed", "results"}
+
+    Raises:
+        CodeOperationError: If the request is invalid; nothing is sent then
+    """
+    if op == OP_ADD and not group:
+        group = new_group_id()
+    if error := validate_fan_out(op, group, data):
+        raise CodeOperationError("invalid_input", error)
+
+    _LOGGER.info(
+        "[async_fan_out] Applying %s of group %s to %d locks", op, group, len(targets)
+    )
+    started = time.monotonic()
+
+    async def _async_run(lock: dict[str, Any]) -> LockResult:
+        entry = lock["entry"]
+        result = LockResult(entry_id=entry.entry_id, title=entry.title)
+        lock_started = time.monotonic()
+        try:
+            await _async_apply(lock, op, group, data, result)
+            result.success = True
+        except CodeOperationError as err:
+            result.error = str(err)
+            result.code = err.code
+        except Exception as err:
+            _LOGGER.error(
+                "[async_fan_out] %s of group %s failed on %s: %s",
+                op,
+                group,
+                entry.title,
+                err,
+            )
+            result.error = str(err)
+            result.code = "failed"
+        result.elapsed = time.monotonic() - lock_started
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    results = await asyncio.gather(*(_async_run(lock) for lock in targets))
+    failed = sum(1 for result in results if not result.success)
+    elapsed = time.monotonic() - started
+    _LOGGER.info(
+        "[async_fan_out] %s of group %s done in %.1fs: %d succeeded, %d failed",
+        op,
+        group,
+        elapsed,
+        len(results) - failed,
+        failed,
+    )
+    return {
+        "group": group,
+        "op": op,
+        "succeeded": len(results) - failed,
+        "failed": failed,
+        "elapsed": round(elapsed, 3),
+        "results": [result.as_dict() for result in results],
+    }
+
+
+async def _async_apply(
+    lock: dict[str, Any],
+    op: str,
+    group: str,
+    data: dict[str, Any],
+    result: LockResult,
+) -> None:
+    """Apply the operation on one lock, filling in its result."""
+    manager = lock["manager"]
+    if op == OP_ADD:
+        outcome = await manager.async_add(
+            data["name"],
+            data["pin_code"],
+            data["type"],
+            data.get("expiry"),
+            data.get("slot"),
+            data.get("force", False),
+            group,
+        )
+        result.slots = [outcome["entry"]["slot"]]
+        result.confirmed = outcome["confirmed"]
+        result.queued = outcome["queued"]
+        return
+
+    slots = lock["storage"].group_slots(group)
+    if not slots:
+        raise CodeOperationError("not_found", f"No code of group {group} on this lock")
+    changes = {key: data[key] for key in _UPDATE_FIELDS if key in data}
+    for slot in slots:
+        if op == OP_REMOVE:
+            outcome = await manager.async_remove(slot)
+        else:
+            outcome = await manager.async_update(slot, changes)
+        result.slots.append(slot)
+        result.confirmed = outcome["confirmed"]
+        result.queued = result.queued or outcome["queued"]
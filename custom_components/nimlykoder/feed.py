@@ -0,0 +1,200 @@
+"""Live feed of code changes for WebSocket subscribers."""
+from __future__ import annotations
+
+from collections.abc import Callable
+import logging
+from typing import Any
+
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+from homeassistant.util import dt as dt_util
+
+from .adapters.mqtt_z2m import MqttZ2mAdapter
+from .const import ATTR_ENTRY_ID, EVENT_CLEANUP_COMPLETED
+from .outbox import NimlykoderOutbox
+from .storage import CodeEntry, NimlykoderStorage
+
+_LOGGER = logging.getLogger(__name__)
+
+FeedListener = Callable[[dict[str, Any]], None]
+
+
+class CodeFeed:
+    """Push one lock's code changes, cleanups and availability to subscribers.
+
+    Storage changes made in the same event loop iteration (a bulk request or
+    a cleanup batch) are coalesced into one `diff` message of added, changed
+    and removed entries. Every change bumps `revision`, so a subscriber can
+    tell a diff from one it has already applied; it is the storage revision,
+    so the same number nimlykoder/list answers `since_revision` against.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        entry_id: str,
+        storage: NimlykoderStorage,
+        adapter: MqttZ2mAdapter,
+        outbox: NimlykoderOutbox,
+    ) -> None:
+        """Initialize the feed."""
+        self.hass = hass
+        self.entry_id = entry_id
+        self._storage = storage
+        self._adapter = adapter
+        self._outbox = outbox
+        self._listeners: list[FeedListener] = []
+        # slot -> (entry before the first pending change, entry now)
+        self._pending: dict[int, tuple[CodeEntry | None, CodeEntry | None]] = {}
+        self._flush_scheduled = False
+        self._unsubs: list[CALLBACK_TYPE] = []
+
+    @property
+    def revision(self) -> int:
+        """Return the revision of the newest change."""
+        return self._storage.revision
+
+    @callback
+    def async_start(self) -> None:
+        """Start following storage, availability and cleanup events."""
+        self._unsubs = [
+            self._storage.async_add_listener(self._async_storage_changed),
+            self._adapter.availability.async_add_listener(
+                self._async_availability_changed
+            ),
+            self.hass.bus.async_listen(
+                EVENT_CLEANUP_COMPLETED, self._async_cleanup_completed
+            ),
+        ]
+
+    @callback
+    def async_stop(self) -> None:
+        """Stop following changes and drop every subscriber."""
+        for unsub in self._unsubs:
+            unsub()
+        self._unsubs = []
+        self._listeners = []
+        self._pending = {}
+
+    @callback
+    def async_subscribe(self, listener: FeedListener) -> CALLBACK_TYPE:
+        """Add a subscriber. Returns a function that removes it."""
+        self._listeners.append(listener)
+
+        @callback
+        def unsubscribe() -> None:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+        return unsubscribe
+
+    def metrics(self) -> dict[str, Any]:
+        """Return feed metrics."""
+        return {"revision": self.revision, "subscribers": len(self._listeners)}
+
+    def availability(self) -> dict[str, Any]:
+        """Return cached lock availability plus commands waiting for the lock."""
+        return {
+            **self._adapter.availability_state(),
+            "pending": self._outbox.depth,
+        }
+
+    def snapshot(self) -> dict[str, Any]:
+        """Return every code and the revision they are at."""
+        return {
+            "type": "snapshot",
+            "revision": self.revision,
+            "codes": [dict(code) for code in self._storage.list_dicts()],
+            "expired_count": self._storage.expired_count(dt_util.now()),
+            "availability": self.availability(),
+        }
+
+    def catch_up(self, revision: int | None) -> dict[str, Any] | None:
+        """Return what a subscriber that has the codes at `revision` missed.
+
+        None if nothing changed after it, a `diff` of the entries changed and
+        slots removed since if storage can still tell them apart (new
+        entries are among the changed ones), or else a snapshot.
+        """
+        if revision is None:
+            return self.snapshot()
+        if revision == self.revision:
+            return None
+        if (changes := self._storage.changes_since(revision)) is None:
+            return self.snapshot()
+        changed, removed = changes
+        return {
+            "type": "diff",
+            "revision": self.revision,
+            "added": [],
+            "changed": changed,
+            "removed": removed,
+            "expired_count": self._storage.expired_count(dt_util.now()),
+        }
+
+    @callback
+    def _async_publish(self, message: dict[str, Any]) -> None:
+        """Send a message to every subscriber."""
+        for listener in list(self._listeners):
+            try:
+                listener(message)
+            except Exception:
+                _LOGGER.exception("[CodeFeed] Subscriber failed")
+
+    @callback
+    def _async_storage_changed(
+        self, slot: int, old: CodeEntry | None, new: CodeEntry | None
+    ) -> None:
+        """Record a change and schedule a diff for the end of this iteration."""
+        if slot in self._pending:
+            old = self._pending[slot][0]
+        self._pending[slot] = (old, new)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self.hass.loop.call_soon(self._async_flush)
+
+    @callback
+    def _async_flush(self) -> None:
+        """Publish the changes recorded since the last diff."""
+        self._flush_scheduled = False
+        pending, self._pending = self._pending, {}
+        if not self._listeners:
+            return
+        added: list[dict[str, Any]] = []
+        changed: list[dict[str, Any]] = []
+        removed: list[int] = []
+        for slot, (old, new) in sorted(pending.items()):
+            if new is not None:
+                (added if old is None else changed).append(new.to_dict())
+            elif old is not None:
+                removed.append(slot)
+        if not (added or changed or removed):
+            return
+        self._async_publish(
+            {
+                "type": "diff",
+                "revision": self.revision,
+                "added": added,
+                "changed": changed,
+                "removed": removed,
+                "expired_count": self._storage.expired_count(dt_util.now()),
+            }
+        )
+
+    @callback
+    def _async_availability_changed(self, available: bool) -> None:
+        """Publish a change of lock availability."""
+        self._async_publish(
+            {"type": "availability", "availability": self.availability()}
+        )
+
+    @callback
+    def _async_cleanup_completed(self, event: Event) -> None:
+        """Publish the report of a cleanup run on this lock."""
+        if event.data.get(ATTR_ENTRY_ID) != self.entry_id:
+            return
+        report = {
+            key: value
+            for key, value in event.data.items()
+            if key != ATTR_ENTRY_ID
+        }
+        self._async_publish({"type": "cleanup", "report": report})
@@ -12,6 +12,10 @@ class NimlykoderPanel extends LitElement {
             route: { type: Object },
             panel: { type: Object },
             codes: { type: Array },
+            expiredCount: { type: Number },
+            availability: { type: Object },
+            locks: { type: Array },
+            entryId: { type: String },
             loading: { type: Boolean },
             error: { type: String },
             searchQuery: { type: String },
@@ -33,6 +37,14 @@ class NimlykoderPanel extends LitElement {
     constructor() {
         super();
         this.codes = [];
+        this.expiredCount = null;
+        this.availability = null;
+        this.locks = [];
+        this.entryId = null;
+        this.revision = null;
+        this.lastCleanup = null;
+        this._suggestion = null;
+        this._unsubscribe = null;
         this.loading = true;
         this.error = null;
         this.searchQuery = "";
@@ -67,6 +79,9 @@ class NimlykoderPanel extends LitElement {
                 active: "Active",
                 expired: "Expired",
                 reserved: "Reserved",
+                offline: "Offline",
+                pending: "{count} changes waiting for the lock",
+                select_lock: "Select lock",
             },
             type: {
                 permanent: "Permanent",
@@ -254,6 +269,17 @@ class NimlykoderPanel extends LitElement {
                 gap: 6px;
             }
 
+            .lock-select {
+                font-size: 16px;
+                font-weight: 500;
+                color: var(--text-primary);
+                background: transparent;
+                border: none;
+                padding: 0;
+                max-width: 100%;
+                cursor: pointer;
+            }
+
             .lock-status-state .dot {
                 width: 8px;
                 height: 8px;
@@ -856,21 +882,184 @@ class NimlykoderPanel extends LitElement {
         `;
     }
 
-    connectedCallback() {
+    async connectedCallback() {
         super.connectedCallback();
-        this.loadTranslations();
-        this.loadCodes();
+        if (!(await this._bootstrap())) {
+            this.loadTranslations();
+            await this.loadLocks();
+            this.loadConfig();
+        }
+        this._subscribe();
+    }
+
+    // Locks, codes, config, translations and a slot suggestion in one call
+    async _bootstrap() {
+        try {
+            const msg = { type: "nimlykoder/bootstrap" };
+            const saved = this.entryId || window.localStorage?.getItem("nimlykoder-lock");
+            if (saved) {
+                msg.entry_id = saved;
+            }
+            const cached = this._cachedTranslations();
+            if (cached) {
+                msg.translations_hash = cached.hash;
+            }
+            const result = await this.hass.callWS(msg);
+            this.locks = result.locks || [];
+            this.entryId = result.entry_id;
+            this.codes = result.codes || [];
+            this.revision = result.revision;
+            this.expiredCount = result.expired_count ?? null;
+            this.config = result.config;
+            this.availability = result.config?.availability ?? this.availability;
+            this._suggestion = { revision: result.revision, slot: result.suggested_slots?.[0] ?? null };
+            this._applyTranslations(result.language, result.translations_hash, result.translations, cached);
+            this.loading = false;
+            return true;
+        } catch (err) {
+            console.error("Failed to bootstrap panel:", err);
+            return false;
+        }
+    }
+
+    disconnectedCallback() {
+        super.disconnectedCallback();
+        this._unsubscribeFeed();
+    }
+
+    async loadLocks() {
+        try {
+            const result = await this.hass.callWS({
+                type: "nimlykoder/locks",
+            });
+            this.locks = result.locks || [];
+            const saved = window.localStorage?.getItem("nimlykoder-lock");
+            const known = (id) => this.locks.some((lock) => lock.entry_id === id);
+            if (!known(this.entryId)) {
+                this.entryId = known(saved) ? saved : this.locks[0]?.entry_id ?? null;
+            }
+        } catch (err) {
+            console.error("Failed to load locks:", err);
+        }
+    }
+
+    // Lock-specific commands go to the lock picked in the header
+    _callLock(msg) {
+        return this.hass.callWS(this.entryId ? { ...msg, entry_id: this.entryId } : msg);
+    }
+
+    _selectLock(e) {
+        this.entryId = e.target.value;
+        window.localStorage?.setItem("nimlykoder-lock", this.entryId);
+        this.codes = [];
+        this.availability = null;
+        this.loading = true;
+        this.revision = null;
+        this._suggestion = null;
+        this._subscribe();
         this.loadConfig();
     }
 
+    // Live updates: a snapshot first, then only what changed. After
+    // bootstrap we already have the codes, so only ask for what changed since
+    async _subscribe() {
+        this._unsubscribeFeed();
+        const msg = { type: "nimlykoder/subscribe" };
+        if (this.entryId) {
+            msg.entry_id = this.entryId;
+        }
+        if (this.revision !== null && this.revision !== undefined) {
+            msg.since_revision = this.revision;
+        }
+        try {
+            this._unsubscribe = await this.hass.connection.subscribeMessage(
+                (event) => this._handleFeed(event),
+                msg
+            );
+        } catch (err) {
+            console.error("Failed to subscribe to code changes:", err);
+            this._unsubscribe = null;
+            await this.loadCodes();
+        }
+    }
+
+    _unsubscribeFeed() {
+        if (this._unsubscribe) {
+            this._unsubscribe();
+            this._unsubscribe = null;
+        }
+    }
+
+    _handleFeed(event) {
+        switch (event.type) {
+            case "snapshot":
+                this.codes = event.codes || [];
+                this.revision = event.revision;
+                this.expiredCount = event.expired_count ?? null;
+                this.availability = event.availability ?? this.availability;
+                this.error = null;
+                this.loading = false;
+                break;
+            case "diff":
+                if (this.revision !== null && event.revision <= this.revision) {
+                    return;
+                }
+                this._applyDiff(event);
+                break;
+            case "availability":
+                this.availability = event.availability;
+                break;
+            case "cleanup":
+                this.lastCleanup = event.report;
+                break;
+        }
+    }
+
+    // Patch the codes array in place, keeping it ordered by slot
+    _applyDiff(diff) {
+        const removed = new Set(diff.removed || []);
+        const updates = new Map(
+            [...(diff.added || []), ...(diff.changed || [])].map((code) => [code.slot, code])
+        );
+        for (let i = this.codes.length - 1; i >= 0; i--) {
+            const slot = this.codes[i].slot;
+            if (removed.has(slot)) {
+                this.codes.splice(i, 1);
+            } else if (updates.has(slot)) {
+                this.codes[i] = updates.get(slot);
+                updates.delete(slot);
+            }
+        }
+        for (const code of updates.values()) {
+            const index = this.codes.findIndex((existing) => existing.slot > code.slot);
+            if (index === -1) {
+                this.codes.push(code);
+            } else {
+                this.codes.splice(index, 0, code);
+            }
+        }
+        this.revision = diff.revision;
+        this.expiredCount = diff.expired_count ?? this.expiredCount;
+        this.requestUpdate("codes");
+    }
+
+    // The subscription delivers our own changes; re-fetch only without it
+    async _refreshCodes() {
+        if (!this._unsubscribe) {
+            await this.loadCodes();
+        }
+    }
+
     async loadCodes() {
         try {
             this.loading = true;
             this.error = null;
-            const result = await this.hass.callWS({
+            const result = await this._callLock({
                 type: "nimlykoder/list",
             });
             this.codes = result.codes || [];
+            this.expiredCount = result.expired_count ?? null;
+            this.availability = result.availability ?? this.availability;
             this.loading = false;
         } catch (err) {
             this.error = err.message;
@@ -880,10 +1069,11 @@ class NimlykoderPanel extends LitElement {
 
     async loadConfig() {
         try {
-            const result = await this.hass.callWS({
+            const result = await this._callLock({
                 type: "nimlykoder/config",
             });
             this.config = result;
+            this.availability = result.availability ?? this.availability;
         } catch (err) {
             console.error("Failed to load config:", err);
         }
@@ -891,19 +1081,47 @@ class NimlykoderPanel extends LitElement {
 
     async loadTranslations() {
         try {
-            const result = await this.hass.callWS({
-                type: "nimlykoder/translations",
-            });
-            if (result && result.translations) {
-                // Deep merge with defaults
-                this.translations = this._mergeTranslations(this._defaultTranslations(), result.translations);
+            const msg = { type: "nimlykoder/translations" };
+            const cached = this._cachedTranslations();
+            if (cached) {
+                msg.hash = cached.hash;
             }
+            const result = await this.hass.callWS(msg);
+            this._applyTranslations(result.language, result.hash, result.translations, cached);
         } catch (err) {
             console.error("Failed to load translations:", err);
             // Keep default translations
         }
     }
 
+    // Translations are kept in the browser and only downloaded when their hash changes
+    _cachedTranslations() {
+        try {
+            return JSON.parse(window.localStorage?.getItem("nimlykoder-translations") || "null");
+        } catch (err) {
+            return null;
+        }
+    }
+
+    _applyTranslations(language, hash, translations, cached) {
+        if (!translations && cached && cached.hash === hash) {
+            translations = cached.translations;
+        } else if (translations && hash) {
+            try {
+                window.localStorage?.setItem(
+                    "nimlykoder-translations",
+                    JSON.stringify({ language, hash, translations })
+                );
+            } catch (err) {
+                // Storage full or disabled; the next open downloads them again
+            }
+        }
+        if (translations) {
+            // Deep merge with defaults
+            this.translations = this._mergeTranslations(this._defaultTranslations(), translations);
+        }
+    }
+
     _mergeTranslations(defaults, loaded) {
         const result = { ...defaults };
         for (const key of Object.keys(loaded)) {
@@ -947,22 +1165,31 @@ class NimlykoderPanel extends LitElement {
         return `${hour - 12}:${min} PM`;
     }
 
+    // Filtered once per search query and revision, not on every render
     get filteredCodes() {
         if (!this.searchQuery) return this.codes;
+        const cached = this._filtered;
+        if (cached && cached.codes === this.codes && cached.revision === this.revision
+            && cached.query === this.searchQuery) {
+            return cached.result;
+        }
         const query = this.searchQuery.toLowerCase();
-        return this.codes.filter(
+        const result = this.codes.filter(
             (code) =>
                 code.name.toLowerCase().includes(query) ||
                 code.slot.toString().includes(query) ||
                 code.type.toLowerCase().includes(query)
         );
+        this._filtered = { codes: this.codes, revision: this.revision, query: this.searchQuery, result };
+        return result;
     }
 
     get stats() {
         const total = this.codes.length;
         const permanent = this.codes.filter((c) => c.type === "permanent").length;
         const guest = this.codes.filter((c) => c.type === "guest").length;
-        const expired = this.codes.filter(
+        // Prefer the server's count, which uses the storage expiry index
+        const expired = this.expiredCount ?? this.codes.filter(
             (c) => c.expiry && new Date(c.expiry) < new Date()
         ).length;
         return { total, permanent, guest, expired };
@@ -1054,8 +1281,11 @@ class NimlykoderPanel extends LitElement {
         const state = lockState?.state || 'unknown';
         const isLocked = state === 'locked';
         const isUnlocked = state === 'unlocked';
-        const stateClass = isLocked ? 'locked' : isUnlocked ? 'unlocked' : 'unknown';
-        const stateText = isLocked ? 'Locked' : isUnlocked ? 'Unlocked' : 'Unknown';
+        // Reported by the integration, which tracks MQTT and Z2M availability
+        const isOffline = this.availability?.available === false;
+        const pending = (this.availability?.pending || 0) + (this.availability?.held || 0);
+        const stateClass = isOffline ? 'unknown' : isLocked ? 'locked' : isUnlocked ? 'unlocked' : 'unknown';
+        const stateText = isOffline ? this.t('status.offline') : isLocked ? 'Locked' : isUnlocked ? 'Unlocked' : 'Unknown';
         const availableSlots = (this.config?.slot_max || 99) - (this.config?.slot_min || 0) + 1 - this.codes.length;
 
         return html`
@@ -1072,10 +1302,23 @@ class NimlykoderPanel extends LitElement {
                     `}
                 </div>
                 <div class="lock-status-info">
-                    <div class="lock-status-name">${lockName}</div>
+                    ${this.locks.length > 1 ? html`
+                        <select
+                            class="lock-select"
+                            aria-label=${this.t('status.select_lock')}
+                            @change=${this._selectLock}
+                        >
+                            ${this.locks.map((lock) => html`
+                                <option value=${lock.entry_id} ?selected=${lock.entry_id === this.entryId}>
+                                    ${this.hass?.states?.[lock.lock_entity]?.attributes?.friendly_name || lock.title}
+                                </option>
+                            `)}
+                        </select>
+                    ` : html`<div class="lock-status-name">${lockName}</div>`}
                     <div class="lock-status-state">
                         <span class="dot ${stateClass}"></span>
                         ${stateText}
+                        ${pending ? html`· ${this.t('status.pending', { count: pending })}` : ''}
                     </div>
                 </div>
                 <div class="lock-status-slots">
@@ -1450,9 +1693,15 @@ class NimlykoderPanel extends LitElement {
     }
 
     async _openAddDialog() {
+        // The bootstrap suggestion holds until the codes change
+        if (this._suggestion && this._suggestion.revision === this.revision) {
+            this.suggestedSlot = this._suggestion.slot;
+            this.showAddDialog = true;
+            return;
+        }
         // Fetch the next available slot
         try {
-            const result = await this.hass.callWS({
+            const result = await this._callLock({
                 type: "nimlykoder/suggest_slots",
                 count: 1,
             });
@@ -1507,12 +1756,12 @@ class NimlykoderPanel extends LitElement {
         }
 
         try {
-            await this.hass.callWS({
+            await this._callLock({
                 type: "nimlykoder/add",
                 ...data,
             });
             this.showAddDialog = false;
-            await this.loadCodes();
+            await this._refreshCodes();
         } catch (err) {
             this.error = err.message;
         }
@@ -1535,66 +1784,82 @@ class NimlykoderPanel extends LitElement {
             return;
         }
 
-        try {
-            // Update name if changed
-            if (name !== this.editingCode.name) {
-                await this.hass.callWS({
-                    type: "nimlykoder/update_name",
-                    slot: this.editingCode.slot,
-                    name: name.trim(),
-                });
+        // Collect everything that changed into one update
+        const changes = {};
+        if (name.trim() !== this.editingCode.name) {
+            changes.name = name.trim();
+        }
+        if (this.editingCode.type === 'guest') {
+            const currentExpiry = this.editingCode.expiry || "";
+            if (expiry !== currentExpiry) {
+                changes.expiry = expiry || null;
             }
+        }
 
-            // Update expiry for guest codes
-            if (this.editingCode.type === 'guest') {
-                const currentExpiry = this.editingCode.expiry || "";
-                if (expiry !== currentExpiry) {
-                    await this.hass.callWS({
-                        type: "nimlykoder/update_expiry",
-                        slot: this.editingCode.slot,
-                        expiry: expiry || null,
-                    });
-                }
-            }
+        // If PIN is entered and valid, confirm first and send it all together
+        if (newPin) {
+            this.pendingPinUpdate = {
+                slot: this.editingCode.slot,
+                name: name.trim(),
+                pin_code: newPin,
+                changes,
+            };
+            this.showEditDialog = false;
+            this.showPinConfirmDialog = true;
+            return;
+        }
 
-            // If PIN is entered and valid, show confirmation dialog
-            if (newPin) {
-                this.pendingPinUpdate = {
+        try {
+            if (Object.keys(changes).length) {
+                await this._callLock({
+                    type: "nimlykoder/update",
                     slot: this.editingCode.slot,
-                    name: name.trim(),
-                    pin_code: newPin,
-                };
-                this.showEditDialog = false;
-                this.showPinConfirmDialog = true;
-                return;
+                    ...changes,
+                });
             }
 
             this.showEditDialog = false;
             this.editingCode = null;
-            await this.loadCodes();
+            await this._refreshCodes();
         } catch (err) {
             this.error = err.message;
         }
     }
 
-    _closePinConfirmDialog() {
+    async _closePinConfirmDialog() {
+        const pending = this.pendingPinUpdate;
         this.showPinConfirmDialog = false;
         this.pendingPinUpdate = null;
+
+        // Declining the PIN change still saves the other edits
+        if (pending && Object.keys(pending.changes || {}).length) {
+            try {
+                await this._callLock({
+                    type: "nimlykoder/update",
+                    slot: pending.slot,
+                    ...pending.changes,
+                });
+                await this._refreshCodes();
+            } catch (err) {
+                this.error = err.message;
+            }
+        }
     }
 
     async _confirmPinUpdate() {
         if (!this.pendingPinUpdate) return;
 
         try {
-            await this.hass.callWS({
-                type: "nimlykoder/update_pin",
+            await this._callLock({
+                type: "nimlykoder/update",
                 slot: this.pendingPinUpdate.slot,
+                ...this.pendingPinUpdate.changes,
                 pin_code: this.pendingPinUpdate.pin_code,
             });
             this.showPinConfirmDialog = false;
             this.pendingPinUpdate = null;
             this.editingCode = null;
-            await this.loadCodes();
+            await this._refreshCodes();
         } catch (err) {
             this.error = err.message;
         }
@@ -1602,13 +1867,13 @@ class NimlykoderPanel extends LitElement {
 
     async _handleRemove() {
         try {
-            await this.hass.callWS({
+            await this._callLock({
                 type: "nimlykoder/remove",
                 slot: this.removingCode.slot,
             });
             this.showRemoveDialog = false;
             this.removingCode = null;
-            await this.loadCodes();
+            await this._refreshCodes();
         } catch (err) {
             this.error = err.message;
         }
@@ -0,0 +1,234 @@
+"""Write-ahead journal of code changes that touch the lock."""
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass, field
+import logging
+import time
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import (
+    JOURNAL_STORAGE_KEY,
+    JOURNAL_STORAGE_VERSION,
+    JOURNAL_SAVE_DELAY,
+)
+from .storage import NimlykoderStorage
+
+_LOGGER = logging.getLogger(__name__)
+
+# Written before the lock command is sent
+INTENT_PENDING = "pending"
+# The lock confirmed the command
+INTENT_COMMITTED = "committed"
+# Applied to storage in memory; dropped once storage is on disk
+INTENT_DONE = "done"
+
+
+@dataclass(slots=True)
+class Intent:
+    """One code change, recorded before it reaches the lock.
+
+    `fields` holds the storage side of the change (name, type, expiry),
+    never the PIN. `replaces` is set when an add overwrites a stored code.
+    """
+
+    seq: int
+    op: str
+    slot: int
+    fields: dict[str, Any] = field(default_factory=dict)
+    state: str = INTENT_PENDING
+    replaces: bool = False
+    created: float = 0.0
+
+
+class IntentJournal:
+    """Persist intents so a crash between the lock and storage can be repaired.
+
+    Every change that sends a lock command is journaled with an increasing
+    sequence number and written to disk before the command goes out. Storage
+    records which intents it reflects, atomically with the codes themselves:
+    the highest sequence number below which every intent has been applied
+    (its watermark), plus the intents above it that are already done while
+    an older one is still open. At startup, intents storage does not
+    reflect are either replayed into storage (the lock has them) or rolled
+    back on the lock (it may or may not), without reading the lock's whole
+    user table. Whether the journal's own record of an intent being done
+    made it to disk does not matter.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        storage: NimlykoderStorage,
+        key: str = JOURNAL_STORAGE_KEY,
+    ) -> None:
+        """Initialize the journal and attach its watermark to storage."""
+        self.hass = hass
+        self._storage = storage
+        self._store = Store(hass, JOURNAL_STORAGE_VERSION, key)
+        self._intents: dict[int, Intent] = {}
+        self._next_seq = 1
+        self._writes = 0
+        storage.sequence = self.applied
+
+    @property
+    def depth(self) -> int:
+        """Return the number of intents on record."""
+        return len(self._intents)
+
+    async def async_load(self) -> None:
+        """Load intents from disk. Storage must be loaded first."""
+        data = await self._store.async_load() or {}
+        self._intents = {}
+        for raw in data.get("intents", []):
+            try:
+                intent = Intent(**raw)
+            except TypeError:
+                _LOGGER.warning("[IntentJournal] Skipping malformed intent: %s", raw)
+                continue
+            self._intents[intent.seq] = intent
+        self._next_seq = max(
+            data.get("next_seq", 1),
+            self._storage.applied_seq + 1,
+            max(self._storage.applied_above, default=0) + 1,
+            max(self._intents, default=0) + 1,
+        )
+        _LOGGER.debug(
+            "[IntentJournal] Loaded %d intents, next sequence %d",
+            len(self._intents),
+            self._next_seq,
+        )
+
+    def unapplied(self) -> list[Intent]:
+        """Return intents that storage on disk does not reflect, oldest first."""
+        return sorted(
+            (
+                intent
+                for intent in self._intents.values()
+                if not self._storage_has(intent.seq)
+            ),
+            key=lambda intent: intent.seq,
+        )
+
+    def _storage_has(self, seq: int) -> bool:
+        """Return True if storage on disk reflects the intent."""
+        return seq <= self._storage.applied_seq or seq in self._storage.applied_above
+
+    @callback
+    def watermark(self) -> int:
+        """Return the highest sequence number at and below which all is applied."""
+        open_seqs = [
+            intent.seq
+            for intent in self._intents.values()
+            if intent.state != INTENT_DONE
+        ]
+        return (min(open_seqs) if open_seqs else self._next_seq) - 1
+
+    @callback
+    def applied(self) -> tuple[int, list[int]]:
+        """Return the watermark and the done intents above it, for storage."""
+        watermark = self.watermark()
+        return watermark, sorted(
+            seq
+            for seq, intent in self._intents.items()
+            if seq > watermark and intent.state == INTENT_DONE
+        )
+
+    async def async_begin(
+        self, changes: list[tuple[str, int, dict[str, Any], bool]]
+    ) -> list[Intent]:
+        """Record (op, slot, fields, replaces) changes and write them to disk.
+
+        Returns once the intents are durable; only then may the lock commands
+        be sent. Several changes are written together in one save.
+        """
+        now = time.time()
+        intents = []
+        for op, slot, fields, replaces in changes:
+            intent = Intent(
+                seq=self._next_seq,
+                op=op,
+                slot=slot,
+                fields=fields,
+                replaces=replaces,
+                created=now,
+            )
+            self._next_seq += 1
+            self._intents[intent.seq] = intent
+            intents.append(intent)
+        await self._async_save()
+        return intents
+
+    @callback
+    def async_commit(self, intents: list[Intent]) -> None:
+        """Mark intents whose lock command went through."""
+        self._async_set_state(intents, INTENT_COMMITTED)
+
+    @callback
+    def async_done(self, intents: list[Intent]) -> None:
+        """Mark intents that have been applied to storage."""
+        self._async_set_state(intents, INTENT_DONE)
+
+    @callback
+    def async_abort(self, intents: list[Intent]) -> None:
+        """Forget intents whose lock command failed and that were not stored."""
+        for intent in intents:
+            self._intents.pop(intent.seq, None)
+        self._async_schedule_save()
+
+    async def async_clear(self) -> None:
+        """Forget every intent after recovery. Storage must be saved first."""
+        self._intents = {}
+        await self._async_save()
+
+    async def async_flush(self) -> None:
+        """Write the journal now, e.g. on unload."""
+        await self._async_save()
+
+    def metrics(self) -> dict[str, Any]:
+        """Return journal metrics."""
+        return {
+            "depth": len(self._intents),
+            "next_seq": self._next_seq,
+            "watermark": self.watermark(),
+            "applied_seq": self._storage.applied_seq,
+            "applied_above": len(self._storage.applied_above),
+            "writes": self._writes,
+        }
+
+    @callback
+    def _async_set_state(self, intents: list[Intent], state: str) -> None:
+        """Move intents to a later state and schedule a write."""
+        for intent in intents:
+            intent.state = state
+        self._async_schedule_save()
+
+    @callback
+    def _async_schedule_save(self) -> None:
+        """Write state changes after a short delay.
+
+        Losing one of these in a crash is safe: a pending intent is rolled
+        back and a stale committed one replayed, and anything storage already
+        holds is skipped, since storage records the intents it reflects.
+        """
+        self._store.async_delay_save(self._data_to_save, JOURNAL_SAVE_DELAY)
+
+    async def _async_save(self) -> None:
+        """Write the journal immediately."""
+        await self._store.async_save(self._data_to_save())
+
+    @callback
+    def _data_to_save(self) -> dict[str, Any]:
+        """Return the data to write, dropping intents storage has persisted."""
+        self._intents = {
+            seq: intent
+            for seq, intent in self._intents.items()
+            if not (intent.state == INTENT_DONE and self._storage_has(seq))
+        }
+        self._writes += 1
+        return {
+            "next_seq": self._next_seq,
+            "intents": [asdict(intent) for intent in self._intents.values()],
+        }
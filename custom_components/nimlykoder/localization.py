@@ -0,0 +1,69 @@
+"""In-memory panel translations for Nimlykoder."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.json import json_bytes
+
+from .const import DATA_TRANSLATIONS
+
+_LOGGER = logging.getLogger(__name__)
+
+TRANSLATIONS_DIR = Path(__file__).parent / "translations"
+FALLBACK_LANGUAGE = "en"
+
+
+@dataclass(frozen=True, slots=True)
+class PanelTranslations:
+    """Serialized panel strings of one language and a hash of them."""
+
+    language: str
+    data: bytes
+    hash: str
+
+
+async def async_load_panel_translations(hass: HomeAssistant) -> None:
+    """Read the panel strings of every shipped language, once.
+
+    Later calls are no-ops until the cache is dropped on the last unload.
+    """
+    if DATA_TRANSLATIONS in hass.data:
+        return
+
+    def _load_translations() -> dict[str, dict]:
+        """Load translation files (runs in executor to avoid blocking)."""
+        loaded = {}
+        for path in sorted(TRANSLATIONS_DIR.glob("*.json")):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    loaded[path.stem] = json.load(f).get("panel", {})
+            except (OSError, ValueError) as err:
+                _LOGGER.error("Could not load translations from %s: %s", path, err)
+        return loaded
+
+    loaded = await hass.async_add_executor_job(_load_translations)
+    cache: dict[str, PanelTranslations] = {}
+    for language, panel in loaded.items():
+        data = json_bytes(panel)
+        cache[language] = PanelTranslations(
+            language, data, hashlib.sha256(data).hexdigest()[:16]
+        )
+    hass.data[DATA_TRANSLATIONS] = cache
+    _LOGGER.debug("Loaded panel translations for %s", sorted(cache))
+
+
+def get_panel_translations(
+    hass: HomeAssistant, language: str | None
+) -> PanelTranslations:
+    """Return the panel strings for a language, falling back to English."""
+    cache: dict[str, PanelTranslations] = hass.data.get(DATA_TRANSLATIONS, {})
+    if translations := cache.get(language or FALLBACK_LANGUAGE):
+        return translations
+    if translations := cache.get(FALLBACK_LANGUAGE):
+        return translations
+    return PanelTranslations(FALLBACK_LANGUAGE, b"{}", "")
@@ -0,0 +1,72 @@
+"""Lookup of the locks managed by Nimlykoder config entries."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN, CONF_LOCK_ENTITY
+from .manager import CodeOperationError
+
+
+def get_locks(hass: HomeAssistant) -> dict[str, dict[str, Any]]:
+    """Return the runtime data of every loaded lock, keyed by entry_id."""
+    return hass.data.get(DOMAIN, {})
+
+
+def resolve_lock(
+    hass: HomeAssistant, entry_id: str | None = None, lock: str | None = None
+) -> dict[str, Any]:
+    """Return the runtime data of the lock a call targets.
+
+    Args:
+        hass: Home Assistant instance
+        entry_id: Config entry of the lock
+        lock: Entity id of the lock, used when entry_id is not given
+
+    Without a target the only configured lock is used.
+
+    Raises:
+        CodeOperationError: If no lock matches, or several are configured
+                            and none was picked
+    """
+    locks = get_locks(hass)
+    if entry_id is not None:
+        if (data := locks.get(entry_id)) is None:
+            raise CodeOperationError(
+                "lock_not_found", f"No Nimlykoder lock with entry_id {entry_id}"
+            )
+        return data
+    if lock is not None:
+        for data in locks.values():
+            if data["config"].get(CONF_LOCK_ENTITY) == lock:
+                return data
+        raise CodeOperationError("lock_not_found", f"Lock {lock} is not managed")
+    if len(locks) == 1:
+        return next(iter(locks.values()))
+    if not locks:
+        raise CodeOperationError("lock_not_found", "No Nimlykoder lock is set up")
+    raise CodeOperationError(
+        "lock_required",
+        f"{len(locks)} locks are configured; specify entry_id or lock",
+    )
+
+
+def resolve_locks(
+    hass: HomeAssistant,
+    entry_ids: list[str] | None = None,
+    locks: list[str] | None = None,
+) -> list[dict[str, Any]]:
+    """Return the runtime data of several locks; all of them if none are named.
+
+    Raises:
+        CodeOperationError: If a named lock is not set up, or none are
+    """
+    if not entry_ids and not locks:
+        if not (targets := list(get_locks(hass).values())):
+            raise CodeOperationError("lock_not_found", "No Nimlykoder lock is set up")
+        return targets
+    targets = [resolve_lock(hass, entry_id=entry_id) for entry_id in entry_ids or ()]
+    targets += [resolve_lock(hass, lock=lock) for lock in locks or ()]
+    # The same lock named twice is only sent to once
+    return list({data["entry"].entry_id: data for data in targets}.values())
@@ -0,0 +1,965 @@
+"""Code management pipeline shared by services and the WebSocket API."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import datetime
+import logging
+import time
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.util import dt as dt_util
+
+from .adapters.command_queue import TimingStat
+from .adapters.mqtt_z2m import MqttZ2mAdapter
+from .allocator import SlotAllocator
+from .bulk import (
+    OP_ADD,
+    OP_REMOVE,
+    OP_UPDATE,
+    PATCH_FIELDS,
+    BulkItem,
+    validate_changes,
+    validate_expiry,
+    validate_item,
+    validate_pin,
+)
+from .cleanup import CleanupLimiter, SweepReport
+from .const import (
+    CONF_LOCK_ENTITY,
+    CONF_OVERWRITE_PROTECTION,
+    CONF_SLOT_MIN,
+    CONF_SLOT_MAX,
+    TYPE_GUEST,
+    ATTR_ENTRY_ID,
+    ATTR_LOCK,
+    EVENT_CLEANUP_COMPLETED,
+)
+from .journal import INTENT_PENDING, Intent, IntentJournal
+from .storage import NimlykoderStorage
+
+_LOGGER = logging.getLogger(__name__)
+
+# Storage fields a patch can change; pin_code goes to the lock instead
+_STORED_FIELDS = ("name", "expiry", "type")
+
+
+def _sends_command(item: BulkItem) -> bool:
+    """Return True if a bulk item sends a command to the lock."""
+    return item.op != OP_UPDATE or "pin_code" in item.data
+
+
+class CodeOperationError(HomeAssistantError):
+    """A code operation was rejected. `code` is the WebSocket error code."""
+
+    def __init__(self, code: str, message: str) -> None:
+        """Initialize the error."""
+        super().__init__(message)
+        self.code = code
+
+
+class CodeManager:
+    """Validate, allocate, send and store code changes for one lock.
+
+    Services and WebSocket commands are thin wrappers around this class.
+    A per-lock mutex covers the two short critical sections of every
+    operation: checking and reserving the slot, and committing to storage.
+    Lock commands run outside it, so independent slots still pipeline
+    through the command queue while the allocator's reservation keeps a
+    slot from being claimed twice in between.
+
+    Every change that sends a lock command is journaled first: the intent
+    is written to disk, committed when the lock confirms the command and
+    marked done once storage holds it, in the same storage write. An
+    unconfirmed command leaves its intent pending, so a crash before storage
+    rolls it back rather than assuming the lock has it. async_recover()
+    repairs whatever a crash left in between; it runs in the background at
+    setup and every operation waits for it.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        storage: NimlykoderStorage,
+        allocator: SlotAllocator,
+        adapter: MqttZ2mAdapter,
+        journal: IntentJournal,
+        config: dict[str, Any],
+        entry_id: str | None = None,
+    ) -> None:
+        """Initialize the manager."""
+        self.hass = hass
+        self.storage = storage
+        self.allocator = allocator
+        self.adapter = adapter
+        self.journal = journal
+        self.config = config
+        self.entry_id = entry_id
+        self._mutex = asyncio.Lock()
+        # Cleared while async_recover() runs in the background
+        self._recovered = asyncio.Event()
+        self._recovered.set()
+        self._mutex_wait = TimingStat()
+        self._timings: dict[str, TimingStat] = {}
+        self._failures: dict[str, int] = {}
+        self._last_sweep: SweepReport | None = None
+
+    @asynccontextmanager
+    async def _async_locked(self) -> AsyncIterator[None]:
+        """Hold the per-lock mutex, recording how long we waited for it.
+
+        Waits for a running recovery first.
+        """
+        started = time.monotonic()
+        await self._recovered.wait()
+        async with self._mutex:
+            self._mutex_wait.record(time.monotonic() - started)
+            yield
+
+    @asynccontextmanager
+    async def _async_track(self, operation: str) -> AsyncIterator[None]:
+        """Record the duration and outcome of an operation."""
+        started = time.monotonic()
+        try:
+            yield
+        except Exception:
+            self._failures[operation] = self._failures.get(operation, 0) + 1
+            raise
+        finally:
+            self._timings.setdefault(operation, TimingStat()).record(
+                time.monotonic() - started
+            )
+
+    def metrics(self) -> dict[str, Any]:
+        """Return per-operation timings, mutex contention and the last sweep."""
+        return {
+            "mutex_wait": self._mutex_wait.as_dict(),
+            "operations": {
+                operation: {
+                    **stat.as_dict(),
+                    "failures": self._failures.get(operation, 0),
+                }
+                for operation, stat in self._timings.items()
+            },
+            "last_sweep": self._last_sweep.as_dict() if self._last_sweep else None,
+        }
+
+    @property
+    def _overwrite_protection(self) -> bool:
+        """Return True if occupied slots need force to be overwritten."""
+        return self.config.get(CONF_OVERWRITE_PROTECTION, True)
+
+    def _reserve_for_add(self, slot: int | None, force: bool) -> int:
+        """Pick and reserve a slot for an add. Call with the mutex held."""
+        if slot is None:
+            slot = self.allocator.reserve_first_free()
+            if slot is None:
+                raise CodeOperationError("no_free_slots", "No free slots available")
+            _LOGGER.info("[CodeManager] Auto-selected slot: %d", slot)
+            return slot
+
+        if not self.allocator.in_range(slot):
+            raise CodeOperationError(
+                "invalid_slot",
+                f"Slot {slot} outside configured range "
+                f"({self.config[CONF_SLOT_MIN]}-{self.config[CONF_SLOT_MAX]})",
+            )
+        if self.storage.is_slot_occupied(slot):
+            if not force and self._overwrite_protection:
+                raise CodeOperationError(
+                    "slot_occupied",
+                    f"Slot {slot} is occupied. Use force to overwrite",
+                )
+            _LOGGER.warning("[CodeManager] Overwriting occupied slot %d", slot)
+        self._reserve(slot)
+        return slot
+
+    def _reserve(self, slot: int) -> None:
+        """Reserve a specific slot. Call with the mutex held."""
+        if not self.allocator.reserve(slot):
+            raise CodeOperationError(
+                "slot_busy", f"Slot {slot} is being modified by another request"
+            )
+
+    async def async_add(
+        self,
+        name: str,
+        pin_code: str,
+        code_type: str,
+        expiry: str | None = None,
+        slot: int | None = None,
+        force: bool = False,
+        group: str | None = None,
+    ) -> dict[str, Any]:
+        """Add a code: validate, reserve a slot, send it to the lock, store it.
+
+        If storage fails after the lock accepted the code, the code is
+        removed from the lock again. `group` links copies of one code that
+        were pushed to several locks.
+
+        Raises:
+            CodeOperationError: On invalid input, no usable slot, or failure
+        """
+        async with self._async_track("add"):
+            if not (name or "").strip():
+                raise CodeOperationError("invalid_input", "Name cannot be empty")
+            name = name.strip()
+            if error := validate_pin(pin_code):
+                raise CodeOperationError("invalid_input", error)
+            if code_type == TYPE_GUEST and not expiry:
+                raise CodeOperationError(
+                    "invalid_input", "Guest codes must have an expiry date"
+                )
+            if error := validate_expiry(expiry):
+                raise CodeOperationError("invalid_input", error)
+
+            async with self._async_locked():
+                slot = self._reserve_for_add(slot, force)
+
+            try:
+                (intent,) = await self.journal.async_begin(
+                    [
+                        (
+                            OP_ADD,
+                            slot,
+                            {
+                                "name": name,
+                                "type": code_type,
+                                "expiry": expiry,
+                                "group": group,
+                            },
+                            self.storage.is_slot_occupied(slot),
+                        )
+                    ]
+                )
+                try:
+                    result = await self.adapter.add_code(slot, pin_code)
+                except Exception as err:
+                    _LOGGER.error(
+                        "[CodeManager] MQTT publish failed for slot %d: %s", slot, err
+                    )
+                    self.journal.async_abort([intent])
+                    raise CodeOperationError(
+                        "mqtt_error", f"Failed to add code via MQTT: {err}"
+                    ) from err
+                if result.confirmed:
+                    self.journal.async_commit([intent])
+
+                try:
+                    async with self._async_locked(), self.storage.async_batch():
+                        entry = await self.storage.add(
+                            slot, name, code_type, expiry, group
+                        )
+                        self.journal.async_done([intent])
+                except Exception as err:
+                    _LOGGER.error(
+                        "[CodeManager] Storage failed for slot %d, rolling back MQTT: %s",
+                        slot,
+                        err,
+                    )
+                    try:
+                        await self.adapter.remove_code(slot)
+                    except Exception as rollback_err:
+                        _LOGGER.error(
+                            "[CodeManager] MQTT rollback also failed: %s", rollback_err
+                        )
+                    else:
+                        self.journal.async_abort([intent])
+                    raise CodeOperationError("storage_error", str(err)) from err
+            finally:
+                self.allocator.release(slot)
+
+            _LOGGER.info(
+                "[CodeManager] Added %s code '%s' to slot %d", code_type, name, slot
+            )
+            return {
+                "entry": entry.to_dict(),
+                "confirmed": result.confirmed,
+                "queued": result.queued,
+            }
+
+    async def async_remove(self, slot: int) -> dict[str, Any]:
+        """Remove a code from the lock, then from storage.
+
+        Raises:
+            CodeOperationError: If the slot is unknown, busy, or MQTT fails
+        """
+        async with self._async_track("remove"):
+            async with self._async_locked():
+                entry = self.storage.get(slot)
+                if entry is None:
+                    raise CodeOperationError("not_found", f"Slot {slot} not found")
+                self._reserve(slot)
+
+            try:
+                _LOGGER.info(
+                    "[CodeManager] Removing code '%s' from slot %d", entry.name, slot
+                )
+                (intent,) = await self.journal.async_begin(
+                    [(OP_REMOVE, slot, {}, True)]
+                )
+                try:
+                    result = await self.adapter.remove_code(slot)
+                except Exception as err:
+                    self.journal.async_abort([intent])
+                    raise CodeOperationError(
+                        "mqtt_error", f"Failed to remove code via MQTT: {err}"
+                    ) from err
+                if result.confirmed:
+                    self.journal.async_commit([intent])
+
+                async with self._async_locked(), self.storage.async_batch():
+                    await self.storage.remove(slot)
+                    self.journal.async_done([intent])
+            finally:
+                self.allocator.release(slot)
+
+            _LOGGER.info("[CodeManager] Removed code from slot %d", slot)
+            return {
+                "success": True,
+                "confirmed": result.confirmed,
+                "queued": result.queued,
+            }
+
+    async def async_update(self, slot: int, changes: dict[str, Any]) -> dict[str, Any]:
+        """Apply any subset of name/expiry/type/pin_code to one code.
+
+        Everything is validated first. A new PIN is sent to the lock as a
+        single command; the storage change is one mutation and one save,
+        whichever fields are set.
+
+        Raises:
+            CodeOperationError: If the slot is unknown, the patch is invalid
+                                or the lock command fails
+        """
+        async with self._async_track("update"):
+            async with self._async_locked():
+                entry = self.storage.get(slot)
+                if entry is None:
+                    raise CodeOperationError("not_found", f"Slot {slot} not found")
+                if error := validate_changes(entry, changes):
+                    raise CodeOperationError("invalid_input", error)
+                self._reserve(slot)
+
+            _LOGGER.info(
+                "[CodeManager] Updating slot %d: %s",
+                slot,
+                [key for key in PATCH_FIELDS if key in changes],
+            )
+            stored = {key: changes[key] for key in _STORED_FIELDS if key in changes}
+            try:
+                result = None
+                intents: list[Intent] = []
+                if "pin_code" in changes:
+                    intents = await self.journal.async_begin(
+                        [(OP_UPDATE, slot, stored, True)]
+                    )
+                    try:
+                        result = await self.adapter.add_code(slot, changes["pin_code"])
+                    except Exception as err:
+                        _LOGGER.error("[CodeManager] MQTT publish failed: %s", err)
+                        self.journal.async_abort(intents)
+                        raise CodeOperationError(
+                            "mqtt_error", f"Failed to update PIN via MQTT: {err}"
+                        ) from err
+                    if result.confirmed:
+                        self.journal.async_commit(intents)
+
+                async with self._async_locked(), self.storage.async_batch():
+                    entry = await self.storage.update(slot, stored)
+                    self.journal.async_done(intents)
+            finally:
+                self.allocator.release(slot)
+
+            return {
+                "success": True,
+                "entry": entry.to_dict(),
+                "confirmed": result.confirmed if result else None,
+                "queued": result.queued if result else False,
+            }
+
+    async def async_update_expiry(self, slot: int, expiry: str | None) -> dict[str, Any]:
+        """Change only the expiry; None clears it.
+
+        Raises:
+            CodeOperationError: If the expiry is invalid, or the slot unknown
+                                or busy
+        """
+        async with self._async_track("update_expiry"):
+            if error := validate_expiry(expiry):
+                raise CodeOperationError("invalid_input", error)
+            async with self._async_locked():
+                if self.storage.get(slot) is None:
+                    raise CodeOperationError("not_found", f"Slot {slot} not found")
+                # Not while a lock command for the slot is in flight
+                self._reserve(slot)
+                try:
+                    entry = await self.storage.update_expiry(slot, expiry)
+                except HomeAssistantError as err:
+                    raise CodeOperationError("update_failed", str(err)) from err
+                finally:
+                    self.allocator.release(slot)
+            _LOGGER.info("[CodeManager] Updated expiry for slot %d to %s", slot, expiry)
+            return {"entry": entry.to_dict()}
+
+    async def async_update_name(self, slot: int, name: str) -> dict[str, Any]:
+        """Change only the name.
+
+        Raises:
+            CodeOperationError: If the name is empty, or the slot unknown or busy
+        """
+        async with self._async_track("update_name"):
+            if not name or not name.strip():
+                raise CodeOperationError("invalid_input", "Name cannot be empty")
+            async with self._async_locked():
+                if self.storage.get(slot) is None:
+                    raise CodeOperationError("not_found", f"Slot {slot} not found")
+                # Not while a lock command for the slot is in flight
+                self._reserve(slot)
+                try:
+                    entry = await self.storage.update_name(slot, name)
+                finally:
+                    self.allocator.release(slot)
+            _LOGGER.info("[CodeManager] Updated name for slot %d to '%s'", slot, name)
+            return {"entry": entry.to_dict()}
+
+    async def async_bulk_apply(self, operations: list[dict[str, Any]]) -> dict[str, Any]:
+        """Validate and apply a list of add/remove/update operations.
+
+        Every operation is validated before anything is sent; if any is
+        invalid nothing is applied. Slots for adds without one are allocated
+        in one pass, lock commands are submitted together so the command
+        queue can pipeline them, and storage is written once at the end. An
+        operation whose lock command fails leaves storage untouched for that
+        slot; an add that storage rejects is removed from the lock again
+        once storage is released.
+
+        Returns:
+            {"applied", "succeeded", "failed", "results"} with one result per
+            operation, in request order
+        """
+        async with self._async_track("bulk_apply"):
+            items = [
+                BulkItem(index=index, op=op["op"], data=op, slot=op.get("slot"))
+                for index, op in enumerate(operations)
+            ]
+
+            async with self._async_locked():
+                self._validate_and_reserve(items)
+
+            if any(item.error for item in items):
+                self._release(items)
+                _LOGGER.warning(
+                    "[CodeManager] Rejected %d bulk operations: %s",
+                    len(items),
+                    [item.error for item in items if item.error],
+                )
+                return {
+                    "applied": False,
+                    "succeeded": 0,
+                    "failed": len(items),
+                    "results": [
+                        {
+                            **item.as_dict(),
+                            "success": False,
+                            "error": item.error or "Not applied",
+                        }
+                        for item in items
+                    ],
+                }
+
+            _LOGGER.info("[CodeManager] Applying %d bulk operations", len(items))
+            try:
+                # One journal write covers every lock command in the request
+                sent = [item for item in items if _sends_command(item)]
+                intents = dict(
+                    zip(
+                        (item.index for item in sent),
+                        await self.journal.async_begin(
+                            [self._intent_for(item) for item in sent]
+                        ),
+                    )
+                )
+
+                # Submit every lock command at once; the command queue paces them
+                await asyncio.gather(*(self._async_send_item(item) for item in items))
+                self.journal.async_commit(
+                    [
+                        intents[item.index]
+                        for item in sent
+                        if item.error is None and item.result.confirmed
+                    ]
+                )
+
+                rejected: list[BulkItem] = []
+                async with self._async_locked(), self.storage.async_batch():
+                    for item in items:
+                        if item.error is None and not await self._async_store_item(
+                            item
+                        ):
+                            rejected.append(item)
+                    self.journal.async_done(
+                        [intents[item.index] for item in sent if item.error is None]
+                    )
+                # Outside the mutex and the batch, so neither other requests
+                # nor the storage write wait for these lock commands
+                stranded = {
+                    item.index
+                    for item in await self._async_roll_back(
+                        [item for item in rejected if item.op == OP_ADD]
+                    )
+                }
+                # Forget every failed change, except adds still on the lock:
+                # recovery replays those into storage after a restart
+                self.journal.async_abort(
+                    [
+                        intents[item.index]
+                        for item in sent
+                        if item.error is not None and item.index not in stranded
+                    ]
+                )
+            finally:
+                self._release(items)
+
+            failed = sum(1 for item in items if item.error is not None)
+            _LOGGER.info(
+                "[CodeManager] Bulk completed: %d succeeded, %d failed",
+                len(items) - failed,
+                failed,
+            )
+            return {
+                "applied": True,
+                "succeeded": len(items) - failed,
+                "failed": failed,
+                "results": [item.as_dict() for item in items],
+            }
+
+    @callback
+    def async_start_recovery(self, entry: ConfigEntry) -> None:
+        """Run async_recover() in the background of the config entry.
+
+        Lock commands for interrupted changes can take minutes on a slow
+        lock, so setup does not wait for them. Every operation waits for
+        the mutex until recovery has finished, failed or been cancelled.
+        """
+        self._recovered.clear()
+        entry.async_create_background_task(
+            self.hass,
+            self._async_recover_in_background(),
+            f"nimlykoder recovery {entry.entry_id}",
+        )
+
+    async def _async_recover_in_background(self) -> None:
+        """Recover, then let operations through whatever happened."""
+        try:
+            await self.async_recover()
+        except Exception:
+            _LOGGER.exception("[CodeManager] Recovery failed")
+        finally:
+            self._recovered.set()
+
+    async def async_recover(self) -> dict[str, list[int]]:
+        """Repair changes a crash left between the lock and storage.
+
+        Runs at setup, before any other operation gets the mutex (see
+        async_start_recovery). Intents storage already reflects are skipped.
+        A committed intent reached the lock, so it is replayed into storage.
+        A pending one may or may not have reached the lock: an add is rolled
+        back by removing the slot from the lock (and from storage if it
+        overwrote a stored code, whose PIN is now uncertain), a removal is
+        carried out again, and a PIN update is dropped with a warning since
+        the old PIN cannot be restored.
+
+        Returns:
+            {"replayed", "rolled_back", "uncertain"} lists of slots
+        """
+        report: dict[str, list[int]] = {
+            "replayed": [],
+            "rolled_back": [],
+            "uncertain": [],
+        }
+        intents = self.journal.unapplied()
+        if not intents:
+            if self.journal.depth:
+                await self.journal.async_clear()
+            return report
+
+        _LOGGER.warning(
+            "[CodeManager] Recovering %d interrupted code changes", len(intents)
+        )
+        async with self._async_track("recover"):
+            # Clear the slots of interrupted adds and removals on the lock
+            # together; the command queue paces them
+            clear = [
+                intent
+                for intent in intents
+                if intent.state == INTENT_PENDING and intent.op != OP_UPDATE
+            ]
+            results = await asyncio.gather(
+                *(self.adapter.remove_code(intent.slot) for intent in clear),
+                return_exceptions=True,
+            )
+            failed = {
+                intent.seq
+                for intent, result in zip(clear, results)
+                if isinstance(result, BaseException)
+            }
+
+            async with self.storage.async_batch():
+                for intent in intents:
+                    if intent.seq in failed:
+                        _LOGGER.error(
+                            "[CodeManager] Could not clear slot %d on the lock "
+                            "while recovering %s (seq %d)",
+                            intent.slot,
+                            intent.op,
+                            intent.seq,
+                        )
+                        report["uncertain"].append(intent.slot)
+                        continue
+                    try:
+                        await self._async_recover_intent(intent, report)
+                    except Exception as err:
+                        _LOGGER.error(
+                            "[CodeManager] Could not recover %s of slot %d (seq %d): %s",
+                            intent.op,
+                            intent.slot,
+                            intent.seq,
+                            err,
+                        )
+                        report["uncertain"].append(intent.slot)
+
+            # Storage must be on disk before the intents are forgotten
+            await self.storage.async_save()
+            await self.journal.async_clear()
+
+        _LOGGER.info("[CodeManager] Recovery completed: %s", report)
+        return report
+
+    async def _async_recover_intent(
+        self, intent: Intent, report: dict[str, list[int]]
+    ) -> None:
+        """Bring storage in line with one interrupted intent."""
+        fields = intent.fields
+        if intent.state != INTENT_PENDING:
+            # The lock has it; apply it to storage
+            if intent.op == OP_ADD:
+                await self.storage.add(
+                    intent.slot,
+                    fields["name"].strip(),
+                    fields["type"],
+                    fields.get("expiry"),
+                    fields.get("group"),
+                )
+            elif intent.op == OP_REMOVE:
+                await self.storage.remove(intent.slot)
+            elif self.storage.get(intent.slot) is not None:
+                await self.storage.update(intent.slot, fields)
+            report["replayed"].append(intent.slot)
+        elif intent.op == OP_UPDATE:
+            _LOGGER.warning(
+                "[CodeManager] PIN update for slot %d was interrupted; the lock may "
+                "have the old or the new PIN",
+                intent.slot,
+            )
+            report["uncertain"].append(intent.slot)
+        elif intent.op == OP_REMOVE:
+            # Finished on the lock above
+            await self.storage.remove(intent.slot)
+            report["replayed"].append(intent.slot)
+        else:
+            # The slot was cleared on the lock above; an overwritten code's
+            # PIN is gone with it
+            if intent.replaces:
+                await self.storage.remove(intent.slot)
+            report["rolled_back"].append(intent.slot)
+
+    async def async_remove_expired(
+        self, now: datetime, limiter: CleanupLimiter | None = None
+    ) -> SweepReport:
+        """Remove every guest code that has expired by `now`.
+
+        Removals run as one pipeline: the expired slots are reserved and
+        journaled together, their lock commands are sent concurrently (each
+        waiting for a permit of `limiter`, which is shared with the other
+        locks), and every slot the lock accepted is removed from storage in
+        a single save. Slots whose command failed stay in storage for the
+        next run. A `nimlykoder_cleanup_completed` event carries the report.
+
+        Returns:
+            Report of the removed and failed slots and the sweep's timings
+        """
+        if limiter is None:
+            limiter = CleanupLimiter(jitter=0)
+
+        async with self._async_track("remove_expired"):
+            started = time.monotonic()
+            report = SweepReport(started=dt_util.utcnow().isoformat())
+            async with self._async_locked():
+                expired_slots = self.storage.expired_slots(now)
+                # Slots another request holds are left for the next run
+                slots = [slot for slot in expired_slots if self.allocator.reserve(slot)]
+            report.expired = len(expired_slots)
+            report.skipped = [slot for slot in expired_slots if slot not in slots]
+            if not slots:
+                _LOGGER.debug("[CodeManager] No expired guest codes to clean up")
+                return report
+
+            _LOGGER.info(
+                "[CodeManager] Removing %d expired guest codes: %s",
+                len(slots),
+                slots,
+            )
+            try:
+                intents = dict(
+                    zip(
+                        slots,
+                        await self.journal.async_begin(
+                            [(OP_REMOVE, slot, {}, True) for slot in slots]
+                        ),
+                    )
+                )
+
+                async def _async_send(slot: int) -> bool:
+                    async with limiter.async_slot() as waited:
+                        report.waited += waited
+                        sent = time.monotonic()
+                        try:
+                            result = await self.adapter.remove_code(slot)
+                        except Exception as err:
+                            _LOGGER.error(
+                                "[CodeManager] Failed to remove expired code "
+                                "from slot %d: %s",
+                                slot,
+                                err,
+                            )
+                            return False
+                        finally:
+                            report.per_slot.record(time.monotonic() - sent)
+                    if result.confirmed:
+                        report.confirmed.append(slot)
+                    return True
+
+                accepted = await asyncio.gather(*(_async_send(slot) for slot in slots))
+                removed = [slot for slot, ok in zip(slots, accepted) if ok]
+                failed = [slot for slot, ok in zip(slots, accepted) if not ok]
+                self.journal.async_abort([intents[slot] for slot in failed])
+                self.journal.async_commit([intents[slot] for slot in report.confirmed])
+
+                async with self._async_locked(), self.storage.async_batch():
+                    for slot in removed:
+                        await self.storage.remove(slot)
+                    self.journal.async_done([intents[slot] for slot in removed])
+            finally:
+                for slot in slots:
+                    self.allocator.release(slot)
+
+            report.removed = removed
+            report.failed = failed
+            report.confirmed.sort()
+            report.elapsed = time.monotonic() - started
+            self._last_sweep = report
+            _LOGGER.info(
+                "[CodeManager] Cleanup completed in %.1fs (%.1fs waiting): "
+                "removed %d of %d expired codes, %d confirmed",
+                report.elapsed,
+                report.waited,
+                len(report.removed),
+                report.expired,
+                len(report.confirmed),
+            )
+            self.hass.bus.async_fire(
+                EVENT_CLEANUP_COMPLETED,
+                {
+                    ATTR_ENTRY_ID: self.entry_id,
+                    ATTR_LOCK: self.config.get(CONF_LOCK_ENTITY),
+                    **report.as_dict(),
+                },
+            )
+            return report
+
+    async def async_remove_unknown(self, slots: list[int]) -> dict[str, list[int]]:
+        """Remove codes the lock has in slots that storage does not know about.
+
+        Used by the reconciler. A slot another request holds (an add between
+        reserving it and storing it) or that storage has meanwhile gained is
+        skipped. The rest are reserved and journaled like any removal, so a
+        crash halfway is finished by async_recover().
+
+        Returns:
+            {"removed", "failed", "skipped"} lists of slots
+        """
+        report: dict[str, list[int]] = {"removed": [], "failed": [], "skipped": []}
+        async with self._async_track("remove_unknown"):
+            async with self._async_locked():
+                for slot in slots:
+                    if self.allocator.is_held(slot) or self.storage.is_slot_occupied(
+                        slot
+                    ):
+                        report["skipped"].append(slot)
+                    else:
+                        self.allocator.reserve(slot)
+            slots = [slot for slot in slots if slot not in report["skipped"]]
+            if not slots:
+                return report
+
+            try:
+                intents = dict(
+                    zip(
+                        slots,
+                        await self.journal.async_begin(
+                            [(OP_REMOVE, slot, {}, False) for slot in slots]
+                        ),
+                    )
+                )
+                # The command queue paces these
+                results = await asyncio.gather(
+                    *(self.adapter.remove_code(slot) for slot in slots),
+                    return_exceptions=True,
+                )
+                confirmed = []
+                for slot, result in zip(slots, results):
+                    if isinstance(result, BaseException):
+                        _LOGGER.error(
+                            "[CodeManager] Failed to remove unknown code from "
+                            "slot %d: %s",
+                            slot,
+                            result,
+                        )
+                        report["failed"].append(slot)
+                        continue
+                    report["removed"].append(slot)
+                    if result.confirmed:
+                        confirmed.append(slot)
+                self.journal.async_abort([intents[slot] for slot in report["failed"]])
+                self.journal.async_commit([intents[slot] for slot in confirmed])
+
+                # Nothing to store; storage records the intents with its next save
+                async with self._async_locked():
+                    self.journal.async_done(
+                        [intents[slot] for slot in report["removed"]]
+                    )
+            finally:
+                for slot in slots:
+                    self.allocator.release(slot)
+
+            return report
+
+    def _validate_and_reserve(self, items: list[BulkItem]) -> None:
+        """Validate bulk items and reserve their slots. Call with the mutex held."""
+        seen: set[int] = set()
+        for item in items:
+            item.error = validate_item(item, self.storage, self.allocator, self.config)
+            if item.error is None and item.slot is not None:
+                if item.slot in seen:
+                    item.error = f"Slot {item.slot} appears more than once"
+                seen.add(item.slot)
+        if any(item.error for item in items):
+            return
+
+        # Explicit slots first, then every auto-assigned add in one pass
+        for item in items:
+            if item.slot is None:
+                continue
+            if not self.allocator.reserve(item.slot):
+                item.error = f"Slot {item.slot} is being modified by another request"
+            else:
+                item.reserved = True
+        auto = [item for item in items if item.slot is None]
+        if not auto or any(item.error for item in items):
+            return
+        slots = self.allocator.reserve_free(len(auto))
+        if slots is None:
+            for item in auto:
+                item.error = "No free slots available"
+            return
+        for item, slot in zip(auto, slots):
+            item.slot = slot
+            item.reserved = True
+
+    def _intent_for(self, item: BulkItem) -> tuple[str, int, dict[str, Any], bool]:
+        """Return the journal record for a bulk item."""
+        fields = {key: item.data[key] for key in _STORED_FIELDS if key in item.data}
+        if item.op == OP_ADD:
+            fields.setdefault("expiry", None)
+        return (item.op, item.slot, fields, self.storage.is_slot_occupied(item.slot))
+
+    def _release(self, items: list[BulkItem]) -> None:
+        """Release the slots held for bulk items."""
+        for item in items:
+            if item.reserved:
+                self.allocator.release(item.slot)
+                item.reserved = False
+
+    async def _async_send_item(self, item: BulkItem) -> None:
+        """Send the lock command for one bulk item, recording any failure."""
+        try:
+            if item.op == OP_ADD:
+                item.result = await self.adapter.add_code(
+                    item.slot, item.data["pin_code"]
+                )
+            elif item.op == OP_REMOVE:
+                item.result = await self.adapter.remove_code(item.slot)
+            elif "pin_code" in item.data:
+                item.result = await self.adapter.add_code(
+                    item.slot, item.data["pin_code"]
+                )
+        except Exception as err:
+            _LOGGER.error(
+                "[CodeManager] MQTT %s failed for slot %s: %s", item.op, item.slot, err
+            )
+            item.error = f"Failed to {item.op} code via MQTT: {err}"
+
+    async def _async_store_item(self, item: BulkItem) -> bool:
+        """Apply one bulk item to storage. Call with the mutex held.
+
+        Returns False, with the error recorded on the item, if storage
+        rejected it.
+        """
+        data = item.data
+        try:
+            if item.op == OP_ADD:
+                entry = await self.storage.add(
+                    item.slot, data["name"].strip(), data["type"], data.get("expiry")
+                )
+            elif item.op == OP_REMOVE:
+                await self.storage.remove(item.slot)
+                return True
+            else:
+                entry = await self.storage.update(
+                    item.slot,
+                    {key: data[key] for key in _STORED_FIELDS if key in data},
+                )
+            item.entry = entry.to_dict()
+        except Exception as err:
+            _LOGGER.error(
+                "[CodeManager] Storage %s failed for slot %s: %s", item.op, item.slot, err
+            )
+            item.error = str(err)
+            return False
+        return True
+
+    async def _async_roll_back(self, items: list[BulkItem]) -> list[BulkItem]:
+        """Remove added codes that storage rejected from the lock again.
+
+        Call without the mutex; the slots are still reserved. Returns the
+        items whose code could not be removed.
+        """
+        results = await asyncio.gather(
+            *(self.adapter.remove_code(item.slot) for item in items),
+            return_exceptions=True,
+        )
+        stranded = []
+        for item, result in zip(items, results):
+            if isinstance(result, BaseException):
+                _LOGGER.error(
+                    "[CodeManager] MQTT rollback of slot %s also failed: %s",
+                    item.slot,
+                    result,
+                )
+                stranded.append(item)
+        return stranded
@@ -0,0 +1,338 @@
+"""Durable outbox for lock commands that could not be delivered."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass
+import logging
+import random
+import time
+from typing import Any
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.start import async_at_started
+from homeassistant.helpers.storage import Store
+
+from .const import (
+    OUTBOX_STORAGE_KEY,
+    OUTBOX_STORAGE_VERSION,
+    OUTBOX_RETRY_BASE,
+    OUTBOX_RETRY_MAX,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_MAX_AGE,
+    OUTBOX_FAILED_KEEP,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class OutboxItem:
+    """A command waiting to be retried."""
+
+    slot: int
+    action: str
+    payload: dict[str, Any]
+    created: float
+    attempts: int = 0
+    next_attempt: float = 0.0
+    last_error: str | None = None
+
+
+def retry_delay(attempts: int) -> float:
+    """Return the delay before the next attempt, with jitter.
+
+    Exponential from OUTBOX_RETRY_BASE, capped at OUTBOX_RETRY_MAX, then
+    scaled by a random factor in [0.5, 1.0) so locks that went offline
+    together do not all retry in the same second.
+    """
+    delay = min(OUTBOX_RETRY_MAX, OUTBOX_RETRY_BASE * 2 ** max(attempts - 1, 0))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class NimlykoderOutbox:
+    """Persist and retry commands that failed or were never confirmed.
+
+    Items are keyed by slot, so a newer command for a slot replaces any
+    older one still waiting: only the latest intent is ever delivered.
+    Retries back off exponentially with jitter and survive restarts.
+    While the lock is unreachable nothing is retried; async_flush() sends
+    everything at once when it comes back.
+
+    A command that still fails after OUTBOX_MAX_ATTEMPTS attempts or
+    OUTBOX_MAX_AGE seconds is given up: it is dropped, PIN included, and a
+    record of it without the payload is kept for diagnostics until a newer
+    command for the slot is sent.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        deliver: Callable[[int, str, dict[str, Any]], Awaitable[Any]],
+        ready: Callable[[], bool] | None = None,
+        key: str = OUTBOX_STORAGE_KEY,
+    ) -> None:
+        """Initialize the outbox.
+
+        Args:
+            hass: Home Assistant instance
+            deliver: Coroutine function that sends (slot, action, payload) and
+                     returns a CommandResult, raising on failure
+            ready: Returns False while the lock is unreachable; retries wait
+            key: Storage file key, one per lock
+        """
+        self.hass = hass
+        self._deliver = deliver
+        self._ready = ready
+        self._store = Store(hass, OUTBOX_STORAGE_VERSION, key)
+        self._items: dict[int, OutboxItem] = {}
+        # Given-up commands, oldest first, without their payload
+        self._failed: list[dict[str, Any]] = []
+        self._timer_unsub: CALLBACK_TYPE | None = None
+        self._started_unsub: CALLBACK_TYPE | None = None
+        self._started = False
+        self._running = False
+        self._delivered = 0
+
+    @property
+    def depth(self) -> int:
+        """Return the number of commands waiting."""
+        return len(self._items)
+
+    def pending(self, slot: int) -> OutboxItem | None:
+        """Return the command waiting for a slot, if any."""
+        return self._items.get(slot)
+
+    async def async_load(self) -> None:
+        """Load waiting commands from storage."""
+        data = await self._store.async_load() or {}
+        self._items = {}
+        self._failed = list(data.get("failed", []))[-OUTBOX_FAILED_KEEP:]
+        for raw in data.get("items", []):
+            try:
+                item = OutboxItem(**raw)
+            except TypeError:
+                _LOGGER.warning("[NimlykoderOutbox] Skipping malformed item: %s", raw)
+                continue
+            self._items[item.slot] = item
+        if self._items:
+            _LOGGER.info(
+                "[NimlykoderOutbox] Loaded %d pending lock commands", len(self._items)
+            )
+
+    @callback
+    def async_start(self) -> None:
+        """Start retrying once Home Assistant has started."""
+
+        @callback
+        def _async_started(_hass: HomeAssistant) -> None:
+            self._started = True
+            self._started_unsub = None
+            self._async_arm()
+
+        unsub = async_at_started(self.hass, _async_started)
+        if not self._started:
+            self._started_unsub = unsub
+
+    @callback
+    def async_stop(self) -> None:
+        """Stop retrying. Waiting commands stay on disk."""
+        if self._timer_unsub:
+            self._timer_unsub()
+            self._timer_unsub = None
+        if self._started_unsub:
+            self._started_unsub()
+            self._started_unsub = None
+        self._started = False
+
+    async def async_enqueue(
+        self, slot: int, action: str, payload: dict[str, Any], error: str | None
+    ) -> None:
+        """Store a command for retry, replacing any older one for the slot."""
+        now = time.time()
+        item = OutboxItem(
+            slot=slot,
+            action=action,
+            payload=payload,
+            created=now,
+            attempts=1,
+            next_attempt=now + retry_delay(1),
+            last_error=error,
+        )
+        replaced = self._items.get(slot)
+        self._items[slot] = item
+        self._forget_failed(slot)
+        _LOGGER.warning(
+            "[NimlykoderOutbox] Queued %s for slot %d for retry%s: %s",
+            action,
+            slot,
+            f" (replacing pending {replaced.action})" if replaced else "",
+            error,
+        )
+        await self._async_save()
+        self._async_arm()
+
+    async def async_discard(self, slot: int) -> None:
+        """Drop the command waiting for a slot because a newer one supersedes it."""
+        discarded = self._items.pop(slot, None) is not None
+        if discarded:
+            _LOGGER.debug("[NimlykoderOutbox] Discarded stale command for slot %d", slot)
+        if self._forget_failed(slot) or discarded:
+            await self._async_save()
+            self._async_arm()
+
+    def _forget_failed(self, slot: int) -> bool:
+        """Drop the failure record of a slot; returns True if there was one."""
+        failed = [record for record in self._failed if record["slot"] != slot]
+        if len(failed) == len(self._failed):
+            return False
+        self._failed = failed
+        return True
+
+    def metrics(self) -> dict[str, Any]:
+        """Return outbox metrics."""
+        now = time.time()
+        oldest = min((item.created for item in self._items.values()), default=None)
+        return {
+            "depth": len(self._items),
+            "oldest_age": round(now - oldest, 1) if oldest is not None else None,
+            "delivered": self._delivered,
+            "failed_count": len(self._failed),
+            "failed": list(self._failed),
+            "items": [
+                {
+                    "slot": item.slot,
+                    "action": item.action,
+                    "attempts": item.attempts,
+                    "age": round(now - item.created, 1),
+                    "next_attempt_in": round(max(0.0, item.next_attempt - now), 1),
+                    "last_error": item.last_error,
+                }
+                for item in self._items.values()
+            ],
+        }
+
+    async def _async_save(self) -> None:
+        """Persist waiting commands."""
+        await self._store.async_save(
+            {
+                "items": [asdict(item) for item in self._items.values()],
+                "failed": self._failed,
+            }
+        )
+
+    @callback
+    def _async_arm(self) -> None:
+        """Arm the retry timer for the earliest due command."""
+        if self._timer_unsub:
+            self._timer_unsub()
+            self._timer_unsub = None
+        if not self._started or self._running or not self._items:
+            return
+        due = min(item.next_attempt for item in self._items.values())
+        self._timer_unsub = async_call_later(
+            self.hass, max(0.0, due - time.time()), self._async_timer_fired
+        )
+
+    @callback
+    def _async_timer_fired(self, _now: Any) -> None:
+        """Handle the retry timer."""
+        self._timer_unsub = None
+        self.hass.async_create_task(self.async_retry_due())
+
+    async def async_flush(self) -> None:
+        """Retry every waiting command now, e.g. when the lock comes back."""
+        if not self._started or not self._items:
+            return
+        now = time.time()
+        for item in self._items.values():
+            item.next_attempt = min(item.next_attempt, now)
+        _LOGGER.info(
+            "[NimlykoderOutbox] Flushing %d pending lock commands", len(self._items)
+        )
+        await self.async_retry_due()
+
+    async def async_retry_due(self) -> None:
+        """Retry every command that is due."""
+        if self._running:
+            return
+        if self._ready is not None and not self._ready():
+            # Nothing can get through; async_flush() runs when the lock returns
+            _LOGGER.debug("[NimlykoderOutbox] Lock unavailable, postponing retries")
+            return
+        self._running = True
+        try:
+            now = time.time()
+            due = [item for item in self._items.values() if item.next_attempt <= now]
+            if due:
+                await asyncio.gather(*(self._async_retry(item) for item in due))
+                await self._async_save()
+        finally:
+            self._running = False
+            self._async_arm()
+
+    async def _async_retry(self, item: OutboxItem) -> None:
+        """Retry one command and reschedule or drop it."""
+        error: str | None = None
+        try:
+            result = await self._deliver(item.slot, item.action, item.payload)
+        except Exception as err:
+            error = str(err)
+        else:
+            if getattr(result, "timed_out", False):
+                error = "not confirmed by lock"
+
+        if self._items.get(item.slot) is not item:
+            # Superseded by a newer command while this attempt ran
+            return
+
+        if error is None:
+            del self._items[item.slot]
+            self._delivered += 1
+            _LOGGER.info(
+                "[NimlykoderOutbox] Delivered %s for slot %d after %d attempts",
+                item.action,
+                item.slot,
+                item.attempts + 1,
+            )
+            return
+
+        item.attempts += 1
+        item.last_error = error
+        now = time.time()
+        if item.attempts >= OUTBOX_MAX_ATTEMPTS or now - item.created >= OUTBOX_MAX_AGE:
+            self._give_up(item, now)
+            return
+        item.next_attempt = now + retry_delay(item.attempts)
+        _LOGGER.warning(
+            "[NimlykoderOutbox] Retry %d of %s for slot %d failed: %s",
+            item.attempts,
+            item.action,
+            item.slot,
+            error,
+        )
+
+    def _give_up(self, item: OutboxItem, now: float) -> None:
+        """Drop a command that keeps failing and keep a record of it."""
+        del self._items[item.slot]
+        self._failed.append(
+            {
+                "slot": item.slot,
+                "action": item.action,
+                "attempts": item.attempts,
+                "created": item.created,
+                "failed": now,
+                "last_error": item.last_error,
+            }
+        )
+        del self._failed[:-OUTBOX_FAILED_KEEP]
+        _LOGGER.error(
+            "[NimlykoderOutbox] Giving up on %s for slot %d after %d attempts "
+            "over %.0fs: %s",
+            item.action,
+            item.slot,
+            item.attempts,
+            now - item.created,
+            item.last_error,
+        )
@@ -0,0 +1,216 @@
+"""Filtering, sorting, projection, paging and name search of codes."""
+from __future__ import annotations
+
+import base64
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import heapq
+import json
+from typing import Any
+
+import voluptuous as vol
+
+from .const import (
+    QUERY_MAX_LIMIT,
+    SORT_SLOT,
+    SORT_NAME,
+    SORT_EXPIRY,
+    TYPE_PERMANENT,
+    TYPE_GUEST,
+)
+from .manager import CodeOperationError
+from .storage import SEARCH_MATCHES, NimlykoderStorage, fold_name
+
+# Fields a query may project entries to; the slot is always included
+QUERY_FIELDS = ("name", "type", "expiry", "created", "updated", "group")
+
+# Shape of a sort key per sort order, checked when a cursor comes back
+_CURSOR_SHAPES: dict[str, tuple[type | tuple[type, ...], ...]] = {
+    SORT_SLOT: (int,),
+    SORT_NAME: (str, int),
+    SORT_EXPIRY: (int, (int, float), int),
+}
+
+
+def encode_cursor(sort: str, key: tuple) -> str:
+    """Return an opaque cursor resuming a query after the entry at `key`."""
+    raw = json.dumps([sort, *key], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(value: Any) -> tuple:
+    """Validate a cursor; returns (sort, *key)."""
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(str(value).encode()))
+    except ValueError as err:
+        raise vol.Invalid("Invalid cursor") from err
+    if not isinstance(raw, list) or not raw or raw[0] not in _CURSOR_SHAPES:
+        raise vol.Invalid("Invalid cursor")
+    shape = _CURSOR_SHAPES[raw[0]]
+    key = raw[1:]
+    if len(key) != len(shape) or not all(
+        isinstance(part, kind) for part, kind in zip(key, shape)
+    ):
+        raise vol.Invalid("Invalid cursor")
+    return tuple(raw)
+
+
+# Query fields of a list request; shared by the service and WebSocket API
+QUERY_SCHEMA = {
+    vol.Optional("filter"): {
+        vol.Optional("type"): vol.In([TYPE_PERMANENT, TYPE_GUEST]),
+        vol.Optional("expired"): bool,
+        # Seconds from now; only guest codes not yet expired match
+        vol.Optional("expiring_within"): vol.All(vol.Coerce(int), vol.Range(min=0)),
+        vol.Optional("name"): str,
+    },
+    vol.Optional("sort"): vol.In([SORT_SLOT, SORT_NAME, SORT_EXPIRY]),
+    vol.Optional("fields"): [vol.In(QUERY_FIELDS)],
+    vol.Optional("limit"): vol.All(
+        vol.Coerce(int), vol.Range(min=1, max=QUERY_MAX_LIMIT)
+    ),
+    vol.Optional("cursor"): decode_cursor,
+}
+
+_QUERY_KEYS = ("filter", "sort", "fields", "limit", "cursor")
+
+
+@dataclass(slots=True)
+class CodeQuery:
+    """A validated list query."""
+
+    code_type: str | None = None
+    expired: bool | None = None
+    expiring_within: int | None = None
+    name: str | None = None
+    sort: str = SORT_SLOT
+    fields: list[str] | None = None
+    limit: int | None = None
+    after: tuple | None = None
+
+    @classmethod
+    def from_data(cls, data: dict[str, Any]) -> CodeQuery | None:
+        """Build the query of a list request; None if it asks for plain listing.
+
+        Raises:
+            CodeOperationError: If the cursor belongs to another sort order
+        """
+        if not any(key in data for key in _QUERY_KEYS):
+            return None
+        filters = data.get("filter", {})
+        sort = data.get("sort", SORT_SLOT)
+        after = None
+        if (cursor := data.get("cursor")) is not None:
+            if cursor[0] != sort:
+                raise CodeOperationError(
+                    "invalid_input", "Cursor belongs to another sort order"
+                )
+            after = cursor[1:]
+        return cls(
+            code_type=filters.get("type"),
+            expired=filters.get("expired"),
+            expiring_within=filters.get("expiring_within"),
+            name=filters.get("name") or None,
+            sort=sort,
+            fields=data.get("fields"),
+            limit=data.get("limit"),
+            after=after,
+        )
+
+
+def run_query(
+    storage: NimlykoderStorage,
+    query: CodeQuery,
+    now: datetime,
+    since_revision: int | None = None,
+) -> dict[str, Any]:
+    """Answer a query from the storage indexes.
+
+    Type and expiry filters are looked up in their indexes and intersected;
+    with none of them, entries are walked in the order of the sort index
+    from the cursor on, so a page costs about `limit` entries. The name
+    filter is a substring match on what is left, ignoring case and
+    diacritics.
+
+    Returns:
+        {"revision", "codes", "next_cursor"}, or {"revision", "not_modified"}
+        when `since_revision` is the current revision
+    """
+    if since_revision is not None and since_revision == storage.revision:
+        return {"revision": storage.revision, "not_modified": True}
+
+    matches: list[set[int]] = []
+    if query.code_type is not None:
+        matches.append(storage.type_slots(query.code_type))
+    if query.expired:
+        matches.append(set(storage.expired_slots(now)))
+    if query.expiring_within is not None:
+        until = now + timedelta(seconds=query.expiring_within)
+        matches.append(set(storage.expiring_slots(now, until)))
+    excluded = set(storage.expired_slots(now)) if query.expired is False else set()
+
+    key = storage.sort_key(query.sort)
+    if matches:
+        matches.sort(key=len)
+        candidates = matches[0].intersection(*matches[1:]) - excluded
+        ordered = sorted(candidates, key=key)
+        if query.after is not None:
+            ordered = ordered[bisect_right(ordered, query.after, key=key) :]
+        excluded = set()
+    else:
+        ordered = storage.iter_sorted(query.sort, query.after)
+
+    needle = fold_name(query.name) if query.name else None
+    codes: list[dict[str, Any]] = []
+    last: int | None = None
+    next_cursor = None
+    for slot in ordered:
+        if slot in excluded or (needle and needle not in storage.folded_name(slot)):
+            continue
+        if query.limit is not None and len(codes) == query.limit:
+            next_cursor = encode_cursor(query.sort, key(last))
+            break
+        codes.append(_project(storage.get(slot).to_dict(), query.fields))
+        last = slot
+
+    return {"revision": storage.revision, "codes": codes, "next_cursor": next_cursor}
+
+
+def _project(entry: dict[str, Any], fields: list[str] | None) -> dict[str, Any]:
+    """Return the slot and the requested fields of an entry."""
+    if not fields:
+        return entry
+    return {"slot": entry["slot"], **{field: entry[field] for field in fields}}
+
+
+def search_locks(
+    targets: list[dict[str, Any]], query: str, limit: int, now: datetime
+) -> list[dict[str, Any]]:
+    """Search code names on several locks and merge the best `limit` matches.
+
+    Each lock answers from its word index (see NimlykoderStorage.search);
+    results are ordered by match, then name, across all locks.
+    """
+    found = []
+    for data in targets:
+        entry_id = data["entry"].entry_id
+        for rank, name, slot in data["storage"].search(query, limit):
+            found.append(((rank, name, entry_id, slot), data))
+
+    results = []
+    for (rank, _, entry_id, slot), data in heapq.nsmallest(
+        limit, found, key=lambda item: item[0]
+    ):
+        storage = data["storage"]
+        expires_at = storage.expires_at(slot)
+        results.append(
+            {
+                **storage.get(slot).to_dict(),
+                "entry_id": entry_id,
+                "title": data["entry"].title,
+                "match": SEARCH_MATCHES[rank],
+                "expired": expires_at is not None and expires_at <= now,
+            }
+        )
+    return results
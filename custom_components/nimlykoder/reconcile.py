@@ -0,0 +1,293 @@
+"""Reconcile the codes programmed on the lock with storage."""
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+import logging
+from typing import Any
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.util import dt as dt_util
+
+from .adapters.mqtt_z2m import USER_OCCUPIED, MqttZ2mAdapter
+from .const import RECONCILE_BATCH, RECONCILE_INTERVAL
+from .manager import CodeManager
+from .outbox import NimlykoderOutbox
+from .storage import NimlykoderStorage
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class ReconcileReport:
+    """Differences between the lock's user table and storage.
+
+    missing: stored codes the lock reports as free
+    extra: codes on the lock that storage does not know about
+    mismatched: stored codes the lock holds but has disabled
+    pending: slots with a command still waiting in the outbox
+    unknown: slots the lock did not answer for
+    """
+
+    checked: list[int] = field(default_factory=list)
+    missing: list[int] = field(default_factory=list)
+    extra: list[int] = field(default_factory=list)
+    mismatched: list[int] = field(default_factory=list)
+    pending: list[int] = field(default_factory=list)
+    unknown: list[int] = field(default_factory=list)
+    removed: list[int] = field(default_factory=list)
+    failed: list[int] = field(default_factory=list)
+
+    @property
+    def in_sync(self) -> bool:
+        """Return True if no differences were found."""
+        return not (self.missing or self.extra or self.mismatched)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the report as a dictionary."""
+        return {
+            "in_sync": self.in_sync,
+            "checked": len(self.checked),
+            "missing": self.missing,
+            "extra": self.extra,
+            "mismatched": self.mismatched,
+            "pending": self.pending,
+            "unknown": self.unknown,
+            "removed": self.removed,
+            "failed": self.failed,
+        }
+
+
+class LockReconciler:
+    """Read the lock's user table and compare it with storage.
+
+    Slot states read from the lock are cached with the time they were read.
+    A manual run reads the requested slots (or all of them) and can remove
+    codes the lock has but storage does not. In the background a few slots
+    are read per interval, round robin over the slot range, so a full pass
+    never floods the mesh.
+
+    Missing and disabled codes are reported but not re-added: storage does
+    not keep PINs, so only a new PIN (update_pin) can restore them.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        storage: NimlykoderStorage,
+        adapter: MqttZ2mAdapter,
+        outbox: NimlykoderOutbox | None,
+        manager: CodeManager,
+        slot_min: int,
+        slot_max: int,
+        reserved_slots: list[int],
+    ) -> None:
+        """Initialize the reconciler."""
+        self.hass = hass
+        self._storage = storage
+        self._adapter = adapter
+        self._outbox = outbox
+        self._manager = manager
+        self._slots = list(range(slot_min, slot_max + 1))
+        self._reserved = set(reserved_slots)
+        # slot -> (Z2M user status or None if unanswered, when it was read)
+        self._observed: dict[int, tuple[str | None, datetime]] = {}
+        self._lock = asyncio.Lock()
+        self._cursor = 0
+        self._interval_unsub: CALLBACK_TYPE | None = None
+        self._storage_unsub: CALLBACK_TYPE | None = None
+        self._last_report: ReconcileReport | None = None
+        self._last_run: datetime | None = None
+        self._reads = 0
+
+    @callback
+    def async_start(self) -> None:
+        """Start background reconciliation."""
+        if self._storage_unsub is None:
+            self._storage_unsub = self._storage.async_add_listener(
+                self._async_storage_changed
+            )
+        if self._interval_unsub is None:
+            self._interval_unsub = async_track_time_interval(
+                self.hass,
+                self._async_interval,
+                timedelta(seconds=RECONCILE_INTERVAL),
+            )
+
+    @callback
+    def async_stop(self) -> None:
+        """Stop background reconciliation."""
+        if self._interval_unsub is not None:
+            self._interval_unsub()
+            self._interval_unsub = None
+        if self._storage_unsub is not None:
+            self._storage_unsub()
+            self._storage_unsub = None
+
+    @callback
+    def _async_storage_changed(self, slot: int, old: Any, new: Any) -> None:
+        """Forget what was read for a slot we just changed ourselves."""
+        self._observed.pop(slot, None)
+
+    async def async_reconcile(
+        self,
+        slots: list[int] | None = None,
+        apply: bool = False,
+        max_age: float | None = None,
+    ) -> ReconcileReport:
+        """Read slots from the lock, diff them against storage and optionally fix.
+
+        Args:
+            slots: Slots to check; all slots in the configured range if None
+            apply: Remove codes found on the lock but not in storage.
+                   Reserved slots are never touched.
+            max_age: Reuse slot states read within this many seconds
+
+        Raises:
+            HomeAssistantError: If the lock is offline or cannot answer reads
+        """
+        if not self._adapter.can_read:
+            raise HomeAssistantError(
+                "Lock state topic is not subscribed, cannot read the lock"
+            )
+        if not self._adapter.available:
+            raise HomeAssistantError("Lock is offline")
+
+        slots = sorted(set(slots)) if slots else self._slots
+        async with self._lock:
+            await self._async_read(slots, max_age)
+            report = self.diff(slots)
+            if apply:
+                await self._async_apply(report)
+            self._last_report = report
+            self._last_run = dt_util.utcnow()
+
+        _LOGGER.info(
+            "[LockReconciler] Checked %d slots: missing=%s extra=%s mismatched=%s "
+            "unknown=%s removed=%s",
+            len(report.checked),
+            report.missing,
+            report.extra,
+            report.mismatched,
+            report.unknown,
+            report.removed,
+        )
+        return report
+
+    def diff(self, slots: list[int]) -> ReconcileReport:
+        """Compare cached lock states for `slots` with storage."""
+        report = ReconcileReport()
+        for slot in slots:
+            observed = self._observed.get(slot)
+            if observed is None:
+                continue
+            report.checked.append(slot)
+            status = observed[0]
+            if status is None:
+                report.unknown.append(slot)
+                continue
+            if self._outbox is not None and self._outbox.pending(slot):
+                # The lock is expected to differ until the command is delivered
+                report.pending.append(slot)
+                continue
+            stored = self._storage.is_slot_occupied(slot)
+            if stored and status == "available":
+                report.missing.append(slot)
+            elif stored and status == "disabled":
+                report.mismatched.append(slot)
+            elif not stored and status in USER_OCCUPIED:
+                report.extra.append(slot)
+        return report
+
+    def metrics(self) -> dict[str, Any]:
+        """Return reconciliation metrics."""
+        return {
+            "observed": len(self._observed),
+            "reads": self._reads,
+            "cursor": self._slots[self._cursor] if self._slots else None,
+            "last_run": self._last_run.isoformat() if self._last_run else None,
+            "last_report": self._last_report.as_dict() if self._last_report else None,
+        }
+
+    async def _async_read(self, slots: list[int], max_age: float | None) -> None:
+        """Read slot states from the lock, reusing fresh cached ones."""
+        now = dt_util.utcnow()
+        if max_age is not None:
+            fresh = now - timedelta(seconds=max_age)
+            slots = [
+                slot
+                for slot in slots
+                if slot not in self._observed or self._observed[slot][1] < fresh
+            ]
+        if not slots:
+            return
+        # The command queue paces these, so submitting them together is safe
+        results = await asyncio.gather(
+            *(self._adapter.async_read_slot(slot) for slot in slots),
+            return_exceptions=True,
+        )
+        read_at = dt_util.utcnow()
+        for slot, result in zip(slots, results):
+            self._reads += 1
+            if isinstance(result, BaseException):
+                _LOGGER.debug(
+                    "[LockReconciler] Reading slot %d failed: %s", slot, result
+                )
+                self._observed[slot] = (None, read_at)
+            else:
+                self._observed[slot] = (result.status, read_at)
+
+    async def _async_apply(self, report: ReconcileReport) -> None:
+        """Remove codes the lock has but storage does not."""
+        slots = []
+        for slot in report.extra:
+            if slot in self._reserved:
+                _LOGGER.info(
+                    "[LockReconciler] Leaving unknown code in reserved slot %d", slot
+                )
+            else:
+                slots.append(slot)
+        if not slots:
+            return
+        # Through the manager, so a slot an add has reserved but not yet
+        # stored is left alone and the removal is journaled
+        result = await self._manager.async_remove_unknown(slots)
+        for slot in result["skipped"]:
+            _LOGGER.info(
+                "[LockReconciler] Slot %d changed while reconciling, leaving it", slot
+            )
+        report.removed.extend(result["removed"])
+        report.failed.extend(result["failed"])
+        for slot in result["removed"]:
+            self._observed.pop(slot, None)
+
+    async def _async_interval(self, _now: datetime) -> None:
+        """Read the next few slots in the background."""
+        if (
+            not self._slots
+            or self._lock.locked()
+            or not self._adapter.can_read
+            or not self._adapter.available
+        ):
+            return
+
+        batch = [
+            self._slots[(self._cursor + i) % len(self._slots)]
+            for i in range(min(RECONCILE_BATCH, len(self._slots)))
+        ]
+        self._cursor = (self._cursor + len(batch)) % len(self._slots)
+
+        async with self._lock:
+            await self._async_read(batch, None)
+            report = self.diff(batch)
+        if not report.in_sync:
+            _LOGGER.warning(
+                "[LockReconciler] Lock differs from storage: missing=%s extra=%s "
+                "mismatched=%s",
+                report.missing,
+                report.extra,
+                report.mismatched,
+            )
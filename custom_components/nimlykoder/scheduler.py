@@ -0,0 +1,167 @@
+"""Expiry scheduling for Nimlykoder guest codes."""
+from __future__ import annotations
+
+import logging
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta
+import random
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_track_point_in_time
+from homeassistant.helpers.start import async_at_started
+from homeassistant.util import dt as dt_util
+
+from .const import EXPIRY_RETRY_INTERVAL
+from .storage import CodeEntry, NimlykoderStorage
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ExpiryScheduler:
+    """Remove guest codes at the moment they expire.
+
+    A single timer is armed for the earliest expiry in the storage index and
+    re-armed whenever entries change. Expiries that passed while Home
+    Assistant was down are handled by a catch-up pass once startup is done.
+    If removals fail, the timer is retried after EXPIRY_RETRY_INTERVAL rather
+    than firing again immediately.
+
+    The timer fires `offset` seconds after the expiry plus a random jitter of
+    up to `jitter` seconds, so locks whose codes expire at the same instant
+    (midnight, for date-only expiries) do not all sweep at once.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        storage: NimlykoderStorage,
+        cleanup: Callable[[], Awaitable[None]],
+        offset: float = 0,
+        jitter: float = 0,
+    ) -> None:
+        """Initialize the scheduler.
+
+        Args:
+            hass: Home Assistant instance
+            storage: Storage holding the expiry index
+            cleanup: Coroutine function that removes every expired code
+            offset: Seconds after an expiry to fire, fixed per lock
+            jitter: Up to this many random seconds added to every timer
+        """
+        self.hass = hass
+        self._storage = storage
+        self._cleanup = cleanup
+        self._offset = offset
+        self._jitter = jitter
+        self._timer_unsub: CALLBACK_TYPE | None = None
+        self._listener_unsub: CALLBACK_TYPE | None = None
+        self._started_unsub: CALLBACK_TYPE | None = None
+        self._started = False
+        self._running = False
+        self._rerun = False
+        self._armed_for: datetime | None = None
+
+    @callback
+    def async_start(self) -> None:
+        """Start tracking expiries and run a catch-up pass after startup."""
+        self._listener_unsub = self._storage.async_add_listener(
+            self._async_storage_changed
+        )
+
+        @callback
+        def _async_started(_hass: HomeAssistant) -> None:
+            self._started = True
+            self._started_unsub = None
+            self.hass.async_create_task(self.async_run())
+
+        unsub = async_at_started(self.hass, _async_started)
+        # The callback runs immediately if Home Assistant is already running
+        if not self._started:
+            self._started_unsub = unsub
+
+    @callback
+    def async_stop(self) -> None:
+        """Cancel the timer and stop listening for changes."""
+        for unsub in (self._timer_unsub, self._listener_unsub, self._started_unsub):
+            if unsub:
+                unsub()
+        self._timer_unsub = None
+        self._listener_unsub = None
+        self._started_unsub = None
+        self._started = False
+        self._armed_for = None
+
+    @property
+    def next_run(self) -> datetime | None:
+        """Return the instant the timer is armed for."""
+        return self._armed_for
+
+    async def async_run(self) -> None:
+        """Remove everything that has expired and re-arm the timer."""
+        if self._running:
+            # A change arrived mid-run; go again once the current pass ends
+            self._rerun = True
+            return
+
+        self._running = True
+        try:
+            while True:
+                self._rerun = False
+                if self._storage.expired_slots(dt_util.now()):
+                    await self._cleanup()
+                if not self._rerun:
+                    break
+        except Exception as err:
+            _LOGGER.error("[ExpiryScheduler] Cleanup run failed: %s", err)
+        finally:
+            self._running = False
+            self._async_arm()
+
+    @callback
+    def _async_arm(self) -> None:
+        """Arm the timer for the earliest pending expiry."""
+        if not self._started:
+            return
+        if self._timer_unsub:
+            self._timer_unsub()
+            self._timer_unsub = None
+            self._armed_for = None
+
+        next_expiry = self._storage.next_expiry()
+        if next_expiry is None:
+            _LOGGER.debug("[ExpiryScheduler] No pending guest expiries")
+            return
+
+        fire_at = next_expiry + timedelta(
+            seconds=self._offset + random.uniform(0, self._jitter)
+        )
+        now = dt_util.now()
+        if fire_at <= now:
+            # Still expired after a run, so a removal failed; back off
+            fire_at = now + timedelta(seconds=EXPIRY_RETRY_INTERVAL)
+
+        self._armed_for = fire_at
+        self._timer_unsub = async_track_point_in_time(
+            self.hass, self._async_timer_fired, fire_at
+        )
+        _LOGGER.debug("[ExpiryScheduler] Next expiry check at %s", fire_at)
+
+    @callback
+    def _async_timer_fired(self, now: datetime) -> None:
+        """Handle the expiry timer."""
+        self._timer_unsub = None
+        self._armed_for = None
+        self.hass.async_create_task(self.async_run())
+
+    @callback
+    def _async_storage_changed(
+        self, slot: int, old: CodeEntry | None, new: CodeEntry | None
+    ) -> None:
+        """Re-arm when an expiry is added, moved or removed."""
+        if self._running or not self._started:
+            # Re-armed at the end of the run / after the catch-up pass
+            return
+        old_key = (old.type, old.expiry) if old else None
+        new_key = (new.type, new.expiry) if new else None
+        if old_key != new_key:
+            self._async_arm()
@@ -2,17 +2,16 @@
 from __future__ import annotations
 
 import logging
-from datetime import datetime, date
+from typing import Any
 
 import voluptuous as vol
 
 from homeassistant.core import HomeAssistant, ServiceCall
-from homeassistant.exceptions import HomeAssistantError
 import homeassistant.helpers.config_validation as cv
+from homeassistant.util import dt as dt_util
 
 from .const import (
     DOMAIN,
-    CONF_MQTT_TOPIC,
     SERVICE_ADD_CODE,
     SERVICE_REMOVE_CODE,
     SERVICE_UPDATE_EXPIRY,
@@ -20,15 +19,46 @@ from .const import (
     SERVICE_UPDATE_PIN,
     SERVICE_LIST_CODES,
     SERVICE_CLEANUP_EXPIRED,
+    SERVICE_RECONCILE,
+    SERVICE_BULK_APPLY,
+    SERVICE_UPDATE_CODE,
+    SERVICE_FAN_OUT,
+    ATTR_ENTRY_ID,
+    ATTR_LOCK,
+    ATTR_ENTRY_IDS,
+    ATTR_LOCKS,
+    ATTR_GROUP,
     TYPE_PERMANENT,
     TYPE_GUEST,
 )
+from .cleanup import async_cleanup_expired
+from .bulk import OP_ADD, OP_REMOVE, OP_UPDATE, OPERATIONS_SCHEMA
+from .fanout import async_fan_out
+from .locks import resolve_lock, resolve_locks
+from .query import QUERY_SCHEMA, CodeQuery, run_query
 
 _LOGGER = logging.getLogger(__name__)
 
+# Every service can be pointed at one lock; optional with a single lock
+LOCK_TARGET = {
+    vol.Optional(ATTR_ENTRY_ID): cv.string,
+    vol.Optional(ATTR_LOCK): cv.entity_id,
+}
+
 # Service schemas
+SERVICE_LOCK_SCHEMA = vol.Schema(LOCK_TARGET)
+
+SERVICE_LIST_CODES_SCHEMA = vol.Schema(
+    {
+        **LOCK_TARGET,
+        vol.Optional("since_revision"): cv.positive_int,
+        **QUERY_SCHEMA,
+    }
+)
+
 SERVICE_ADD_CODE_SCHEMA = vol.Schema(
     {
+        **LOCK_TARGET,
         vol.Required("name"): cv.string,
         vol.Required("pin_code"): cv.string,
         vol.Required("type"): vol.In([TYPE_PERMANENT, TYPE_GUEST]),
@@ -40,12 +70,14 @@ SERVICE_ADD_CODE_SCHEMA = vol.Schema(
 
 SERVICE_REMOVE_CODE_SCHEMA = vol.Schema(
     {
+        **LOCK_TARGET,
         vol.Required("slot"): cv.positive_int,
     }
 )
 
 SERVICE_UPDATE_EXPIRY_SCHEMA = vol.Schema(
     {
+        **LOCK_TARGET,
         vol.Required("slot"): cv.positive_int,
         vol.Optional("expiry"): cv.string,
     }
@@ -53,6 +85,7 @@ SERVICE_UPDATE_EXPIRY_SCHEMA = vol.Schema(
 
 SERVICE_UPDATE_NAME_SCHEMA = vol.Schema(
     {
+        **LOCK_TARGET,
         vol.Required("slot"): cv.positive_int,
         vol.Required("name"): cv.string,
     }
@@ -60,340 +93,191 @@ SERVICE_UPDATE_NAME_SCHEMA = vol.Schema(
 
 SERVICE_UPDATE_PIN_SCHEMA = vol.Schema(
     {
+        **LOCK_TARGET,
         vol.Required("slot"): cv.positive_int,
         vol.Required("pin_code"): cv.string,
     }
 )
 
+SERVICE_RECONCILE_SCHEMA = vol.Schema(
+    {
+        **LOCK_TARGET,
+        vol.Optional("slots"): vol.All(cv.ensure_list, [cv.positive_int]),
+        vol.Optional("apply", default=False): cv.boolean,
+        vol.Optional("max_age"): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    }
+)
 
-async def async_setup_services(hass: HomeAssistant) -> None:
-    """Set up services for Nimlykoder."""
-
-    async def handle_add_code(call: ServiceCall) -> None:
-        """Handle add_code service call."""
-        _LOGGER.info("[handle_add_code] Service called with data: %s", call.data)
-        
-        data = hass.data[DOMAIN]
-        storage = data["storage"]
-        mqtt_adapter = data["mqtt_adapter"]
-        config = data["config"]
-
-        name = call.data["name"]
-        pin_code = call.data["pin_code"]
-        code_type = call.data["type"]
-        expiry = call.data.get("expiry")
-        preferred_slot = call.data.get("slot")
-        force = call.data.get("force", False)
-        
-        _LOGGER.info(
-            "[handle_add_code] Adding code - name='%s', type=%s, expiry=%s, preferred_slot=%s, force=%s",
-            name,
-            code_type,
-            expiry,
-            preferred_slot,
-            force,
-        )
-
-        # Validate PIN code is 6 digits
-        if not pin_code.isdigit() or len(pin_code) != 6:
-            _LOGGER.error("[handle_add_code] Invalid PIN code: must be exactly 6 digits")
-            raise HomeAssistantError("PIN code must be exactly 6 digits")
-
-        # Policy enforcement
-        if code_type == TYPE_GUEST and not expiry:
-            _LOGGER.error("[handle_add_code] Guest codes must have an expiry date")
-            raise HomeAssistantError("Guest codes must have an expiry date")
-
-        # Validate expiry format if provided
-        if expiry:
-            try:
-                datetime.fromisoformat(expiry)
-                _LOGGER.debug("[handle_add_code] Expiry date validated: %s", expiry)
-            except ValueError as err:
-                _LOGGER.error("[handle_add_code] Invalid expiry date format: %s", err)
-                raise HomeAssistantError(f"Invalid expiry date format: {err}") from err
-
-        # Determine slot
-        if preferred_slot is not None:
-            slot = preferred_slot
-            _LOGGER.debug("[handle_add_code] Using preferred slot: %d", slot)
-            # Check bounds
-            if slot < config[
-                "slot_min"
-            ] or slot > config["slot_max"]:
-                _LOGGER.error(
-                    "[handle_add_code] Slot %d outside range %d-%d",
-                    slot,
-                    config['slot_min'],
-                    config['slot_max'],
-                )
-                raise HomeAssistantError(
-                    f"Slot {slot} outside configured range "
-                    f"({config['slot_min']}-{config['slot_max']})"
-                )
-            # Check if occupied
-            if storage.is_slot_occupied(slot):
-                if not force and config.get("overwrite_protection", True):
-                    _LOGGER.error(
-                        "[handle_add_code] Slot %d is occupied and force=False", slot
-                    )
-                    raise HomeAssistantError(
-                        f"Slot {slot} is occupied. Use force=true to overwrite"
-                    )
-                _LOGGER.warning("[handle_add_code] Overwriting occupied slot %d", slot)
-        else:
-            # Auto-select slot
-            slot = storage.find_first_free_slot(
-                config["slot_min"],
-                config["slot_max"],
-                config["reserved_slots"],
-            )
-            if slot is None:
-                _LOGGER.error("[handle_add_code] No free slots available")
-                raise HomeAssistantError("No free slots available")
-            _LOGGER.info("[handle_add_code] Auto-selected slot: %d", slot)
+SERVICE_BULK_APPLY_SCHEMA = vol.Schema(
+    {
+        **LOCK_TARGET,
+        vol.Required("operations"): OPERATIONS_SCHEMA,
+    }
+)
 
-        # Check reserved slots
-        if preferred_slot is None and slot in config["reserved_slots"]:
-            _LOGGER.error("[handle_add_code] Slot %d is reserved", slot)
-            raise HomeAssistantError(f"Slot {slot} is reserved")
+SERVICE_UPDATE_CODE_SCHEMA = vol.Schema(
+    {
+        **LOCK_TARGET,
+        vol.Required("slot"): cv.positive_int,
+        vol.Optional("name"): cv.string,
+        vol.Optional("expiry"): vol.Any(None, cv.string),
+        vol.Optional("type"): vol.In([TYPE_PERMANENT, TYPE_GUEST]),
+        vol.Optional("pin_code"): cv.string,
+    }
+)
 
-        # Add to MQTT first
-        _LOGGER.info(
-            "[handle_add_code] Sending PIN to lock via MQTT - slot=%d, topic=%s",
-            slot,
-            config.get(CONF_MQTT_TOPIC, "unknown"),
-        )
-        try:
-            await mqtt_adapter.add_code(slot, pin_code)
-            _LOGGER.info("[handle_add_code] MQTT publish successful for slot %d", slot)
-        except Exception as err:
-            _LOGGER.error(
-                "[handle_add_code] MQTT publish failed for slot %d: %s", slot, err
-            )
-            raise HomeAssistantError(f"Failed to add code via MQTT: {err}") from err
-
-        # Then store
-        try:
-            await storage.add(slot, name, code_type, expiry)
-            _LOGGER.info(
-                "[handle_add_code] Successfully added %s code '%s' to slot %d",
-                code_type,
-                name,
-                slot,
-            )
-        except Exception as err:
-            _LOGGER.error(
-                "[handle_add_code] Storage failed for slot %d, rolling back MQTT: %s",
-                slot,
-                err,
-            )
-            # Try to clean up MQTT if storage fails
-            try:
-                await mqtt_adapter.remove_code(slot)
-                _LOGGER.info("[handle_add_code] MQTT rollback successful")
-            except Exception as rollback_err:
-                _LOGGER.error(
-                    "[handle_add_code] MQTT rollback also failed: %s", rollback_err
-                )
-            raise
+SERVICE_FAN_OUT_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_ENTRY_IDS): vol.All(cv.ensure_list, [cv.string]),
+        vol.Optional(ATTR_LOCKS): cv.entity_ids,
+        vol.Required("op"): vol.In([OP_ADD, OP_UPDATE, OP_REMOVE]),
+        vol.Optional(ATTR_GROUP): cv.string,
+        vol.Optional("name"): cv.string,
+        vol.Optional("pin_code"): cv.string,
+        vol.Optional("type"): vol.In([TYPE_PERMANENT, TYPE_GUEST]),
+        vol.Optional("expiry"): vol.Any(None, cv.string),
+        vol.Optional("slot"): cv.positive_int,
+        vol.Optional("force", default=False): cv.boolean,
+    }
+)
 
-    async def handle_remove_code(call: ServiceCall) -> None:
-        """Handle remove_code service call."""
-        _LOGGER.info("[handle_remove_code] Service called with data: %s", call.data)
-        
-        data = hass.data[DOMAIN]
-        storage = data["storage"]
-        mqtt_adapter = data["mqtt_adapter"]
-        config = data["config"]
 
-        slot = call.data["slot"]
+async def async_setup_services(hass: HomeAssistant) -> None:
+    """Set up services for Nimlykoder. Registered once for all locks."""
 
-        # Check if slot exists
-        entry = storage.get(slot)
-        if entry is None:
-            _LOGGER.error("[handle_remove_code] Slot %d not found in storage", slot)
-            raise HomeAssistantError(f"Slot {slot} not found")
-        
-        _LOGGER.info(
-            "[handle_remove_code] Removing code '%s' from slot %d", entry.name, slot
+    def _lock(call: ServiceCall) -> dict[str, Any]:
+        """Return the data of the lock a call targets."""
+        return resolve_lock(
+            hass, call.data.get(ATTR_ENTRY_ID), call.data.get(ATTR_LOCK)
         )
 
-        # Remove from MQTT
+    async def handle_add_code(call: ServiceCall) -> dict:
+        """Handle add_code service call."""
         _LOGGER.info(
-            "[handle_remove_code] Sending remove command via MQTT - slot=%d, topic=%s",
-            slot,
-            config.get(CONF_MQTT_TOPIC, "unknown"),
+            "[handle_add_code] Service called - name='%s', type=%s, expiry=%s, "
+            "preferred_slot=%s, force=%s",
+            call.data["name"],
+            call.data["type"],
+            call.data.get("expiry"),
+            call.data.get("slot"),
+            call.data.get("force", False),
+        )
+        return await _lock(call)["manager"].async_add(
+            call.data["name"],
+            call.data["pin_code"],
+            call.data["type"],
+            call.data.get("expiry"),
+            call.data.get("slot"),
+            call.data.get("force", False),
         )
-        try:
-            await mqtt_adapter.remove_code(slot)
-            _LOGGER.info("[handle_remove_code] MQTT remove successful for slot %d", slot)
-        except Exception as err:
-            raise HomeAssistantError(f"Failed to remove code via MQTT: {err}") from err
 
-        # Remove from storage
-        await storage.remove(slot)
-        _LOGGER.info("Removed code from slot %s", slot)
+    async def handle_remove_code(call: ServiceCall) -> None:
+        """Handle remove_code service call."""
+        _LOGGER.info("[handle_remove_code] Service called with data: %s", call.data)
+        await _lock(call)["manager"].async_remove(call.data["slot"])
 
     async def handle_update_expiry(call: ServiceCall) -> None:
         """Handle update_expiry service call."""
-        data = hass.data[DOMAIN]
-        storage = data["storage"]
+        await _lock(call)["manager"].async_update_expiry(
+            call.data["slot"], call.data.get("expiry")
+        )
 
-        slot = call.data["slot"]
-        expiry = call.data.get("expiry")
-
-        # Validate expiry format if provided
-        if expiry:
-            try:
-                datetime.fromisoformat(expiry)
-            except ValueError as err:
-                raise HomeAssistantError(f"Invalid expiry date format: {err}") from err
-
-        # Update storage
-        try:
-            await storage.update_expiry(slot, expiry)
-            _LOGGER.info("Updated expiry for slot %s to %s", slot, expiry)
-        except Exception as err:
-            raise HomeAssistantError(f"Failed to update expiry: {err}") from err
-
-    async def handle_list_codes(call: ServiceCall) -> None:
+    async def handle_list_codes(call: ServiceCall) -> dict:
         """Handle list_codes service call."""
-        data = hass.data[DOMAIN]
-        storage = data["storage"]
-
-        entries = storage.list_entries()
-        _LOGGER.info("[handle_list_codes] Listed %d codes", len(entries))
+        storage = _lock(call)["storage"]
 
-        # Return as service response
-        return {"codes": [entry.to_dict() for entry in entries]}
+        # Return as service response; only changes with since_revision,
+        # one page of matching codes with a query
+        if (query := CodeQuery.from_data(call.data)) is not None:
+            result = run_query(
+                storage, query, dt_util.now(), call.data.get("since_revision")
+            )
+        else:
+            result = storage.list_since(call.data.get("since_revision"))
+        _LOGGER.info(
+            "[handle_list_codes] Listed %d codes at revision %d",
+            len(result.get("codes", result.get("changed", []))),
+            result["revision"],
+        )
+        return result
 
     async def handle_update_name(call: ServiceCall) -> None:
         """Handle update_name service call."""
         _LOGGER.info("[handle_update_name] Service called with data: %s", call.data)
-        
-        data = hass.data[DOMAIN]
-        storage = data["storage"]
-
-        slot = call.data["slot"]
-        name = call.data["name"]
-
-        # Check if slot exists
-        entry = storage.get(slot)
-        if entry is None:
-            _LOGGER.error("[handle_update_name] Slot %d not found", slot)
-            raise HomeAssistantError(f"Slot {slot} not found")
-
-        # Update storage
-        try:
-            await storage.update_name(slot, name)
-            _LOGGER.info("[handle_update_name] Updated name for slot %d to '%s'", slot, name)
-        except Exception as err:
-            _LOGGER.error("[handle_update_name] Failed to update name: %s", err)
-            raise HomeAssistantError(f"Failed to update name: {err}") from err
+        await _lock(call)["manager"].async_update_name(
+            call.data["slot"], call.data["name"]
+        )
 
     async def handle_update_pin(call: ServiceCall) -> None:
         """Handle update_pin service call - update PIN code for existing slot."""
         _LOGGER.info("[handle_update_pin] Service called for slot %d", call.data["slot"])
-        
-        data = hass.data[DOMAIN]
-        storage = data["storage"]
-        mqtt_adapter = data["mqtt_adapter"]
-        config = data["config"]
-
-        slot = call.data["slot"]
-        pin_code = call.data["pin_code"]
-
-        # Check if slot exists
-        entry = storage.get(slot)
-        if entry is None:
-            _LOGGER.error("[handle_update_pin] Slot %d not found", slot)
-            raise HomeAssistantError(f"Slot {slot} not found")
-
-        # Validate PIN code is 6 digits
-        if not pin_code.isdigit() or len(pin_code) != 6:
-            _LOGGER.error("[handle_update_pin] Invalid PIN code format")
-            raise HomeAssistantError("PIN code must be exactly 6 digits")
-
-        # Send new PIN to lock via MQTT
-        _LOGGER.info(
-            "[handle_update_pin] Sending new PIN to lock for slot %d via MQTT",
-            slot,
+        await _lock(call)["manager"].async_update(
+            call.data["slot"], {"pin_code": call.data["pin_code"]}
         )
-        try:
-            await mqtt_adapter.add_code(slot, pin_code)
-            _LOGGER.info("[handle_update_pin] Successfully updated PIN for slot %d", slot)
-        except Exception as err:
-            _LOGGER.error("[handle_update_pin] MQTT publish failed: %s", err)
-            raise HomeAssistantError(f"Failed to update PIN via MQTT: {err}") from err
-
-        # Update the 'updated' timestamp in storage
-        try:
-            # We just touch the entry to update the timestamp
-            current_entry = storage.get(slot)
-            if current_entry:
-                await storage.update_name(slot, current_entry.name)  # This updates the timestamp
-        except Exception as err:
-            _LOGGER.warning("[handle_update_pin] Failed to update timestamp: %s", err)
-
-    async def handle_cleanup_expired(call: ServiceCall) -> None:
+
+    async def handle_cleanup_expired(call: ServiceCall) -> dict:
         """Handle cleanup_expired service call - manually trigger expired code cleanup."""
         _LOGGER.info("[handle_cleanup_expired] Manual cleanup triggered")
-        
-        data = hass.data[DOMAIN]
-        storage = data["storage"]
-        mqtt_adapter = data["mqtt_adapter"]
-        config = data["config"]
-
-        today = date.today()
-        expired_slots = storage.expired_guest_slots(today)
+        report = await async_cleanup_expired(hass, _lock(call))
+        return report.as_dict()
+
+    async def handle_reconcile(call: ServiceCall) -> dict:
+        """Handle reconcile service call - compare the lock with storage."""
+        _LOGGER.info("[handle_reconcile] Service called with data: %s", call.data)
+
+        reconciler = _lock(call)["reconciler"]
+        report = await reconciler.async_reconcile(
+            call.data.get("slots"),
+            call.data.get("apply", False),
+            call.data.get("max_age"),
+        )
+        return report.as_dict()
 
-        if not expired_slots:
-            _LOGGER.info("[handle_cleanup_expired] No expired guest codes to clean up")
-            return {"removed": 0, "slots": []}
+    async def handle_bulk_apply(call: ServiceCall) -> dict:
+        """Handle bulk_apply service call - several operations, one save."""
+        _LOGGER.info(
+            "[handle_bulk_apply] Service called with %d operations",
+            len(call.data["operations"]),
+        )
+        return await _lock(call)["manager"].async_bulk_apply(
+            call.data["operations"]
+        )
 
+    async def handle_update_code(call: ServiceCall) -> dict:
+        """Handle update_code service call - change several fields at once."""
+        slot = call.data["slot"]
+        changes = {
+            key: value
+            for key, value in call.data.items()
+            if key not in ("slot", ATTR_ENTRY_ID, ATTR_LOCK)
+        }
         _LOGGER.info(
-            "[handle_cleanup_expired] Found %d expired guest codes: %s",
-            len(expired_slots),
-            expired_slots,
+            "[handle_update_code] Service called for slot %d with %s",
+            slot,
+            sorted(changes),
         )
-        removed_slots = []
-
-        for slot in expired_slots:
-            try:
-                entry = storage.get(slot)
-                name = entry.name if entry else f"Slot {slot}"
-
-                _LOGGER.info(
-                    "[handle_cleanup_expired] Removing expired code '%s' from slot %d via MQTT",
-                    name,
-                    slot,
-                )
-                
-                # Remove from MQTT/lock
-                await mqtt_adapter.remove_code(slot)
-                # Remove from storage
-                await storage.remove(slot)
-
-                _LOGGER.info(
-                    "[handle_cleanup_expired] Successfully removed expired code '%s' from slot %d",
-                    name,
-                    slot,
-                )
-                removed_slots.append(slot)
-            except Exception as err:
-                _LOGGER.error(
-                    "[handle_cleanup_expired] Failed to remove expired code from slot %d: %s",
-                    slot,
-                    err,
-                )
+        return await _lock(call)["manager"].async_update(slot, changes)
 
+    async def handle_fan_out(call: ServiceCall) -> dict:
+        """Handle fan_out service call - one code on several locks at once."""
         _LOGGER.info(
-            "[handle_cleanup_expired] Cleanup completed: removed %d/%d codes",
-            len(removed_slots),
-            len(expired_slots),
+            "[handle_fan_out] Service called - op=%s, group=%s, entry_ids=%s, locks=%s",
+            call.data["op"],
+            call.data.get(ATTR_GROUP),
+            call.data.get(ATTR_ENTRY_IDS),
+            call.data.get(ATTR_LOCKS),
+        )
+        targets = resolve_locks(
+            hass, call.data.get(ATTR_ENTRY_IDS), call.data.get(ATTR_LOCKS)
+        )
+        data = {
+            key: value
+            for key, value in call.data.items()
+            if key not in ("op", ATTR_GROUP, ATTR_ENTRY_IDS, ATTR_LOCKS)
+        }
+        return await async_fan_out(
+            targets, call.data["op"], data, call.data.get(ATTR_GROUP)
         )
-        return {"removed": len(removed_slots), "slots": removed_slots}
 
     # Register services
     hass.services.async_register(
@@ -436,6 +320,7 @@ async def async_setup_services(hass: HomeAssistant) -> None:
         DOMAIN,
         SERVICE_LIST_CODES,
         handle_list_codes,
+        schema=SERVICE_LIST_CODES_SCHEMA,
         supports_response=True,
     )
 
@@ -443,6 +328,39 @@ async def async_setup_services(hass: HomeAssistant) -> None:
         DOMAIN,
         SERVICE_CLEANUP_EXPIRED,
         handle_cleanup_expired,
+        schema=SERVICE_LOCK_SCHEMA,
+        supports_response=True,
+    )
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_RECONCILE,
+        handle_reconcile,
+        schema=SERVICE_RECONCILE_SCHEMA,
+        supports_response=True,
+    )
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_BULK_APPLY,
+        handle_bulk_apply,
+        schema=SERVICE_BULK_APPLY_SCHEMA,
+        supports_response=True,
+    )
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_UPDATE_CODE,
+        handle_update_code,
+        schema=SERVICE_UPDATE_CODE_SCHEMA,
+        supports_response=True,
+    )
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_FAN_OUT,
+        handle_fan_out,
+        schema=SERVICE_FAN_OUT_SCHEMA,
         supports_response=True,
     )
 
@@ -456,3 +374,7 @@ async def async_unload_services(hass: HomeAssistant) -> None:
     hass.services.async_remove(DOMAIN, SERVICE_UPDATE_PIN)
     hass.services.async_remove(DOMAIN, SERVICE_LIST_CODES)
     hass.services.async_remove(DOMAIN, SERVICE_CLEANUP_EXPIRED)
+    hass.services.async_remove(DOMAIN, SERVICE_RECONCILE)
+    hass.services.async_remove(DOMAIN, SERVICE_BULK_APPLY)
+    hass.services.async_remove(DOMAIN, SERVICE_UPDATE_CODE)
+    hass.services.async_remove(DOMAIN, SERVICE_FAN_OUT)
@@ -1,23 +1,47 @@
 """Storage management for Nimlykoder integration."""
 from __future__ import annotations
 
+import heapq
 import logging
-from dataclasses import asdict, dataclass
-from datetime import datetime, date
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, replace
+from datetime import datetime, date, timedelta
+import re
 from typing import Any
+import unicodedata
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.json import json_bytes
 from homeassistant.helpers.storage import Store
 from homeassistant.exceptions import HomeAssistantError
-
-from .const import STORAGE_KEY, STORAGE_VERSION, TYPE_PERMANENT, TYPE_GUEST
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    STORAGE_KEY,
+    STORAGE_VERSION,
+    SORT_SLOT,
+    SORT_NAME,
+    SORT_EXPIRY,
+    TYPE_PERMANENT,
+    TYPE_GUEST,
+    DEFAULT_SAVE_DELAY,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
+# Revisions are epoch * EPOCH_SPAN + changes made since the load
+EPOCH_SPAN = 2**32
+
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class CodeEntry:
-    """Represents a PIN code entry."""
+    """Represents a PIN code entry.
+
+    Entries are immutable; storage replaces the object on every change so
+    cached references handed out to callers never go stale underneath them.
+    """
 
     slot: int
     name: str
@@ -25,10 +49,33 @@ class CodeEntry:
     expiry: str | None
     created: str
     updated: str
+    # Shared by the copies of one code pushed to several locks
+    group: str | None = None
 
     def to_dict(self) -> dict[str, Any]:
         """Convert to dictionary."""
-        return asdict(self)
+        return {
+            "slot": self.slot,
+            "name": self.name,
+            "type": self.type,
+            "expiry": self.expiry,
+            "created": self.created,
+            "updated": self.updated,
+            "group": self.group,
+        }
+
+    def to_storage_dict(self) -> dict[str, Any]:
+        """Convert to the dictionary persisted under the slot key."""
+        data = {
+            "name": self.name,
+            "type": self.type,
+            "expiry": self.expiry,
+            "created": self.created,
+            "updated": self.updated,
+        }
+        if self.group is not None:
+            data["group"] = self.group
+        return data
 
     @staticmethod
     def from_dict(slot: int, data: dict[str, Any]) -> CodeEntry:
@@ -40,54 +87,430 @@ class CodeEntry:
             expiry=data.get("expiry"),
             created=data["created"],
             updated=data["updated"],
+            group=data.get("group"),
         )
 
 
+def parse_expiry(expiry: str | None) -> datetime | None:
+    """Parse an expiry string into the instant the code stops being valid.
+
+    A plain date (YYYY-MM-DD) is valid through the whole day, so it expires
+    at the start of the following local day. A datetime expires at that
+    instant; naive values are taken as local time.
+    """
+    if not expiry:
+        return None
+    if (expiry_date := dt_util.parse_date(expiry)) is not None:
+        return dt_util.start_of_local_day(expiry_date + timedelta(days=1))
+    try:
+        expires_at = datetime.fromisoformat(expiry)
+    except (ValueError, TypeError):
+        return None
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=dt_util.DEFAULT_TIME_ZONE)
+    return expires_at
+
+
+# Letters NFKD does not split into a base letter and a diacritic
+_FOLD_LETTERS = str.maketrans(
+    {"ø": "o", "æ": "ae", "œ": "oe", "ł": "l", "đ": "d", "ð": "d", "þ": "th"}
+)
+_WORD_RE = re.compile(r"\w+")
+
+# How a search result matched, best first; the index is its rank
+SEARCH_MATCHES = ("name_prefix", "word", "word_prefix")
+
+
+def fold_name(name: str) -> str:
+    """Return the case- and diacritic-folded form names are indexed and matched by.
+
+    "Åsa Øberg" folds to "asa oberg".
+    """
+    decomposed = unicodedata.normalize("NFKD", name.casefold())
+    folded = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return folded.translate(_FOLD_LETTERS)
+
+
+def name_words(folded: str) -> set[str]:
+    """Return the words of a folded name."""
+    return set(_WORD_RE.findall(folded))
+
+
+async def async_migrate_store(
+    hass: HomeAssistant, version: int, old_key: str, new_key: str
+) -> bool:
+    """Move a store written before multi-lock support to its per-lock key.
+
+    Does nothing if the per-lock store already exists or there is nothing
+    to move. Returns True if data was moved.
+    """
+    new_store = Store(hass, version, new_key)
+    if await new_store.async_load() is not None:
+        return False
+    old_store = Store(hass, version, old_key)
+    data = await old_store.async_load()
+    if data is None:
+        return False
+    await new_store.async_save(data)
+    await old_store.async_remove()
+    _LOGGER.info("Migrated storage %s to %s", old_key, new_key)
+    return True
+
+
+# Called with (slot, old_entry, new_entry); new_entry is None on removal
+StorageListener = Callable[[int, "CodeEntry | None", "CodeEntry | None"], None]
+
+
 class NimlykoderStorage:
     """Manage persistent storage for PIN codes."""
 
-    def __init__(self, hass: HomeAssistant) -> None:
-        """Initialize storage."""
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        save_delay: float = DEFAULT_SAVE_DELAY,
+        key: str = STORAGE_KEY,
+    ) -> None:
+        """Initialize storage.
+
+        Args:
+            hass: Home Assistant instance
+            save_delay: Seconds to coalesce writes over. 0 writes on every
+                        mutation (the original behaviour).
+            key: Storage file key, one per lock
+        """
         self.hass = hass
-        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
-        self._data: dict[str, dict[str, Any]] = {}
+        self._store = Store(hass, STORAGE_VERSION, key)
+        # Slot-keyed index of entries plus the slots in ascending order
+        self._entries: dict[int, CodeEntry] = {}
+        self._slots: list[int] = []
+        # Read caches, rebuilt lazily after a mutation
+        self._sorted_cache: list[CodeEntry] | None = None
+        self._dict_cache: list[dict[str, Any]] | None = None
+        self._json_cache: bytes | None = None
+        self._listeners: list[StorageListener] = []
+        # Guest expiry instants, parsed once per write, plus an ascending
+        # (expires_at, slot) index for range queries
+        self._expires_at: dict[int, datetime] = {}
+        self._expiry_index: list[tuple[datetime, int]] = []
+        # Slots by type, folded names, an ascending (folded name, slot)
+        # index and an ascending (word, slot) index for prefix search
+        self._type_slots: dict[str, set[int]] = {}
+        self._folded: dict[int, str] = {}
+        self._name_index: list[tuple[str, int]] = []
+        self._word_index: list[tuple[str, int]] = []
+        self._save_delay = save_delay
+        self._dirty = False
+        # Nesting depth of async_batch(); saves are deferred while > 0
+        self._batch_depth = 0
+        self._batch_pending = False
+        self._saves_requested = 0
+        self._saves_performed = 0
+        # Journal watermark: every intent up to this sequence number, and
+        # each one in applied_above, is reflected in the entries written
+        # alongside it. `sequence` returns both when storage is written.
+        self.sequence: Callable[[], tuple[int, list[int]]] | None = None
+        self.applied_seq = 0
+        self.applied_above: frozenset[int] = frozenset()
+        # Bumped on every mutation. Each load claims a new epoch on disk
+        # before handing out a revision, so a revision is never reused for
+        # different contents, even when a crash lost the last write. Each
+        # slot remembers the revision it last changed at; removed slots
+        # leave a tombstone. Both start empty at load, so changes are only
+        # known from `_base_revision` on.
+        self.epoch = 0
+        self.revision = 0
+        self._base_revision = 0
+        self._modified: dict[int, int] = {}
+        self._deleted: dict[int, int] = {}
 
     async def async_load(self) -> None:
-        """Load data from storage."""
+        """Load data from storage and claim a new revision epoch."""
         data = await self._store.async_load()
-        if data is None:
-            self._data = {}
-        else:
+        raw_entries: dict[str, dict[str, Any]] = {}
+        self.applied_seq = 0
+        self.applied_above = frozenset()
+        epoch = 0
+        if data is not None:
             # Handle migration if needed
             if data.get("version", 1) == STORAGE_VERSION:
-                self._data = data.get("entries", {})
+                raw_entries = data.get("entries", {})
+                self.applied_seq = data.get("applied_seq", 0)
+                self.applied_above = frozenset(data.get("applied_above", []))
+                epoch = data.get("epoch", 0)
             else:
                 _LOGGER.warning("Unknown storage version, resetting data")
-                self._data = {}
 
-    async def async_save(self) -> None:
-        """Save data to storage."""
-        await self._store.async_save(
-            {
-                "version": STORAGE_VERSION,
-                "entries": self._data,
-            }
+        self._entries = {}
+        self._expires_at = {}
+        self._expiry_index = []
+        self._type_slots = {}
+        self._folded = {}
+        for slot_str, entry_data in raw_entries.items():
+            slot = int(slot_str)
+            entry = CodeEntry.from_dict(slot, entry_data)
+            self._entries[slot] = entry
+            self._index_expiry(entry)
+            self._type_slots.setdefault(entry.type, set()).add(slot)
+            self._folded[slot] = fold_name(entry.name)
+        self._slots = sorted(self._entries)
+        self._name_index = sorted(
+            (folded, slot) for slot, folded in self._folded.items()
         )
+        self._word_index = sorted(
+            (word, slot)
+            for slot, folded in self._folded.items()
+            for word in name_words(folded)
+        )
+        self.epoch = epoch + 1
+        self.revision = self._base_revision = self.epoch * EPOCH_SPAN
+        self._modified = {}
+        self._deleted = {}
+        self._invalidate_caches()
+        await self.async_save()
+
+    async def async_save(self) -> None:
+        """Save data to storage immediately."""
+        await self._store.async_save(self._data_to_save())
+
+    async def async_flush(self) -> None:
+        """Write pending changes now, if any.
+
+        Used on unload and by callers that need the change on disk before
+        they continue. Cancels any delayed write that is still pending.
+        """
+        if not self._dirty:
+            return
+        _LOGGER.debug("[NimlykoderStorage] Flushing pending changes")
+        await self.async_save()
+
+    @asynccontextmanager
+    async def async_batch(self) -> AsyncIterator[None]:
+        """Group mutations so they are persisted with a single save.
+
+        Listeners and caches still see every change as it happens; only the
+        write is deferred until the outermost batch exits.
+        """
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self._batch_pending:
+                self._batch_pending = False
+                await self._async_request_save()
+
+    async def _async_request_save(self) -> None:
+        """Persist after a mutation, coalescing writes when a delay is set."""
+        if self._batch_depth:
+            self._dirty = True
+            self._batch_pending = True
+            return
+        self._saves_requested += 1
+        self._dirty = True
+        if self._save_delay <= 0:
+            await self.async_save()
+            return
+        self._store.async_delay_save(self._data_to_save, self._save_delay)
+
+    @callback
+    def _data_to_save(self) -> dict[str, Any]:
+        """Return the data to write. Called by the store when it writes."""
+        self._dirty = False
+        self._saves_performed += 1
+        if self.sequence is not None:
+            self.applied_seq, above = self.sequence()
+            self.applied_above = frozenset(above)
+        return {
+            "version": STORAGE_VERSION,
+            "applied_seq": self.applied_seq,
+            "applied_above": sorted(self.applied_above),
+            "epoch": self.epoch,
+            "entries": {
+                str(slot): entry.to_storage_dict()
+                for slot, entry in self._entries.items()
+            },
+        }
+
+    @property
+    def save_stats(self) -> dict[str, Any]:
+        """Return persistence counters."""
+        return {
+            "save_delay": self._save_delay,
+            "saves_requested": self._saves_requested,
+            "saves_performed": self._saves_performed,
+            "dirty": self._dirty,
+        }
+
+    @callback
+    def _invalidate_caches(self) -> None:
+        """Drop read caches after a mutation."""
+        self._sorted_cache = None
+        self._dict_cache = None
+        self._json_cache = None
+
+    @callback
+    def async_add_listener(self, listener: StorageListener) -> Callable[[], None]:
+        """Listen for entry changes. Returns a function that removes the listener."""
+        self._listeners.append(listener)
+
+        @callback
+        def remove_listener() -> None:
+            self._listeners.remove(listener)
+
+        return remove_listener
+
+    @callback
+    def _notify(self, slot: int, old: CodeEntry | None, new: CodeEntry | None) -> None:
+        """Tell listeners about a change."""
+        for listener in list(self._listeners):
+            try:
+                listener(slot, old, new)
+            except Exception:
+                _LOGGER.exception(
+                    "[NimlykoderStorage] Listener failed for slot %d", slot
+                )
+
+    @callback
+    def _index_expiry(self, entry: CodeEntry) -> None:
+        """Add a guest entry's expiry to the expiry index."""
+        if entry.type != TYPE_GUEST or not entry.expiry:
+            return
+        expires_at = parse_expiry(entry.expiry)
+        if expires_at is None:
+            _LOGGER.error("Invalid expiry date for slot %s", entry.slot)
+            return
+        self._expires_at[entry.slot] = expires_at
+        insort(self._expiry_index, (expires_at, entry.slot))
+
+    @callback
+    def _unindex_expiry(self, slot: int) -> None:
+        """Remove a slot from the expiry index."""
+        expires_at = self._expires_at.pop(slot, None)
+        if expires_at is not None:
+            del self._expiry_index[bisect_left(self._expiry_index, (expires_at, slot))]
+
+    @callback
+    def _index_fields(self, entry: CodeEntry) -> None:
+        """Add an entry to the type, name and word indexes."""
+        self._type_slots.setdefault(entry.type, set()).add(entry.slot)
+        folded = self._folded[entry.slot] = fold_name(entry.name)
+        insort(self._name_index, (folded, entry.slot))
+        for word in name_words(folded):
+            insort(self._word_index, (word, entry.slot))
+
+    @callback
+    def _unindex_fields(self, entry: CodeEntry) -> None:
+        """Remove an entry from the type, name and word indexes."""
+        self._type_slots.get(entry.type, set()).discard(entry.slot)
+        folded = self._folded.pop(entry.slot)
+        del self._name_index[bisect_left(self._name_index, (folded, entry.slot))]
+        for word in name_words(folded):
+            del self._word_index[bisect_left(self._word_index, (word, entry.slot))]
+
+    @callback
+    def _put(self, entry: CodeEntry) -> None:
+        """Insert or replace an entry in the index."""
+        old = self._entries.get(entry.slot)
+        if old is None:
+            insort(self._slots, entry.slot)
+        else:
+            self._unindex_expiry(entry.slot)
+            self._unindex_fields(old)
+        self._entries[entry.slot] = entry
+        self._index_expiry(entry)
+        self._index_fields(entry)
+        self._invalidate_caches()
+        self.revision += 1
+        self._modified[entry.slot] = self.revision
+        self._deleted.pop(entry.slot, None)
+        self._notify(entry.slot, old, entry)
+
+    @callback
+    def _drop(self, slot: int) -> CodeEntry | None:
+        """Remove an entry from the index."""
+        entry = self._entries.pop(slot, None)
+        if entry is not None:
+            del self._slots[bisect_left(self._slots, slot)]
+            self._unindex_expiry(slot)
+            self._unindex_fields(entry)
+            self._invalidate_caches()
+            self.revision += 1
+            self._modified.pop(slot, None)
+            self._deleted[slot] = self.revision
+            self._notify(slot, entry, None)
+        return entry
 
     def list_entries(self) -> list[CodeEntry]:
-        """List all entries."""
-        entries = []
-        for slot_str, data in self._data.items():
-            slot = int(slot_str)
-            entries.append(CodeEntry.from_dict(slot, data))
-        return sorted(entries, key=lambda e: e.slot)
+        """List all entries ordered by slot.
+
+        The returned list is cached and shared between callers; do not modify it.
+        """
+        if self._sorted_cache is None:
+            self._sorted_cache = [self._entries[slot] for slot in self._slots]
+        return self._sorted_cache
+
+    def list_dicts(self) -> list[dict[str, Any]]:
+        """List all entries as dictionaries ordered by slot.
+
+        The returned list is cached and shared between callers; do not modify it.
+        """
+        if self._dict_cache is None:
+            self._dict_cache = [entry.to_dict() for entry in self.list_entries()]
+        return self._dict_cache
+
+    def changes_since(
+        self, revision: int
+    ) -> tuple[list[dict[str, Any]], list[int]] | None:
+        """Return the entries changed and the slots removed after `revision`.
+
+        Returns None when the changes cannot be told apart, because the
+        revision belongs to an earlier load (every load starts a new epoch)
+        or is ahead of storage; the caller should send everything.
+        """
+        if not self._base_revision <= revision <= self.revision:
+            return None
+        changed = [
+            self._entries[slot].to_dict()
+            for slot, modified in sorted(self._modified.items())
+            if modified > revision
+        ]
+        removed = sorted(
+            slot for slot, deleted in self._deleted.items() if deleted > revision
+        )
+        return changed, removed
+
+    def list_since(self, revision: int | None = None) -> dict[str, Any]:
+        """Return the codes for a list request, conditional on `revision`.
+
+        Returns {"revision", "not_modified": True} when nothing changed after
+        `revision`, {"revision", "changed", "removed"} with only what did, or
+        {"revision", "codes"} with every entry. The codes are copies, so the
+        caller may hand them out freely.
+        """
+        if revision is not None:
+            if revision == self.revision:
+                return {"revision": self.revision, "not_modified": True}
+            if (changes := self.changes_since(revision)) is not None:
+                changed, removed = changes
+                return {
+                    "revision": self.revision,
+                    "changed": changed,
+                    "removed": removed,
+                }
+        return {
+            "revision": self.revision,
+            "codes": [dict(code) for code in self.list_dicts()],
+        }
+
+    def list_json(self) -> bytes:
+        """Return list_dicts() serialized to JSON, cached until the next change."""
+        if self._json_cache is None:
+            self._json_cache = json_bytes(self.list_dicts())
+        return self._json_cache
 
     def get(self, slot: int) -> CodeEntry | None:
         """Get entry by slot."""
-        slot_str = str(slot)
-        if slot_str not in self._data:
-            return None
-        return CodeEntry.from_dict(slot, self._data[slot_str])
+        return self._entries.get(slot)
 
     async def add(
         self,
@@ -95,86 +518,237 @@ class NimlykoderStorage:
         name: str,
         code_type: str,
         expiry: str | None = None,
+        group: str | None = None,
     ) -> CodeEntry:
         """Add a new entry."""
         now = datetime.now().isoformat()
-        slot_str = str(slot)
 
         # Validate type and expiry
         if code_type == TYPE_GUEST and expiry is None:
             raise HomeAssistantError("Guest codes must have an expiry date")
 
-        entry_data = {
-            "name": name,
-            "type": code_type,
-            "expiry": expiry,
-            "created": now,
-            "updated": now,
-        }
+        entry = CodeEntry(
+            slot=slot,
+            name=name,
+            type=code_type,
+            expiry=expiry,
+            created=now,
+            updated=now,
+            group=group,
+        )
 
-        self._data[slot_str] = entry_data
-        await self.async_save()
+        self._put(entry)
+        await self._async_request_save()
 
-        return CodeEntry.from_dict(slot, entry_data)
+        return entry
 
     async def remove(self, slot: int) -> None:
         """Remove an entry."""
-        slot_str = str(slot)
-        if slot_str in self._data:
-            del self._data[slot_str]
-            await self.async_save()
+        if self._drop(slot) is not None:
+            await self._async_request_save()
 
     async def update_expiry(self, slot: int, expiry: str | None) -> CodeEntry:
         """Update expiry date."""
-        slot_str = str(slot)
-        if slot_str not in self._data:
+        entry = self._entries.get(slot)
+        if entry is None:
             raise HomeAssistantError(f"Slot {slot} not found")
 
-        self._data[slot_str]["expiry"] = expiry
-        self._data[slot_str]["updated"] = datetime.now().isoformat()
-        await self.async_save()
+        entry = replace(entry, expiry=expiry, updated=datetime.now().isoformat())
+        self._put(entry)
+        await self._async_request_save()
 
-        return CodeEntry.from_dict(slot, self._data[slot_str])
+        return entry
 
     async def update_name(self, slot: int, name: str) -> CodeEntry:
         """Update name for a code entry."""
-        slot_str = str(slot)
-        if slot_str not in self._data:
+        entry = self._entries.get(slot)
+        if entry is None:
             raise HomeAssistantError(f"Slot {slot} not found")
 
         if not name or not name.strip():
             raise HomeAssistantError("Name cannot be empty")
 
-        self._data[slot_str]["name"] = name.strip()
-        self._data[slot_str]["updated"] = datetime.now().isoformat()
-        await self.async_save()
+        entry = replace(entry, name=name.strip(), updated=datetime.now().isoformat())
+        self._put(entry)
+        await self._async_request_save()
 
-        return CodeEntry.from_dict(slot, self._data[slot_str])
-
-    def find_first_free_slot(
-        self, slot_min: int, slot_max: int, reserved_slots: list[int]
-    ) -> int | None:
-        """Find first available slot outside reserved range."""
-        for slot in range(slot_min, slot_max + 1):
-            if slot in reserved_slots:
-                continue
-            if str(slot) not in self._data:
-                return slot
-        return None
+        return entry
+
+    async def update(self, slot: int, changes: dict[str, Any]) -> CodeEntry:
+        """Apply several field changes in one mutation and one save.
+
+        `changes` may hold any of name, type and expiry. An empty dict only
+        bumps the updated timestamp, e.g. after a PIN change.
+        """
+        entry = self._entries.get(slot)
+        if entry is None:
+            raise HomeAssistantError(f"Slot {slot} not found")
+
+        fields: dict[str, Any] = {}
+        if "name" in changes:
+            if not changes["name"] or not changes["name"].strip():
+                raise HomeAssistantError("Name cannot be empty")
+            fields["name"] = changes["name"].strip()
+        if "type" in changes:
+            fields["type"] = changes["type"]
+        if "expiry" in changes:
+            fields["expiry"] = changes["expiry"] or None
+
+        if fields.get("type", entry.type) == TYPE_GUEST and not fields.get(
+            "expiry", entry.expiry
+        ):
+            raise HomeAssistantError("Guest codes must have an expiry date")
+
+        entry = replace(entry, **fields, updated=datetime.now().isoformat())
+        self._put(entry)
+        await self._async_request_save()
+
+        return entry
+
+    def expired_slots(self, now: datetime) -> list[int]:
+        """Get guest slots whose expiry instant is at or before `now`.
+
+        Ordered by expiry, earliest first.
+        """
+        end = bisect_right(self._expiry_index, (now, float("inf")))
+        return [slot for _, slot in self._expiry_index[:end]]
+
+    def expired_count(self, now: datetime) -> int:
+        """Count guest codes that have expired by `now`."""
+        return bisect_right(self._expiry_index, (now, float("inf")))
+
+    def next_expiry(self) -> datetime | None:
+        """Return the earliest guest expiry instant, if any."""
+        return self._expiry_index[0][0] if self._expiry_index else None
+
+    def expires_at(self, slot: int) -> datetime | None:
+        """Return the parsed expiry instant for a guest slot."""
+        return self._expires_at.get(slot)
 
     def expired_guest_slots(self, today: date) -> list[int]:
-        """Get list of expired guest code slots."""
-        expired = []
-        for slot_str, data in self._data.items():
-            if data["type"] == TYPE_GUEST and data.get("expiry"):
-                try:
-                    expiry_date = datetime.fromisoformat(data["expiry"]).date()
-                    if expiry_date < today:
-                        expired.append(int(slot_str))
-                except (ValueError, TypeError):
-                    _LOGGER.error("Invalid expiry date for slot %s", slot_str)
-        return expired
+        """Get list of guest code slots that expired before `today`."""
+        return self.expired_slots(dt_util.start_of_local_day(today))
 
     def is_slot_occupied(self, slot: int) -> bool:
         """Check if slot is occupied."""
-        return str(slot) in self._data
+        return slot in self._entries
+
+    def group_slots(self, group: str) -> list[int]:
+        """Return the slots holding a code of the given group."""
+        return [
+            slot for slot in self._slots if self._entries[slot].group == group
+        ]
+
+    def occupied_slots(self) -> list[int]:
+        """Return occupied slots in ascending order."""
+        return list(self._slots)
+
+    def type_slots(self, code_type: str) -> set[int]:
+        """Return the slots holding codes of a type.
+
+        The set is the index itself; do not modify it.
+        """
+        return self._type_slots.get(code_type, set())
+
+    def expiring_slots(self, start: datetime, end: datetime) -> list[int]:
+        """Get guest slots expiring after `start` and at or before `end`."""
+        first = bisect_right(self._expiry_index, (start, float("inf")))
+        last = bisect_right(self._expiry_index, (end, float("inf")))
+        return [slot for _, slot in self._expiry_index[first:last]]
+
+    def folded_name(self, slot: int) -> str:
+        """Return a slot's name as indexed by fold_name()."""
+        return self._folded[slot]
+
+    def sort_key(self, sort: str) -> Callable[[int], tuple]:
+        """Return the function giving a slot's position in a sort order.
+
+        Keys are plain tuples of numbers and strings, so a query cursor can
+        carry one. By expiry, codes without one come last.
+        """
+        if sort == SORT_NAME:
+            return lambda slot: (self.folded_name(slot), slot)
+        if sort == SORT_EXPIRY:
+
+            def expiry_key(slot: int) -> tuple:
+                if (expires_at := self._expires_at.get(slot)) is None:
+                    return (1, 0, slot)
+                return (0, expires_at.timestamp(), slot)
+
+            return expiry_key
+        return lambda slot: (slot,)
+
+    def iter_sorted(self, sort: str, after: tuple | None = None) -> Iterator[int]:
+        """Yield slots in a sort order from the maintained indexes.
+
+        Starts after the slot whose sort_key() is `after`, if given. Do not
+        change storage while iterating.
+        """
+        if sort == SORT_NAME:
+            start = 0 if after is None else bisect_right(self._name_index, after)
+            for index in range(start, len(self._name_index)):
+                yield self._name_index[index][1]
+            return
+
+        if sort == SORT_EXPIRY:
+            if after is None or after[0] == 0:
+                start = 0
+                if after is not None:
+                    start = bisect_right(
+                        self._expiry_index,
+                        after[1:],
+                        key=lambda item: (item[0].timestamp(), item[1]),
+                    )
+                for index in range(start, len(self._expiry_index)):
+                    yield self._expiry_index[index][1]
+                after = None
+            else:
+                after = (after[2],)
+            for slot in self.iter_sorted(SORT_SLOT, after):
+                if slot not in self._expires_at:
+                    yield slot
+            return
+
+        start = 0 if after is None else bisect_right(self._slots, after[0])
+        for index in range(start, len(self._slots)):
+            yield self._slots[index]
+
+    def _word_prefix_slots(self, prefix: str) -> set[int]:
+        """Return the slots with a name word starting with `prefix`."""
+        slots = set()
+        index = bisect_left(self._word_index, (prefix,))
+        while index < len(self._word_index):
+            word, slot = self._word_index[index]
+            if not word.startswith(prefix):
+                break
+            slots.add(slot)
+            index += 1
+        return slots
+
+    def search(self, query: str, limit: int) -> list[tuple[int, str, int]]:
+        """Find codes by name, best matches first.
+
+        Every word of the query must start a word of the name, in any order
+        and ignoring case and diacritics. Candidates come from the word
+        index, so the cost follows the number of matches, not of codes.
+
+        Returns:
+            Up to `limit` (rank, folded name, slot) tuples, where rank
+            indexes SEARCH_MATCHES: the whole name starts with the query,
+            every query word is a whole word of the name, or neither
+        """
+        folded = " ".join(_WORD_RE.findall(fold_name(query)))
+        if not (words := name_words(folded)):
+            return []
+        matches = sorted((self._word_prefix_slots(word) for word in words), key=len)
+        candidates = matches[0].intersection(*matches[1:])
+
+        def rank(slot: int) -> tuple[int, str, int]:
+            name = self._folded[slot]
+            if " ".join(_WORD_RE.findall(name)).startswith(folded):
+                return (0, name, slot)
+            if words <= name_words(name):
+                return (1, name, slot)
+            return (2, name, slot)
+
+        return heapq.nsmallest(limit, map(rank, candidates))
@@ -2,7 +2,6 @@
 from __future__ import annotations
 
 import logging
-from datetime import datetime
 from typing import Any
 
 import voluptuous as vol
@@ -10,9 +9,10 @@ import voluptuous as vol
 from homeassistant.components import websocket_api
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.json import json_bytes
+from homeassistant.util import dt as dt_util
 
 from .const import (
-    DOMAIN,
     WS_TYPE_LIST,
     WS_TYPE_ADD,
     WS_TYPE_REMOVE,
@@ -22,11 +22,33 @@ from .const import (
     WS_TYPE_SUGGEST_SLOTS,
     WS_TYPE_CONFIG,
     WS_TYPE_TRANSLATIONS,
+    WS_TYPE_RECONCILE,
+    WS_TYPE_BATCH,
+    WS_TYPE_UPDATE,
+    WS_TYPE_LOCKS,
+    WS_TYPE_FAN_OUT,
+    WS_TYPE_SUBSCRIBE,
+    WS_TYPE_BOOTSTRAP,
+    WS_TYPE_SEARCH,
+    ATTR_ENTRY_ID,
+    ATTR_ENTRY_IDS,
+    ATTR_GROUP,
     TYPE_PERMANENT,
     TYPE_GUEST,
     CONF_AUTO_EXPIRE,
     CONF_CLEANUP_TIME,
+    CONF_LOCK_ENTITY,
+    CONF_SLOT_MIN,
+    CONF_SLOT_MAX,
+    QUERY_MAX_LIMIT,
+    SEARCH_DEFAULT_LIMIT,
 )
+from .bulk import OP_ADD, OP_REMOVE, OP_UPDATE, OPERATIONS_SCHEMA
+from .fanout import LockResult, async_fan_out, new_group_id, validate_fan_out
+from .localization import PanelTranslations, get_panel_translations
+from .locks import get_locks, resolve_lock, resolve_locks
+from .manager import CodeOperationError
+from .query import QUERY_SCHEMA, CodeQuery, run_query, search_locks
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -43,11 +65,71 @@ def async_register_websocket_handlers(hass: HomeAssistant) -> None:
     websocket_api.async_register_command(hass, handle_suggest_slots)
     websocket_api.async_register_command(hass, handle_config)
     websocket_api.async_register_command(hass, handle_translations)
+    websocket_api.async_register_command(hass, handle_reconcile)
+    websocket_api.async_register_command(hass, handle_batch)
+    websocket_api.async_register_command(hass, handle_update)
+    websocket_api.async_register_command(hass, handle_locks)
+    websocket_api.async_register_command(hass, handle_fan_out)
+    websocket_api.async_register_command(hass, handle_subscribe)
+    websocket_api.async_register_command(hass, handle_bootstrap)
+    websocket_api.async_register_command(hass, handle_search)
+
+
+def _translations_part(
+    translations: PanelTranslations, known: str | None, hash_key: bytes
+) -> bytes:
+    """Return `"language":..,<hash_key>:..[,"translations":..]}` for a reply.
+
+    The strings are left out when the client already has them.
+    """
+    parts = [
+        b'"language":',
+        json_bytes(translations.language),
+        b',"',
+        hash_key,
+        b'":',
+        json_bytes(translations.hash),
+    ]
+    if known != translations.hash:
+        parts += [b',"translations":', translations.data]
+    parts.append(b"}")
+    return b"".join(parts)
+
+
+def _lock_info(data: dict[str, Any]) -> dict[str, Any]:
+    """Return what the panel needs to tell one lock from another."""
+    config = data["config"]
+    return {
+        "entry_id": data["entry"].entry_id,
+        "title": data["entry"].title,
+        "lock_entity": config.get(CONF_LOCK_ENTITY),
+        "slot_min": config[CONF_SLOT_MIN],
+        "slot_max": config[CONF_SLOT_MAX],
+    }
+
+
+def _config(data: dict[str, Any]) -> dict[str, Any]:
+    """Return the lock settings the panel shows."""
+    config = data["config"]
+    return {
+        **_lock_info(data),
+        "auto_expire": config.get(CONF_AUTO_EXPIRE, True),
+        "cleanup_time": config.get(CONF_CLEANUP_TIME, "03:00:00"),
+        "availability": _availability(data),
+    }
+
+
+def _availability(data: dict[str, Any]) -> dict[str, Any]:
+    """Return cached lock availability plus commands waiting for the lock."""
+    return data["feed"].availability()
 
 
 @websocket_api.websocket_command(
     {
         vol.Required("type"): WS_TYPE_LIST,
+        vol.Optional(ATTR_ENTRY_ID): str,
+        vol.Optional("since_revision"): vol.All(int, vol.Range(min=0)),
+        **QUERY_SCHEMA,
     }
 )
 @websocket_api.async_response
@@ -56,16 +138,33 @@ async def handle_list(
     connection: websocket_api.ActiveConnection,
     msg: dict[str, Any],
 ) -> None:
-    """Handle list command."""
+    """Handle list command.
+
+    With `since_revision` only the entries changed and slots removed after
+    that revision are sent, or `not_modified` if there are none. With any of
+    filter, sort, fields, limit or cursor, one page of matching codes is
+    sent instead (see run_query), or `not_modified`.
+    """
     try:
-        data = hass.data[DOMAIN]
+        data = resolve_lock(hass, msg.get(ATTR_ENTRY_ID))
         storage = data["storage"]
+        now = dt_util.now()
+
+        if (query := CodeQuery.from_data(msg)) is not None:
+            result = run_query(storage, query, now, msg.get("since_revision"))
+        else:
+            result = storage.list_since(msg.get("since_revision"))
 
-        entries = storage.list_entries()
         connection.send_result(
             msg["id"],
-            {"codes": [entry.to_dict() for entry in entries]},
+            {
+                **result,
+                "expired_count": storage.expired_count(now),
+                "availability": _availability(data),
+            },
         )
+    except CodeOperationError as err:
+        connection.send_error(msg["id"], err.code, str(err))
     except Exception as err:
         _LOGGER.error("Error listing codes: %s", err)
         connection.send_error(msg["id"], "list_failed", str(err))
@@ -74,6 +173,7 @@ async def handle_list(
 @websocket_api.websocket_command(
     {
         vol.Required("type"): WS_TYPE_ADD,
+        vol.Optional(ATTR_ENTRY_ID): str,
         vol.Required("name"): str,
         vol.Required("pin_code"): str,
         vol.Required("code_type"): vol.In([TYPE_PERMANENT, TYPE_GUEST]),
@@ -90,104 +190,19 @@ async def handle_add(
 ) -> None:
     """Handle add command."""
     try:
-        data = hass.data[DOMAIN]
-        storage = data["storage"]
-        mqtt_adapter = data["mqtt_adapter"]
-        config = data["config"]
-
-        name = msg["name"]
-        pin_code = msg["pin_code"]
-        code_type = msg["code_type"]
-        expiry = msg.get("expiry")
-        preferred_slot = msg.get("slot")
-        force = msg.get("force", False)
-
-        # Validate PIN code is 6 digits
-        if not pin_code.isdigit() or len(pin_code) != 6:
-            connection.send_error(
-                msg["id"], "invalid_input", "PIN code must be exactly 6 digits"
-            )
-            return
-
-        # Policy enforcement
-        if code_type == TYPE_GUEST and not expiry:
-            connection.send_error(
-                msg["id"], "invalid_input", "Guest codes must have an expiry date"
-            )
-            return
-
-        # Validate expiry format if provided
-        if expiry:
-            try:
-                datetime.fromisoformat(expiry)
-            except ValueError as err:
-                connection.send_error(
-                    msg["id"], "invalid_input", f"Invalid expiry date format: {err}"
-                )
-                return
-
-        # Determine slot
-        if preferred_slot is not None:
-            slot = preferred_slot
-            # Check bounds
-            if slot < config["slot_min"] or slot > config["slot_max"]:
-                connection.send_error(
-                    msg["id"],
-                    "invalid_slot",
-                    f"Slot {slot} outside configured range",
-                )
-                return
-            # Check if occupied
-            if storage.is_slot_occupied(slot):
-                if not force and config.get("overwrite_protection", True):
-                    connection.send_error(
-                        msg["id"],
-                        "slot_occupied",
-                        f"Slot {slot} is occupied. Use force to overwrite",
-                    )
-                    return
-        else:
-            # Auto-select slot
-            slot = storage.find_first_free_slot(
-                config["slot_min"],
-                config["slot_max"],
-                config["reserved_slots"],
-            )
-            if slot is None:
-                connection.send_error(
-                    msg["id"], "no_free_slots", "No free slots available"
-                )
-                return
-
-        # Check reserved slots for auto-assignment
-        if preferred_slot is None and slot in config["reserved_slots"]:
-            connection.send_error(
-                msg["id"], "slot_reserved", f"Slot {slot} is reserved"
-            )
-            return
-
-        # Add to MQTT first
-        try:
-            await mqtt_adapter.add_code(slot, pin_code)
-        except Exception as err:
-            connection.send_error(
-                msg["id"], "mqtt_error", f"Failed to add code via MQTT: {err}"
-            )
-            return
-
-        # Then store
-        try:
-            entry = await storage.add(slot, name, code_type, expiry)
-            _LOGGER.info("Added %s code '%s' to slot %s", code_type, name, slot)
-            connection.send_result(msg["id"], {"entry": entry.to_dict()})
-        except Exception as err:
-            # Try to clean up MQTT if storage fails
-            try:
-                await mqtt_adapter.remove_code(slot)
-            except Exception:
-                pass
-            connection.send_error(msg["id"], "storage_error", str(err))
+        manager = resolve_lock(hass, msg.get(ATTR_ENTRY_ID))["manager"]
+        result = await manager.async_add(
+            msg["name"],
+            msg["pin_code"],
+            msg["code_type"],
+            msg.get("expiry"),
+            msg.get("slot"),
+            msg.get("force", False),
+        )
+        connection.send_result(msg["id"], result)
 
+    except CodeOperationError as err:
+        connection.send_error(msg["id"], err.code, str(err))
     except Exception as err:
         _LOGGER.error("Error adding code: %s", err)
         connection.send_error(msg["id"], "add_failed", str(err))
@@ -196,6 +211,7 @@ async def handle_add(
 @websocket_api.websocket_command(
     {
         vol.Required("type"): WS_TYPE_REMOVE,
+        vol.Optional(ATTR_ENTRY_ID): str,
         vol.Required("slot"): int,
     }
 )
@@ -207,32 +223,12 @@ async def handle_remove(
 ) -> None:
     """Handle remove command."""
     try:
-        data = hass.data[DOMAIN]
-        storage = data["storage"]
-        mqtt_adapter = data["mqtt_adapter"]
-
-        slot = msg["slot"]
-
-        # Check if slot exists
-        entry = storage.get(slot)
-        if entry is None:
-            connection.send_error(msg["id"], "not_found", f"Slot {slot} not found")
-            return
-
-        # Remove from MQTT
-        try:
-            await mqtt_adapter.remove_code(slot)
-        except Exception as err:
-            connection.send_error(
-                msg["id"], "mqtt_error", f"Failed to remove code via MQTT: {err}"
-            )
-            return
-
-        # Remove from storage
-        await storage.remove(slot)
-        _LOGGER.info("Removed code from slot %s", slot)
-        connection.send_result(msg["id"], {"success": True})
+        manager = resolve_lock(hass, msg.get(ATTR_ENTRY_ID))["manager"]
+        result = await manager.async_remove(msg["slot"])
+        connection.send_result(msg["id"], result)
 
+    except CodeOperationError as err:
+        connection.send_error(msg["id"], err.code, str(err))
     except Exception as err:
         _LOGGER.error("Error removing code: %s", err)
         connection.send_error(msg["id"], "remove_failed", str(err))
@@ -241,6 +237,7 @@ async def handle_remove(
 @websocket_api.websocket_command(
     {
         vol.Required("type"): WS_TYPE_UPDATE_EXPIRY,
+        vol.Optional(ATTR_ENTRY_ID): str,
         vol.Required("slot"): int,
         vol.Optional("expiry"): str,
     }
@@ -253,30 +250,14 @@ async def handle_update_expiry(
 ) -> None:
     """Handle update_expiry command."""
     try:
-        data = hass.data[DOMAIN]
-        storage = data["storage"]
-
-        slot = msg["slot"]
-        expiry = msg.get("expiry")
-
-        # Validate expiry format if provided
-        if expiry:
-            try:
-                datetime.fromisoformat(expiry)
-            except ValueError as err:
-                connection.send_error(
-                    msg["id"], "invalid_input", f"Invalid expiry date format: {err}"
-                )
-                return
-
-        # Update storage
-        try:
-            entry = await storage.update_expiry(slot, expiry)
-            _LOGGER.info("Updated expiry for slot %s to %s", slot, expiry)
-            connection.send_result(msg["id"], {"entry": entry.to_dict()})
-        except Exception as err:
-            connection.send_error(msg["id"], "update_failed", str(err))
+        manager = resolve_lock(hass, msg.get(ATTR_ENTRY_ID))["manager"]
+        result = await manager.async_update_expiry(
+            msg["slot"], msg.get("expiry")
+        )
+        connection.send_result(msg["id"], result)
 
+    except CodeOperationError as err:
+        connection.send_error(msg["id"], err.code, str(err))
     except Exception as err:
         _LOGGER.error("Error updating expiry: %s", err)
         connection.send_error(msg["id"], "update_failed", str(err))
@@ -285,6 +266,7 @@ async def handle_update_expiry(
 @websocket_api.websocket_command(
     {
         vol.Required("type"): WS_TYPE_UPDATE_NAME,
+        vol.Optional(ATTR_ENTRY_ID): str,
         vol.Required("slot"): int,
         vol.Required("name"): str,
     }
@@ -297,30 +279,14 @@ async def handle_update_name(
 ) -> None:
     """Handle update_name command."""
     try:
-        data = hass.data[DOMAIN]
-        storage = data["storage"]
-
-        slot = msg["slot"]
-        name = msg["name"]
-
-        if not name or not name.strip():
-            connection.send_error(msg["id"], "invalid_input", "Name cannot be empty")
-            return
-
-        # Check if slot exists
-        entry = storage.get(slot)
-        if entry is None:
-            connection.send_error(msg["id"], "not_found", f"Slot {slot} not found")
-            return
-
-        # Update storage
-        try:
-            entry = await storage.update_name(slot, name)
-            _LOGGER.info("Updated name for slot %s to '%s'", slot, name)
-            connection.send_result(msg["id"], {"entry": entry.to_dict()})
-        except Exception as err:
-            connection.send_error(msg["id"], "update_failed", str(err))
+        manager = resolve_lock(hass, msg.get(ATTR_ENTRY_ID))["manager"]
+        result = await manager.async_update_name(
+            msg["slot"], msg["name"]
+        )
+        connection.send_result(msg["id"], result)
 
+    except CodeOperationError as err:
+        connection.send_error(msg["id"], err.code, str(err))
     except Exception as err:
         _LOGGER.error("Error updating name: %s", err)
         connection.send_error(msg["id"], "update_failed", str(err))
@@ -329,6 +295,7 @@ async def handle_update_name(
 @websocket_api.websocket_command(
     {
         vol.Required("type"): WS_TYPE_UPDATE_PIN,
+        vol.Optional(ATTR_ENTRY_ID): str,
         vol.Required("slot"): int,
         vol.Required("pin_code"): str,
     }
@@ -341,45 +308,14 @@ async def handle_update_pin(
 ) -> None:
     """Handle update_pin command - update PIN code for existing slot."""
     try:
-        data = hass.data[DOMAIN]
-        storage = data["storage"]
-        mqtt_adapter = data["mqtt_adapter"]
-
-        slot = msg["slot"]
-        pin_code = msg["pin_code"]
-
-        # Check if slot exists
-        entry = storage.get(slot)
-        if entry is None:
-            connection.send_error(msg["id"], "not_found", f"Slot {slot} not found")
-            return
-
-        # Validate PIN code is 6 digits
-        if not pin_code.isdigit() or len(pin_code) != 6:
-            connection.send_error(
-                msg["id"], "invalid_input", "PIN code must be exactly 6 digits"
-            )
-            return
-
-        # Send new PIN to lock via MQTT
-        _LOGGER.info("Updating PIN for slot %s via MQTT", slot)
-        try:
-            await mqtt_adapter.add_code(slot, pin_code)
-        except Exception as err:
-            connection.send_error(
-                msg["id"], "mqtt_error", f"Failed to update PIN via MQTT: {err}"
-            )
-            return
-
-        # Update the 'updated' timestamp in storage
-        try:
-            entry = await storage.update_name(slot, entry.name)  # This updates the timestamp
-        except Exception as err:
-            _LOGGER.warning("Failed to update timestamp: %s", err)
-
-        _LOGGER.info("Successfully updated PIN for slot %s", slot)
-        connection.send_result(msg["id"], {"success": True, "entry": entry.to_dict()})
+        manager = resolve_lock(hass, msg.get(ATTR_ENTRY_ID))["manager"]
+        result = await manager.async_update(
+            msg["slot"], {"pin_code": msg["pin_code"]}
+        )
+        connection.send_result(msg["id"], result)
 
+    except CodeOperationError as err:
+        connection.send_error(msg["id"], err.code, str(err))
     except Exception as err:
         _LOGGER.error("Error updating PIN: %s", err)
         connection.send_error(msg["id"], "update_failed", str(err))
@@ -388,6 +324,7 @@ async def handle_update_pin(
 @websocket_api.websocket_command(
     {
         vol.Required("type"): WS_TYPE_SUGGEST_SLOTS,
+        vol.Optional(ATTR_ENTRY_ID): str,
         vol.Optional("count", default=5): int,
     }
 )
@@ -399,23 +336,20 @@ async def handle_suggest_slots(
 ) -> None:
     """Handle suggest_slots command."""
     try:
-        data = hass.data[DOMAIN]
-        storage = data["storage"]
-        config = data["config"]
+        allocator = resolve_lock(hass, msg.get(ATTR_ENTRY_ID))["allocator"]
 
         count = msg.get("count", 5)
-        suggestions = []
-
-        for slot in range(config["slot_min"], config["slot_max"] + 1):
-            if len(suggestions) >= count:
-                break
-            if slot in config["reserved_slots"]:
-                continue
-            if not storage.is_slot_occupied(slot):
-                suggestions.append(slot)
 
-        connection.send_result(msg["id"], {"slots": suggestions})
+        connection.send_result(
+            msg["id"],
+            {
+                "slots": allocator.next_free(count),
+                "free_count": allocator.free_count,
+            },
+        )
 
+    except CodeOperationError as err:
+        connection.send_error(msg["id"], err.code, str(err))
     except Exception as err:
         _LOGGER.error("Error suggesting slots: %s", err)
         connection.send_error(msg["id"], "suggest_failed", str(err))
@@ -424,6 +358,7 @@ async def handle_suggest_slots(
 @websocket_api.websocket_command(
     {
         vol.Required("type"): WS_TYPE_CONFIG,
+        vol.Optional(ATTR_ENTRY_ID): str,
     }
 )
 @websocket_api.async_response
@@ -434,17 +369,11 @@ async def handle_config(
 ) -> None:
     """Handle config command - returns current configuration."""
     try:
-        data = hass.data[DOMAIN]
-        config = data["config"]
-
-        connection.send_result(
-            msg["id"],
-            {
-                "auto_expire": config.get(CONF_AUTO_EXPIRE, True),
-                "cleanup_time": config.get(CONF_CLEANUP_TIME, "03:00:00"),
-            },
-        )
+        data = resolve_lock(hass, msg.get(ATTR_ENTRY_ID))
+        connection.send_result(msg["id"], _config(data))
 
+    except CodeOperationError as err:
+        connection.send_error(msg["id"], err.code, str(err))
     except Exception as err:
         _LOGGER.error("Error getting config: %s", err)
         connection.send_error(msg["id"], "config_failed", str(err))
@@ -453,50 +382,384 @@ async def handle_config(
 @websocket_api.websocket_command(
     {
         vol.Required("type"): WS_TYPE_TRANSLATIONS,
+        vol.Optional("hash"): str,
     }
 )
-@websocket_api.async_response
-async def handle_translations(
+@callback
+def handle_translations(
     hass: HomeAssistant,
     connection: websocket_api.ActiveConnection,
     msg: dict[str, Any],
 ) -> None:
-    """Handle translations command - returns panel translations for current language."""
-    import json
-    from pathlib import Path
+    """Handle translations command - returns panel translations for current language.
 
+    When `hash` matches the current translations only the hash is returned,
+    and the client keeps the copy it has.
+    """
     try:
         # Get user's language from hass config
-        language = hass.config.language or "en"
+        translations = get_panel_translations(hass, hass.config.language)
+        connection.send_message(
+            websocket_api.messages.construct_result_message(
+                msg["id"],
+                b"{" + _translations_part(translations, msg.get("hash"), b"hash"),
+            )
+        )
+
+    except Exception as err:
+        _LOGGER.error("Error getting translations: %s", err)
+        connection.send_error(msg["id"], "translations_failed", str(err))
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): WS_TYPE_RECONCILE,
+        vol.Optional(ATTR_ENTRY_ID): str,
+        vol.Optional("slots"): [int],
+        vol.Optional("apply", default=False): bool,
+        vol.Optional("max_age"): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    }
+)
+@websocket_api.async_response
+async def handle_reconcile(
+    hass: HomeAssistant,
+    connection: websocket_api.ActiveConnection,
+    msg: dict[str, Any],
+) -> None:
+    """Handle reconcile command - compare the lock's user table with storage."""
+    try:
+        reconciler = resolve_lock(hass, msg.get(ATTR_ENTRY_ID))["reconciler"]
+        report = await reconciler.async_reconcile(
+            msg.get("slots"), msg["apply"], msg.get("max_age")
+        )
+        connection.send_result(msg["id"], report.as_dict())
 
-        # Path to translations directory
-        translations_dir = Path(__file__).parent / "translations"
+    except CodeOperationError as err:
+        connection.send_error(msg["id"], err.code, str(err))
+    except HomeAssistantError as err:
+        connection.send_error(msg["id"], "lock_unavailable", str(err))
+    except Exception as err:
+        _LOGGER.error("Error reconciling lock: %s", err)
+        connection.send_error(msg["id"], "reconcile_failed", str(err))
 
-        # Try to load the user's language, fallback to English
-        translation_file = translations_dir / f"{language}.json"
 
-        def _load_translations() -> dict:
-            """Load translations from file (runs in executor to avoid blocking)."""
-            file_to_load = translation_file
-            if not file_to_load.exists():
-                file_to_load = translations_dir / "en.json"
-            with open(file_to_load, "r", encoding="utf-8") as f:
-                return json.load(f)
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): WS_TYPE_BATCH,
+        vol.Optional(ATTR_ENTRY_ID): str,
+        vol.Required("operations"): OPERATIONS_SCHEMA,
+    }
+)
+@websocket_api.async_response
+async def handle_batch(
+    hass: HomeAssistant,
+    connection: websocket_api.ActiveConnection,
+    msg: dict[str, Any],
+) -> None:
+    """Handle batch command - apply several operations with one save."""
+    try:
+        manager = resolve_lock(hass, msg.get(ATTR_ENTRY_ID))["manager"]
+        result = await manager.async_bulk_apply(msg["operations"])
+        connection.send_result(msg["id"], result)
 
-        # Run file I/O in executor to avoid blocking the event loop
-        translations = await hass.async_add_executor_job(_load_translations)
+    except CodeOperationError as err:
+        connection.send_error(msg["id"], err.code, str(err))
+    except Exception as err:
+        _LOGGER.error("Error applying batch: %s", err)
+        connection.send_error(msg["id"], "batch_failed", str(err))
 
-        # Extract panel translations
-        panel_translations = translations.get("panel", {})
 
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): WS_TYPE_UPDATE,
+        vol.Optional(ATTR_ENTRY_ID): str,
+        vol.Required("slot"): int,
+        vol.Optional("name"): str,
+        vol.Optional("expiry"): vol.Any(None, str),
+        vol.Optional("code_type"): vol.In([TYPE_PERMANENT, TYPE_GUEST]),
+        vol.Optional("pin_code"): str,
+    }
+)
+@websocket_api.async_response
+async def handle_update(
+    hass: HomeAssistant,
+    connection: websocket_api.ActiveConnection,
+    msg: dict[str, Any],
+) -> None:
+    """Handle update command - change any of name/expiry/type/PIN at once."""
+    try:
+        changes = {
+            key: msg[key] for key in ("name", "expiry", "pin_code") if key in msg
+        }
+        if "code_type" in msg:
+            changes["type"] = msg["code_type"]
+
+        manager = resolve_lock(hass, msg.get(ATTR_ENTRY_ID))["manager"]
+        result = await manager.async_update(msg["slot"], changes)
+        connection.send_result(msg["id"], result)
+
+    except CodeOperationError as err:
+        connection.send_error(msg["id"], err.code, str(err))
+    except Exception as err:
+        _LOGGER.error("Error updating code: %s", err)
+        connection.send_error(msg["id"], "update_failed", str(err))
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): WS_TYPE_LOCKS,
+    }
+)
+@websocket_api.async_response
+async def handle_locks(
+    hass: HomeAssistant,
+    connection: websocket_api.ActiveConnection,
+    msg: dict[str, Any],
+) -> None:
+    """Handle locks command - list the configured locks for the lock picker."""
+    try:
         connection.send_result(
             msg["id"],
             {
-                "language": language,
-                "translations": panel_translations,
+                "locks": [
+                    {**_lock_info(data), "availability": _availability(data)}
+                    for data in get_locks(hass).values()
+                ],
             },
         )
 
     except Exception as err:
-        _LOGGER.error("Error getting translations: %s", err)
-        connection.send_error(msg["id"], "translations_failed", str(err))
+        _LOGGER.error("Error listing locks: %s", err)
+        connection.send_error(msg["id"], "locks_failed", str(err))
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): WS_TYPE_SEARCH,
+        vol.Optional(ATTR_ENTRY_IDS): [str],
+        vol.Required("query"): vol.All(str, vol.Length(min=1)),
+        vol.Optional("limit", default=SEARCH_DEFAULT_LIMIT): vol.All(
+            int, vol.Range(min=1, max=QUERY_MAX_LIMIT)
+        ),
+    }
+)
+@callback
+def handle_search(
+    hass: HomeAssistant,
+    connection: websocket_api.ActiveConnection,
+    msg: dict[str, Any],
+) -> None:
+    """Handle search command - find codes by name on every lock.
+
+    Each result is the code plus its lock's entry_id and title, how it
+    matched (name_prefix, word or word_prefix) and whether it has expired.
+    """
+    try:
+        targets = resolve_locks(hass, msg.get(ATTR_ENTRY_IDS))
+        connection.send_result(
+            msg["id"],
+            {
+                "results": search_locks(
+                    targets, msg["query"], msg["limit"], dt_util.now()
+                ),
+            },
+        )
+    except CodeOperationError as err:
+        connection.send_error(msg["id"], err.code, str(err))
+    except Exception as err:
+        _LOGGER.error("Error searching codes: %s", err)
+        connection.send_error(msg["id"], "search_failed", str(err))
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): WS_TYPE_FAN_OUT,
+        vol.Optional(ATTR_ENTRY_IDS): [str],
+        vol.Required("op"): vol.In([OP_ADD, OP_UPDATE, OP_REMOVE]),
+        vol.Optional(ATTR_GROUP): str,
+        vol.Optional("name"): str,
+        vol.Optional("pin_code"): str,
+        vol.Optional("code_type"): vol.In([TYPE_PERMANENT, TYPE_GUEST]),
+        vol.Optional("expiry"): vol.Any(None, str),
+        vol.Optional("slot"): int,
+        vol.Optional("force", default=False): bool,
+    }
+)
+@websocket_api.async_response
+async def handle_fan_out(
+    hass: HomeAssistant,
+    connection: websocket_api.ActiveConnection,
+    msg: dict[str, Any],
+) -> None:
+    """Handle fan_out command - apply one code to several locks at once.
+
+    A subscription: the result names the group and the locks involved, a
+    `lock_result` event follows as each lock finishes and a `done` event
+    with the summary closes it. Unsubscribing stops the events, not the
+    operation.
+    """
+    op = msg["op"]
+    data = {
+        key: msg[key]
+        for key in ("name", "pin_code", "expiry", "slot", "force")
+        if key in msg
+    }
+    if "code_type" in msg:
+        data["type"] = msg["code_type"]
+    group = msg.get(ATTR_GROUP)
+    if op == OP_ADD and not group:
+        group = new_group_id()
+
+    try:
+        if error := validate_fan_out(op, group, data):
+            raise CodeOperationError("invalid_input", error)
+        targets = resolve_locks(hass, msg.get(ATTR_ENTRY_IDS))
+    except CodeOperationError as err:
+        connection.send_error(msg["id"], err.code, str(err))
+        return
+
+    subscribed = True
+
+    @callback
+    def _async_unsubscribe() -> None:
+        nonlocal subscribed
+        subscribed = False
+
+    @callback
+    def _send_event(event: dict[str, Any]) -> None:
+        if subscribed:
+            connection.send_message(websocket_api.event_message(msg["id"], event))
+
+    @callback
+    def _on_result(result: LockResult) -> None:
+        _send_event({"type": "lock_result", **result.as_dict()})
+
+    connection.subscriptions[msg["id"]] = _async_unsubscribe
+    connection.send_result(
+        msg["id"],
+        {
+            "group": group,
+            "locks": [lock["entry"].entry_id for lock in targets],
+        },
+    )
+
+    try:
+        summary = await async_fan_out(targets, op, data, group, _on_result)
+    except Exception as err:
+        _LOGGER.error("Error fanning out code: %s", err)
+        summary = {"group": group, "op": op, "error": str(err)}
+    _send_event({"type": "done", **summary})
+    # Nothing follows `done`
+    if connection.subscriptions.get(msg["id"]) is _async_unsubscribe:
+        del connection.subscriptions[msg["id"]]
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): WS_TYPE_SUBSCRIBE,
+        vol.Optional(ATTR_ENTRY_ID): str,
+        vol.Optional("since_revision"): vol.All(int, vol.Range(min=0)),
+    }
+)
+@callback
+def handle_subscribe(
+    hass: HomeAssistant,
+    connection: websocket_api.ActiveConnection,
+    msg: dict[str, Any],
+) -> None:
+    """Handle subscribe command - live code changes for one lock.
+
+    A `snapshot` event with every code comes first, then `diff` events with
+    the added, changed and removed entries, `cleanup` reports and
+    `availability` changes. Diffs carry an increasing revision.
+
+    A client that already has the codes, e.g. from nimlykoder/bootstrap,
+    passes their revision as `since_revision` and instead gets a diff of
+    what changed since, nothing if nothing did, or the snapshot if the
+    revision is from before a restart.
+    """
+    try:
+        feed = resolve_lock(hass, msg.get(ATTR_ENTRY_ID))["feed"]
+    except CodeOperationError as err:
+        connection.send_error(msg["id"], err.code, str(err))
+        return
+
+    @callback
+    def _forward(message: dict[str, Any]) -> None:
+        connection.send_message(websocket_api.event_message(msg["id"], message))
+
+    connection.subscriptions[msg["id"]] = feed.async_subscribe(_forward)
+    connection.send_result(msg["id"])
+    if (catch_up := feed.catch_up(msg.get("since_revision"))) is not None:
+        _forward(catch_up)
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): WS_TYPE_BOOTSTRAP,
+        vol.Optional(ATTR_ENTRY_ID): str,
+        vol.Optional("count", default=1): int,
+        vol.Optional("translations_hash"): str,
+    }
+)
+@callback
+def handle_bootstrap(
+    hass: HomeAssistant,
+    connection: websocket_api.ActiveConnection,
+    msg: dict[str, Any],
+) -> None:
+    """Handle bootstrap command - everything the panel needs to open.
+
+    Returns the locks, the codes, config and slot suggestions of one lock,
+    the panel translations and the feed revision the codes are at. The code
+    list and translations are spliced in already serialized; translations
+    are left out when `translations_hash` shows the client has them. A lock
+    the browser remembered that no longer exists falls back to the first lock.
+    """
+    try:
+        locks = get_locks(hass)
+        data = locks.get(msg.get(ATTR_ENTRY_ID, "")) or next(
+            iter(locks.values()), None
+        )
+        if data is None:
+            raise CodeOperationError("lock_not_found", "No lock is configured")
+
+        translations = get_panel_translations(hass, hass.config.language)
+        storage = data["storage"]
+        allocator = data["allocator"]
+        rest = json_bytes(
+            {
+                "revision": data["feed"].revision,
+                "entry_id": data["entry"].entry_id,
+                "locks": [_lock_info(lock) for lock in locks.values()],
+                "config": _config(data),
+                "expired_count": storage.expired_count(dt_util.now()),
+                "suggested_slots": allocator.next_free(msg["count"]),
+                "free_count": allocator.free_count,
+            }
+        )
+        connection.send_message(
+            websocket_api.messages.construct_result_message(
+                msg["id"],
+                b"".join(
+                    (
+                        b'{"codes":',
+                        storage.list_json(),
+                        b",",
+                        rest[1:-1],
+                        b",",
+                        _translations_part(
+                            translations,
+                            msg.get("translations_hash"),
+                            b"translations_hash",
+                        ),
+                    )
+                ),
+            )
+        )
+
+    except CodeOperationError as err:
+        connection.send_error(msg["id"], err.code, str(err))
+    except Exception as err:
+        _LOGGER.error("Error bootstrapping panel: %s", err)
+        connection.send_error(msg["id"], "bootstrap_failed", str(err))
@@ -0,0 +1,120 @@
+"""Shared fixtures for the Nimlykoder tests."""
+from __future__ import annotations
+
+import asyncio
+import copy
+import inspect
+from pathlib import Path
+import sys
+from typing import Any
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem: pytest.Function) -> bool | None:
+    """Run coroutine tests in a fresh event loop."""
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    kwargs = {
+        name: pyfuncitem.funcargs[name]
+        for name in pyfuncitem._fixtureinfo.argnames
+    }
+    asyncio.run(pyfuncitem.obj(**kwargs))
+    return True
+
+
+class FakeBus:
+    """Records fired events."""
+
+    def __init__(self) -> None:
+        self.events: list[tuple[str, dict[str, Any]]] = []
+
+    def async_fire(self, event_type: str, event_data: dict | None = None) -> None:
+        self.events.append((event_type, event_data or {}))
+
+    def async_listen(self, event_type: str, listener: Any) -> Any:
+        return lambda: None
+
+
+class FakeHass:
+    """The parts of HomeAssistant the integration modules use."""
+
+    def __init__(self) -> None:
+        self.data: dict[str, Any] = {}
+        self.bus = FakeBus()
+        self.tasks: set[asyncio.Task] = set()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return asyncio.get_running_loop()
+
+    def async_create_task(self, target: Any, name: str | None = None) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(target, name=name)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def async_create_background_task(
+        self, target: Any, name: str, eager_start: bool = False
+    ) -> asyncio.Task:
+        return self.async_create_task(target, name)
+
+    async def async_block_till_done(self) -> None:
+        """Wait for every task created so far, and the ones they create."""
+        while self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+class MemoryStore:
+    """In-memory stand-in for helpers.storage.Store.
+
+    Saved data lives in `disk`, keyed by storage key, so a second instance
+    with the same key sees what the first wrote, as after a restart. A
+    delayed save only reaches `disk` on `async_fire_delayed`; dropping it
+    simulates a crash before the write.
+    """
+
+    disk: dict[str, Any] = {}
+
+    def __init__(self, hass: Any, version: int, key: str, **kwargs: Any) -> None:
+        self.key = key
+        self.pending: Any = None
+
+    async def async_load(self) -> Any:
+        return copy.deepcopy(self.disk.get(self.key))
+
+    async def async_save(self, data: Any) -> None:
+        self.pending = None
+        self.disk[self.key] = copy.deepcopy(data)
+
+    def async_delay_save(self, data_func: Any, delay: float = 0) -> None:
+        self.pending = data_func
+
+    async def async_fire_delayed(self) -> None:
+        if self.pending is not None:
+            await self.async_save(self.pending())
+
+    async def async_remove(self) -> None:
+        self.pending = None
+        self.disk.pop(self.key, None)
+
+
+@pytest.fixture
+def hass() -> FakeHass:
+    """Return a fake Home Assistant instance."""
+    return FakeHass()
+
+
+@pytest.fixture(autouse=True)
+def memory_store(monkeypatch: pytest.MonkeyPatch) -> dict[str, Any]:
+    """Back every Store with memory; returns the saved data by key."""
+    from custom_components.nimlykoder import journal, outbox, storage
+
+    disk: dict[str, Any] = {}
+    monkeypatch.setattr(MemoryStore, "disk", disk)
+    for module in (storage, journal, outbox):
+        monkeypatch.setattr(module, "Store", MemoryStore)
+    return disk
@@ -0,0 +1,103 @@
+"""Tests for the slot allocator."""
+from __future__ import annotations
+
+from custom_components.nimlykoder.allocator import SlotAllocator
+from custom_components.nimlykoder.const import TYPE_PERMANENT
+from custom_components.nimlykoder.storage import CodeEntry
+
+
+def _entry(slot: int) -> CodeEntry:
+    return CodeEntry(
+        slot=slot,
+        name=f"Code {slot}",
+        type=TYPE_PERMANENT,
+        expiry=None,
+        created="2024-01-01T00:00:00",
+        updated="2024-01-01T00:00:00",
+    )
+
+
+def test_free_slots_skip_reserved_and_occupied() -> None:
+    """Reserved and occupied slots are never handed out automatically."""
+    allocator = SlotAllocator(1, 6, reserved_slots=[1, 2], occupied_slots=[4])
+
+    assert allocator.next_free(10) == [3, 5, 6]
+    assert allocator.next_free(1) == [3]
+    assert allocator.free_count == 3
+    assert not allocator.in_range(7)
+
+
+def test_reserve_first_free_holds_until_release() -> None:
+    """A reserved slot is not given out again until it is released."""
+    allocator = SlotAllocator(1, 3, reserved_slots=[], occupied_slots=[])
+
+    assert allocator.reserve_first_free() == 1
+    assert allocator.reserve_first_free() == 2
+    assert allocator.is_held(1)
+
+    allocator.release(1)
+    assert not allocator.is_held(1)
+    assert allocator.next_free(3) == [1, 3]
+
+
+def test_reserve_free_is_all_or_nothing() -> None:
+    """reserve_free takes no slots when too few are free."""
+    allocator = SlotAllocator(1, 4, reserved_slots=[], occupied_slots=[2])
+
+    assert allocator.reserve_free(4) is None
+    assert allocator.free_count == 3
+    assert allocator.reserve_free(2) == [1, 3]
+    assert allocator.next_free(5) == [4]
+
+
+def test_reserve_specific_slot() -> None:
+    """An explicit reservation fails only while another request holds it."""
+    allocator = SlotAllocator(1, 4, reserved_slots=[2], occupied_slots=[3])
+
+    # Reserved and occupied slots can still be claimed explicitly
+    assert allocator.reserve(2)
+    assert allocator.reserve(3)
+    assert not allocator.reserve(3)
+
+    allocator.release(2)
+    allocator.release(3)
+    # Neither returns to the pool: one is reserved, the other occupied
+    assert allocator.next_free(5) == [1, 4]
+    assert allocator.reserve(3)
+
+
+def test_storage_changes_update_occupancy() -> None:
+    """Storage adds take a slot out of the pool and removals put it back."""
+    allocator = SlotAllocator(1, 3, reserved_slots=[], occupied_slots=[])
+
+    allocator.async_storage_changed(2, None, _entry(2))
+    assert allocator.next_free(3) == [1, 3]
+
+    # A held slot only returns to the pool once released
+    assert allocator.reserve(2)
+    allocator.async_storage_changed(2, _entry(2), None)
+    assert allocator.next_free(3) == [1, 3]
+    allocator.release(2)
+    assert allocator.next_free(3) == [1, 2, 3]
+
+    # Slots outside the range never enter the pool
+    allocator.async_storage_changed(9, _entry(9), None)
+    assert allocator.next_free(5) == [1, 2, 3]
+
+
+def test_slots_taken_and_returned_out_of_order() -> None:
+    """Slots reserved explicitly in between still come out lowest first."""
+    allocator = SlotAllocator(1, 6, reserved_slots=[], occupied_slots=[])
+
+    assert allocator.reserve(1)
+    assert allocator.reserve(3)
+    assert allocator.next_free(2) == [2, 4]
+    assert allocator.reserve_first_free() == 2
+
+    allocator.release(3)
+    allocator.release(1)
+    assert allocator.reserve(4)
+    allocator.release(4)
+    assert allocator.next_free(10) == [1, 3, 4, 5, 6]
+    assert allocator.reserve_free(3) == [1, 3, 4]
+    assert allocator.free_count == 2
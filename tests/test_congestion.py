@@ -0,0 +1,76 @@
+"""Tests for the adaptive in-flight limit."""
+from __future__ import annotations
+
+from custom_components.nimlykoder.adapters.command_queue import CommandQueue
+from custom_components.nimlykoder.adapters.congestion import AimdController
+from custom_components.nimlykoder.const import DEFAULT_MAX_IN_FLIGHT
+
+
+def test_default_ceiling_allows_growth() -> None:
+    """With the default ceiling the limit can grow past one command."""
+    controller = AimdController("lock", DEFAULT_MAX_IN_FLIGHT, ack_timeout=10)
+    assert DEFAULT_MAX_IN_FLIGHT > 1
+    assert controller.allowed == 1
+
+    for _ in range(20):
+        controller.on_confirmed(0.5)
+
+    assert controller.allowed == DEFAULT_MAX_IN_FLIGHT
+    assert controller.as_dict()["increases"] > 0
+
+
+def test_additive_increase() -> None:
+    """Each fast confirmation adds 1/limit."""
+    controller = AimdController("lock", 5, ack_timeout=10)
+
+    # 1 -> 2 -> 2.5 -> 2.9 -> 3.24
+    controller.on_confirmed(1.0)
+    assert controller.allowed == 2
+    controller.on_confirmed(1.0)
+    controller.on_confirmed(1.0)
+    assert controller.allowed == 2
+    controller.on_confirmed(1.0)
+    assert controller.allowed == 3
+
+
+def test_multiplicative_decrease() -> None:
+    """Timeouts halve the limit, slow confirmations trim it, never below one."""
+    controller = AimdController("lock", 8, ack_timeout=10)
+    for _ in range(40):
+        controller.on_confirmed(1.0)
+    assert controller.allowed == 8
+
+    controller.on_timeout()
+    assert controller.allowed == 4
+    controller.on_confirmed(6.0)
+    assert controller.allowed == 3
+    # Neither fast nor slow: unchanged
+    controller.on_confirmed(4.0)
+    assert controller.allowed == 3
+
+    for _ in range(10):
+        controller.on_timeout()
+    assert controller.allowed == 1
+    assert controller.as_dict()["decreases"] >= 3
+
+
+def test_percentiles() -> None:
+    """p50/p95 come from the recent latencies."""
+    controller = AimdController("lock", 3, ack_timeout=10)
+    assert controller.percentiles() == {"p50": None, "p95": None}
+
+    for latency in range(1, 21):
+        controller.on_confirmed(float(latency))
+
+    assert controller.percentiles() == {"p50": 10.0, "p95": 19.0}
+
+
+def test_queue_capacity_follows_controller(hass) -> None:
+    """The queue allows what the controller allows, up to its ceiling."""
+    controller = AimdController("lock", 3, ack_timeout=10)
+    queue = CommandQueue(hass, "lock", None, 0, 3, controller)
+    assert queue.capacity == 1
+
+    for _ in range(20):
+        controller.on_confirmed(0.1)
+    assert queue.capacity == 3
@@ -0,0 +1,47 @@
+"""Tests for the live code feed."""
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+from custom_components.nimlykoder.const import TYPE_PERMANENT
+from custom_components.nimlykoder.feed import CodeFeed
+from custom_components.nimlykoder.storage import NimlykoderStorage
+
+
+async def _feed(hass) -> CodeFeed:
+    storage = NimlykoderStorage(hass, save_delay=0, key="test_codes")
+    await storage.async_load()
+    adapter = SimpleNamespace(availability_state=lambda: {"available": True})
+    return CodeFeed(hass, "entry", storage, adapter, SimpleNamespace(depth=0))
+
+
+async def test_catch_up_sends_only_what_changed(hass) -> None:
+    """A subscriber with the codes at a revision gets the changes since then."""
+    feed = await _feed(hass)
+    storage = feed._storage
+    await storage.add(1, "Alice", TYPE_PERMANENT)
+    await storage.add(2, "Bob", TYPE_PERMANENT)
+    bootstrapped = feed.revision
+
+    assert feed.catch_up(bootstrapped) is None
+
+    await storage.update_name(1, "Alicia")
+    await storage.remove(2)
+    await storage.add(3, "Carol", TYPE_PERMANENT)
+    message = feed.catch_up(bootstrapped)
+
+    assert message["type"] == "diff"
+    assert message["revision"] == feed.revision
+    assert [code["slot"] for code in message["changed"]] == [1, 3]
+    assert message["removed"] == [2]
+
+
+async def test_catch_up_falls_back_to_snapshot(hass) -> None:
+    """Without a usable revision the subscriber gets every code."""
+    feed = await _feed(hass)
+    await feed._storage.add(1, "Alice", TYPE_PERMANENT)
+
+    assert feed.catch_up(None)["type"] == "snapshot"
+    # A revision from before the last restart
+    assert feed.catch_up(1)["type"] == "snapshot"
+    assert feed.catch_up(feed.revision + 1)["type"] == "snapshot"
@@ -0,0 +1,61 @@
+"""Tests for the intent journal."""
+from __future__ import annotations
+
+from custom_components.nimlykoder.const import TYPE_PERMANENT
+from custom_components.nimlykoder.journal import (
+    INTENT_COMMITTED,
+    INTENT_PENDING,
+    IntentJournal,
+)
+from custom_components.nimlykoder.storage import NimlykoderStorage
+
+
+async def _load(hass) -> tuple[NimlykoderStorage, IntentJournal]:
+    storage = NimlykoderStorage(hass, save_delay=0, key="test_codes")
+    await storage.async_load()
+    journal = IntentJournal(hass, storage, key="test_journal")
+    await journal.async_load()
+    return storage, journal
+
+
+async def test_storage_records_done_intents_above_the_watermark(hass) -> None:
+    """A finished intent behind an open one is not replayed after a crash."""
+    storage, journal = await _load(hass)
+    first, second = await journal.async_begin(
+        [("add", 1, {"name": "A"}, False), ("add", 2, {"name": "B"}, False)]
+    )
+    journal.async_commit([second])
+    async with storage.async_batch():
+        await storage.add(2, "B", TYPE_PERMANENT)
+        journal.async_done([second])
+
+    assert journal.applied() == (first.seq - 1, [second.seq])
+    # The journal's delayed write never happens; restart from disk
+    storage, journal = await _load(hass)
+
+    assert storage.applied_seq == first.seq - 1
+    assert storage.applied_above == {second.seq}
+    unapplied = journal.unapplied()
+    assert [intent.seq for intent in unapplied] == [first.seq]
+    assert unapplied[0].state == INTENT_PENDING
+
+
+async def test_done_intents_are_pruned_once_stored(hass, memory_store) -> None:
+    """The journal drops done intents once storage on disk reflects them."""
+    storage, journal = await _load(hass)
+    await storage.add(3, "C", TYPE_PERMANENT)
+    (intent,) = await journal.async_begin([("remove", 3, {}, True)])
+    journal.async_commit([intent])
+    assert journal.unapplied()[0].state == INTENT_COMMITTED
+
+    async with storage.async_batch():
+        await storage.remove(3)
+        journal.async_done([intent])
+    await journal.async_flush()
+
+    assert memory_store["test_journal"]["intents"] == []
+    assert journal.unapplied() == []
+    # Sequence numbers keep increasing across a restart
+    storage, journal = await _load(hass)
+    (later,) = await journal.async_begin([("remove", 4, {}, True)])
+    assert later.seq > intent.seq
@@ -0,0 +1,310 @@
+"""Tests for the code manager."""
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from custom_components.nimlykoder.adapters.mqtt_z2m import CommandResult
+from custom_components.nimlykoder.allocator import SlotAllocator
+from custom_components.nimlykoder.const import (
+    CONF_OVERWRITE_PROTECTION,
+    CONF_SLOT_MAX,
+    CONF_SLOT_MIN,
+    TYPE_PERMANENT,
+)
+from custom_components.nimlykoder.journal import IntentJournal
+from custom_components.nimlykoder.manager import CodeManager, CodeOperationError
+from custom_components.nimlykoder.storage import NimlykoderStorage
+
+CONFIG = {CONF_SLOT_MIN: 1, CONF_SLOT_MAX: 10, CONF_OVERWRITE_PROTECTION: True}
+
+
+class FakeAdapter:
+    """Records lock commands and confirms them unless told otherwise."""
+
+    def __init__(self) -> None:
+        self.commands: list[tuple[str, int]] = []
+        self.fail: set[tuple[str, int]] = set()
+        self.confirmed = True
+
+    async def add_code(self, slot: int, pin_code: str) -> CommandResult:
+        return self._command("add", slot)
+
+    async def remove_code(self, slot: int) -> CommandResult:
+        return self._command("remove", slot)
+
+    def _command(self, action: str, slot: int) -> CommandResult:
+        self.commands.append((action, slot))
+        if (action, slot) in self.fail:
+            raise RuntimeError("publish failed")
+        return CommandResult(confirmed=self.confirmed, latency=0.1)
+
+
+def _add_op(name: str, pin_code: str) -> dict:
+    return {
+        "op": "add",
+        "name": name,
+        "pin_code": pin_code,
+        "type": TYPE_PERMANENT,
+        "force": False,
+    }
+
+
+@pytest.fixture
+def adapter() -> FakeAdapter:
+    """Return a fake lock adapter."""
+    return FakeAdapter()
+
+
+async def _manager(hass, adapter: FakeAdapter) -> CodeManager:
+    storage = NimlykoderStorage(hass, save_delay=0, key="test_codes")
+    await storage.async_load()
+    journal = IntentJournal(hass, storage, key="test_journal")
+    await journal.async_load()
+    allocator = SlotAllocator(1, 10, [], storage.occupied_slots())
+    storage.async_add_listener(allocator.async_storage_changed)
+    return CodeManager(hass, storage, allocator, adapter, journal, CONFIG)
+
+
+@pytest.mark.parametrize("name", ["", "   ", None])
+async def test_add_rejects_empty_name(hass, adapter: FakeAdapter, name) -> None:
+    """An add without a name is rejected before anything is sent."""
+    manager = await _manager(hass, adapter)
+
+    with pytest.raises(CodeOperationError) as err:
+        await manager.async_add(name, "123456", TYPE_PERMANENT)
+
+    assert err.value.code == "invalid_input"
+    assert adapter.commands == []
+    assert manager.allocator.free_count == 10
+
+
+async def test_add_stores_trimmed_name(hass, adapter: FakeAdapter) -> None:
+    """The stored name has surrounding whitespace removed."""
+    manager = await _manager(hass, adapter)
+
+    result = await manager.async_add("  Alice ", "123456", TYPE_PERMANENT)
+
+    assert result["entry"]["name"] == "Alice"
+    assert adapter.commands == [("add", 1)]
+
+
+async def test_field_updates_wait_for_in_flight_commands(
+    hass, adapter: FakeAdapter
+) -> None:
+    """Name and expiry updates are refused while another request holds the slot."""
+    manager = await _manager(hass, adapter)
+    await manager.async_add("Alice", "123456", TYPE_PERMANENT, slot=2)
+
+    assert manager.allocator.reserve(2)
+    with pytest.raises(CodeOperationError) as err:
+        await manager.async_update_name(2, "Bob")
+    assert err.value.code == "slot_busy"
+    with pytest.raises(CodeOperationError) as err:
+        await manager.async_update_expiry(2, None)
+    assert err.value.code == "slot_busy"
+    manager.allocator.release(2)
+
+    assert (await manager.async_update_name(2, "Bob"))["entry"]["name"] == "Bob"
+    assert not manager.allocator.is_held(2)
+    assert manager.allocator.next_free(1) == [1]
+
+    with pytest.raises(CodeOperationError) as err:
+        await manager.async_update_expiry(3, None)
+    assert err.value.code == "not_found"
+
+
+async def test_remove_unknown_skips_held_and_stored_slots(
+    hass, adapter: FakeAdapter
+) -> None:
+    """Only slots no request holds and storage does not know are cleared."""
+    manager = await _manager(hass, adapter)
+    await manager.async_add("Alice", "123456", TYPE_PERMANENT, slot=2)
+    adapter.commands.clear()
+    adapter.fail.add(("remove", 5))
+
+    # Slot 3 is reserved by an add that has not reached storage yet
+    assert manager.allocator.reserve(3)
+    report = await manager.async_remove_unknown([2, 3, 4, 5])
+
+    assert report == {"removed": [4], "failed": [5], "skipped": [2, 3]}
+    assert sorted(adapter.commands) == [("remove", 4), ("remove", 5)]
+    assert manager.allocator.is_held(3)
+    assert not manager.allocator.is_held(4)
+    # Journaled like any removal until storage records it
+    assert [intent.slot for intent in manager.journal.unapplied()] == [4]
+
+
+async def test_bulk_rolls_back_rejected_adds_outside_the_mutex(
+    hass, adapter: FakeAdapter, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """An add storage rejects is removed from the lock after storage is released."""
+    manager = await _manager(hass, adapter)
+    add = manager.storage.add
+
+    async def failing_add(slot, *args, **kwargs):
+        if slot == 2:
+            raise RuntimeError("disk full")
+        return await add(slot, *args, **kwargs)
+
+    monkeypatch.setattr(manager.storage, "add", failing_add)
+    held = []
+    remove_code = adapter.remove_code
+
+    async def observed_remove(slot: int) -> CommandResult:
+        held.append((manager._mutex.locked(), manager.storage._batch_depth))
+        return await remove_code(slot)
+
+    monkeypatch.setattr(adapter, "remove_code", observed_remove)
+    result = await manager.async_bulk_apply(
+        [_add_op("A", "111111"), _add_op("B", "222222")]
+    )
+
+    assert [item["success"] for item in result["results"]] == [True, False]
+    assert adapter.commands == [("add", 1), ("add", 2), ("remove", 2)]
+    assert held == [(False, 0)]
+    assert manager.storage.occupied_slots() == [1]
+    assert not manager.allocator.is_held(2)
+
+
+async def test_bulk_aborts_failed_intents_once(
+    hass, adapter: FakeAdapter, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Failed changes are aborted in one pass; stranded adds stay journaled."""
+    manager = await _manager(hass, adapter)
+    add = manager.storage.add
+
+    async def failing_add(slot, *args, **kwargs):
+        if slot == 3:
+            raise RuntimeError("disk full")
+        return await add(slot, *args, **kwargs)
+
+    monkeypatch.setattr(manager.storage, "add", failing_add)
+    adapter.fail = {("add", 2), ("remove", 3)}
+    aborted = []
+    abort = manager.journal.async_abort
+
+    def record_abort(intents):
+        aborted.append(sorted(intent.slot for intent in intents))
+        abort(intents)
+
+    monkeypatch.setattr(manager.journal, "async_abort", record_abort)
+    result = await manager.async_bulk_apply(
+        [_add_op("A", "111111"), _add_op("B", "222222"), _add_op("C", "333333")]
+    )
+
+    assert [item["success"] for item in result["results"]] == [True, False, False]
+    # Slot 2 never reached the lock; slot 3 is on it and could not be removed
+    assert aborted == [[2]]
+    assert [intent.slot for intent in manager.journal.unapplied()] == [3]
+
+
+async def _restart(hass, adapter: FakeAdapter) -> CodeManager:
+    """Load a fresh manager from what is on disk, as after a crash."""
+    adapter.commands.clear()
+    return await _manager(hass, adapter)
+
+
+async def test_unconfirmed_command_is_not_committed(
+    hass, adapter: FakeAdapter, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Only a confirmed command commits its intent."""
+    manager = await _manager(hass, adapter)
+    committed = []
+    monkeypatch.setattr(
+        manager.journal, "async_commit", lambda intents: committed.extend(intents)
+    )
+
+    adapter.confirmed = False
+    await manager.async_add("Alice", "123456", TYPE_PERMANENT, slot=1)
+    assert committed == []
+
+    adapter.confirmed = True
+    await manager.async_add("Bob", "654321", TYPE_PERMANENT, slot=2)
+    assert [intent.slot for intent in committed] == [2]
+
+
+async def test_recovery_keeps_finished_add_behind_open_intent(
+    hass, adapter: FakeAdapter
+) -> None:
+    """A stored add is neither rolled back nor replayed after a crash."""
+    manager = await _manager(hass, adapter)
+    # An older change is still waiting on the lock when the crash happens
+    (open_intent,) = await manager.journal.async_begin(
+        [("add", 5, {"name": "Open", "type": TYPE_PERMANENT, "expiry": None}, False)]
+    )
+    adapter.confirmed = False
+    await manager.async_add("Alice", "123456", TYPE_PERMANENT, slot=2)
+
+    manager = await _restart(hass, adapter)
+    report = await manager.async_recover()
+
+    assert report == {"replayed": [], "rolled_back": [5], "uncertain": []}
+    assert adapter.commands == [("remove", 5)]
+    assert manager.storage.get(2).name == "Alice"
+    assert manager.journal.depth == 0
+    assert open_intent.seq < manager.journal.metrics()["next_seq"]
+
+
+async def test_recovery_replays_committed_and_finishes_removals(
+    hass, adapter: FakeAdapter
+) -> None:
+    """Confirmed changes reach storage; interrupted removals are redone."""
+    manager = await _manager(hass, adapter)
+    await manager.async_add("Bob", "123456", TYPE_PERMANENT, slot=3)
+    added, removed = await manager.journal.async_begin(
+        [
+            ("add", 4, {"name": "Carol", "type": TYPE_PERMANENT, "expiry": None}, False),
+            ("remove", 3, {}, True),
+        ]
+    )
+    manager.journal.async_commit([added])
+    await manager.journal.async_flush()
+
+    manager = await _restart(hass, adapter)
+    report = await manager.async_recover()
+
+    assert report == {"replayed": [4, 3], "rolled_back": [], "uncertain": []}
+    assert adapter.commands == [("remove", 3)]
+    assert manager.storage.occupied_slots() == [4]
+    assert manager.journal.unapplied() == []
+
+
+class FakeEntry:
+    """Runs background tasks like a config entry."""
+
+    entry_id = "entry"
+
+    def async_create_background_task(self, hass, target, name):
+        return hass.async_create_background_task(target, name)
+
+
+async def test_recovery_runs_in_background_and_holds_operations(
+    hass, adapter: FakeAdapter, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Operations started during recovery wait until it has finished."""
+    manager = await _manager(hass, adapter)
+    await manager.async_add("Bob", "123456", TYPE_PERMANENT, slot=3)
+    await manager.journal.async_begin([("remove", 3, {}, True)])
+    manager = await _restart(hass, adapter)
+
+    release = asyncio.Event()
+    remove_code = adapter.remove_code
+
+    async def slow_remove(slot: int) -> CommandResult:
+        await release.wait()
+        return await remove_code(slot)
+
+    monkeypatch.setattr(adapter, "remove_code", slow_remove)
+    manager.async_start_recovery(FakeEntry())
+    rename = asyncio.ensure_future(manager.async_update_name(3, "Robert"))
+    await asyncio.sleep(0.01)
+    assert not rename.done()
+
+    release.set()
+    with pytest.raises(CodeOperationError) as err:
+        await rename
+    # Recovery finished the removal first
+    assert err.value.code == "not_found"
+    assert manager.storage.get(3) is None
@@ -0,0 +1,216 @@
+"""Tests for the Zigbee2MQTT adapter against a fake MQTT integration."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+import json
+import sys
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from custom_components.nimlykoder.adapters import mqtt_z2m
+from custom_components.nimlykoder.adapters.mqtt_z2m import (
+    MqttZ2mAdapter,
+    parse_confirmations,
+    parse_user_statuses,
+)
+
+TOPIC = "zigbee2mqtt/front_door"
+
+
+class FakeMqtt:
+    """The parts of the MQTT integration the adapter uses.
+
+    `responder` is called for every publish and may answer it with
+    `state()`, as the lock would.
+    """
+
+    DOMAIN = "mqtt"
+
+    def __init__(self) -> None:
+        self.subscriptions: dict[str, Callable[[Any], None]] = {}
+        self.published: list[tuple[str, dict[str, Any]]] = []
+        self.responder: Callable[[str, dict[str, Any]], None] | None = None
+        # Number of waits for the client that report it is not ready yet
+        self.not_ready = 0
+
+    async def async_wait_for_mqtt_client(self, hass: Any) -> bool:
+        if self.not_ready:
+            self.not_ready -= 1
+            return False
+        return True
+
+    async def async_subscribe(
+        self, hass: Any, topic: str, msg_callback: Callable[[Any], None], qos: int = 0
+    ) -> Callable[[], None]:
+        self.subscriptions[topic] = msg_callback
+        return lambda: self.subscriptions.pop(topic, None)
+
+    def async_subscribe_connection_status(
+        self, hass: Any, connection_status_callback: Callable[[bool], None]
+    ) -> Callable[[], None]:
+        return lambda: None
+
+    def is_connected(self, hass: Any) -> bool:
+        return True
+
+    async def async_publish(
+        self, hass: Any, topic: str, payload: str, qos: int = 0, retain: bool = False
+    ) -> None:
+        data = json.loads(payload)
+        self.published.append((topic, data))
+        if self.responder is not None:
+            asyncio.get_running_loop().call_soon(self.responder, topic, data)
+
+    def state(self, payload: dict[str, Any]) -> None:
+        """Deliver a message on the lock's state topic."""
+        self.subscriptions[TOPIC](SimpleNamespace(payload=json.dumps(payload)))
+
+
+def _users(**statuses: str) -> dict[str, Any]:
+    return {"users": {slot: {"status": status} for slot, status in statuses.items()}}
+
+
+@pytest.fixture
+def mqtt(monkeypatch: pytest.MonkeyPatch) -> FakeMqtt:
+    """Install a fake MQTT integration."""
+    import homeassistant.components
+
+    fake = FakeMqtt()
+    monkeypatch.setitem(sys.modules, "homeassistant.components.mqtt", fake)
+    monkeypatch.setattr(homeassistant.components, "mqtt", fake, raising=False)
+    monkeypatch.setattr(mqtt_z2m, "READ_SETTLE", 0.05)
+    monkeypatch.setattr(mqtt_z2m, "MQTT_RETRY_INTERVAL", 0.01)
+    return fake
+
+
+async def _adapter(hass, ack_timeout: float = 0.2) -> MqttZ2mAdapter:
+    adapter = MqttZ2mAdapter(hass, TOPIC, command_spacing=0, ack_timeout=ack_timeout)
+    await adapter.async_start()
+    await hass.async_block_till_done()
+    assert adapter.can_read
+    return adapter
+
+
+def test_parse_confirmations_only_reports_events() -> None:
+    """The cached users map is never a confirmation by itself."""
+    assert parse_confirmations({"action": "pin_code_added", "action_user": 4}) == [
+        (4, "add")
+    ]
+    assert parse_confirmations({"action": "pin_code_deleted", "action_user": "7"}) == [
+        (7, "remove")
+    ]
+    assert parse_confirmations(_users(**{"4": "enabled"})) == []
+    assert parse_confirmations({"action": "pin_code_added"}) == []
+    assert parse_confirmations({"action": "unlock", "action_user": 4}) == []
+
+
+def test_parse_user_statuses_skips_malformed_entries() -> None:
+    """Only slots with a status string are reported."""
+    payload = {"users": {"1": {"status": "enabled"}, "x": {"status": "enabled"}, "2": {}}}
+    assert parse_user_statuses(payload) == {1: "enabled"}
+
+
+async def test_status_change_confirms_add(hass, mqtt: FakeMqtt) -> None:
+    """A users entry that changed after publishing confirms the command."""
+    adapter = await _adapter(hass)
+    mqtt.state(_users(**{"3": "available"}))
+    mqtt.responder = lambda topic, data: mqtt.state(_users(**{"3": "enabled"}))
+
+    result = await adapter.add_code(3, "1234")
+
+    assert result.confirmed
+    assert mqtt.published[0][0] == f"{TOPIC}/set"
+    adapter.async_stop()
+
+
+async def test_action_event_confirms_add(hass, mqtt: FakeMqtt) -> None:
+    """A programming event confirms even when the cached status is unchanged."""
+    adapter = await _adapter(hass)
+    mqtt.state(_users(**{"3": "enabled"}))
+    mqtt.responder = lambda topic, data: mqtt.state(
+        {"action": "pin_code_added", "action_user": 3, **_users(**{"3": "enabled"})}
+    )
+
+    assert (await adapter.add_code(3, "1234")).confirmed
+    adapter.async_stop()
+
+
+async def test_stale_users_map_does_not_confirm(hass, mqtt: FakeMqtt) -> None:
+    """A republished users map with the old status times out instead."""
+    adapter = await _adapter(hass)
+    mqtt.state(_users(**{"3": "enabled"}))
+    # Z2M republishes its cache (e.g. on a battery report) after the remove
+    mqtt.responder = lambda topic, data: mqtt.state(
+        {"battery": 80, **_users(**{"3": "enabled"})}
+    )
+
+    result = await adapter.remove_code(3)
+
+    assert not result.confirmed
+    assert result.timed_out
+    adapter.async_stop()
+
+
+async def test_no_answer_times_out(hass, mqtt: FakeMqtt) -> None:
+    """Without any reply the command reports a timeout."""
+    adapter = await _adapter(hass, ack_timeout=0.05)
+
+    result = await adapter.add_code(5, "9876")
+
+    assert not result.confirmed
+    assert result.timed_out
+    assert adapter.metrics()["acks"]["timeouts"] == 1
+    assert adapter.metrics()["acks"]["awaiting"] == 0
+    adapter.async_stop()
+
+
+async def test_read_waits_for_fresh_status(hass, mqtt: FakeMqtt) -> None:
+    """A read is answered by the reply, not the cached copy before it."""
+    adapter = await _adapter(hass)
+    mqtt.state(_users(**{"8": "enabled"}))
+
+    def reply(topic: str, data: dict[str, Any]) -> None:
+        # The cached copy first, then the lock's answer to the get
+        mqtt.state(_users(**{"8": "enabled"}))
+        asyncio.get_running_loop().call_later(
+            0.01, mqtt.state, _users(**{"8": "available"})
+        )
+
+    mqtt.responder = reply
+    result = await adapter.async_read_slot(8)
+
+    assert mqtt.published[0][0] == f"{TOPIC}/get"
+    assert result.status == "available"
+    adapter.async_stop()
+
+
+async def test_read_settles_on_unchanged_status(hass, mqtt: FakeMqtt) -> None:
+    """An unchanged status answers a read once the settle window passes."""
+    adapter = await _adapter(hass)
+    mqtt.state(_users(**{"8": "enabled"}))
+    mqtt.responder = lambda topic, data: mqtt.state(_users(**{"8": "enabled"}))
+
+    result = await adapter.async_read_slot(8)
+
+    assert result.confirmed
+    assert result.status == "enabled"
+    adapter.async_stop()
+
+
+async def test_start_retries_until_mqtt_is_ready(hass, mqtt: FakeMqtt) -> None:
+    """Subscriptions are made once MQTT comes up, not given up on."""
+    mqtt.not_ready = 2
+    adapter = MqttZ2mAdapter(hass, TOPIC, command_spacing=0, ack_timeout=0.2)
+
+    await adapter.async_start()
+    assert not adapter.can_read
+    await hass.async_block_till_done()
+
+    assert adapter.can_read
+    assert set(mqtt.subscriptions) == {TOPIC, f"{TOPIC}/availability"}
+    mqtt.responder = lambda topic, data: mqtt.state(_users(**{"2": "enabled"}))
+    assert (await adapter.add_code(2, "1234")).confirmed
+    adapter.async_stop()
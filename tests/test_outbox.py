@@ -0,0 +1,132 @@
+"""Tests for the durable outbox."""
+from __future__ import annotations
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from custom_components.nimlykoder import outbox as outbox_module
+from custom_components.nimlykoder.const import (
+    OUTBOX_FAILED_KEEP,
+    OUTBOX_MAX_AGE,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_RETRY_BASE,
+    OUTBOX_RETRY_MAX,
+)
+from custom_components.nimlykoder.outbox import NimlykoderOutbox, retry_delay
+
+KEY = "test_outbox"
+PAYLOAD = {"pin_code": {"user": 4, "pin_code": 1234}}
+
+
+def test_retry_delay_backs_off_with_jitter() -> None:
+    """Delays double from the base, cap at the max and keep 50-100% jitter."""
+    for attempts, full in ((1, OUTBOX_RETRY_BASE), (2, OUTBOX_RETRY_BASE * 2)):
+        for _ in range(50):
+            assert full * 0.5 <= retry_delay(attempts) < full
+    for _ in range(50):
+        assert OUTBOX_RETRY_MAX * 0.5 <= retry_delay(30) < OUTBOX_RETRY_MAX
+
+
+class Deliveries:
+    """A deliver callable that fails until told otherwise."""
+
+    def __init__(self) -> None:
+        self.calls: list[tuple[int, str]] = []
+        self.error: Exception | None = RuntimeError("broker down")
+
+    async def __call__(self, slot: int, action: str, payload: dict) -> SimpleNamespace:
+        self.calls.append((slot, action))
+        if self.error is not None:
+            raise self.error
+        return SimpleNamespace(timed_out=False)
+
+
+async def _outbox(hass, deliver: Deliveries) -> NimlykoderOutbox:
+    outbox = NimlykoderOutbox(hass, deliver, key=KEY)
+    await outbox.async_load()
+    # Retry on demand rather than on the start timer
+    outbox._started = True
+    return outbox
+
+
+async def _retry_now(outbox: NimlykoderOutbox, slot: int) -> None:
+    outbox.pending(slot).next_attempt = 0
+    await outbox.async_retry_due()
+
+
+async def test_delivery_removes_item(hass, memory_store) -> None:
+    """A delivered command leaves the outbox and the PIN leaves storage."""
+    deliver = Deliveries()
+    outbox = await _outbox(hass, deliver)
+    await outbox.async_enqueue(4, "add", PAYLOAD, "not confirmed by lock")
+    assert memory_store[KEY]["items"][0]["payload"] == PAYLOAD
+
+    deliver.error = None
+    await _retry_now(outbox, 4)
+
+    assert outbox.depth == 0
+    assert memory_store[KEY]["items"] == []
+    assert outbox.metrics()["delivered"] == 1
+    outbox.async_stop()
+
+
+async def test_gives_up_after_max_attempts(hass, memory_store) -> None:
+    """A command that keeps failing is dead-lettered without its PIN."""
+    deliver = Deliveries()
+    outbox = await _outbox(hass, deliver)
+    await outbox.async_enqueue(4, "add", PAYLOAD, "lock offline")
+
+    for _ in range(OUTBOX_MAX_ATTEMPTS - 1):
+        await _retry_now(outbox, 4)
+
+    assert outbox.pending(4) is None
+    assert len(deliver.calls) == OUTBOX_MAX_ATTEMPTS - 1
+    saved = memory_store[KEY]
+    assert saved["items"] == []
+    assert saved["failed"][0]["slot"] == 4
+    assert saved["failed"][0]["attempts"] == OUTBOX_MAX_ATTEMPTS
+    assert "payload" not in saved["failed"][0]
+    metrics = outbox.metrics()
+    assert metrics["failed_count"] == 1
+    assert metrics["failed"][0]["last_error"] == "broker down"
+
+    # Survives a restart, and a newer command for the slot clears it
+    outbox.async_stop()
+    outbox = await _outbox(hass, deliver)
+    assert outbox.metrics()["failed_count"] == 1
+    await outbox.async_discard(4)
+    assert outbox.metrics()["failed_count"] == 0
+    assert memory_store[KEY]["failed"] == []
+    outbox.async_stop()
+
+
+async def test_gives_up_after_max_age(hass, memory_store) -> None:
+    """A command older than the age limit gets no further retries."""
+    deliver = Deliveries()
+    outbox = await _outbox(hass, deliver)
+    await outbox.async_enqueue(4, "remove", PAYLOAD, "lock offline")
+    outbox.pending(4).created = time.time() - OUTBOX_MAX_AGE
+
+    await _retry_now(outbox, 4)
+
+    assert outbox.depth == 0
+    assert outbox.metrics()["failed"][0]["action"] == "remove"
+    outbox.async_stop()
+
+
+async def test_failed_records_are_capped(hass, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Only the most recent failures are kept."""
+    monkeypatch.setattr(outbox_module, "OUTBOX_MAX_ATTEMPTS", 2)
+    deliver = Deliveries()
+    outbox = await _outbox(hass, deliver)
+
+    for slot in range(OUTBOX_FAILED_KEEP + 5):
+        await outbox.async_enqueue(slot, "add", PAYLOAD, "lock offline")
+        await _retry_now(outbox, slot)
+
+    failed = outbox.metrics()["failed"]
+    assert len(failed) == OUTBOX_FAILED_KEEP
+    assert failed[-1]["slot"] == OUTBOX_FAILED_KEEP + 4
+    outbox.async_stop()
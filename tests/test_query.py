@@ -0,0 +1,155 @@
+"""Tests for list queries and cursors."""
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import voluptuous as vol
+
+from custom_components.nimlykoder.const import TYPE_GUEST, TYPE_PERMANENT
+from custom_components.nimlykoder.manager import CodeOperationError
+from custom_components.nimlykoder.query import (
+    QUERY_SCHEMA,
+    CodeQuery,
+    decode_cursor,
+    encode_cursor,
+    run_query,
+)
+from custom_components.nimlykoder.storage import NimlykoderStorage, fold_name
+
+NOW = datetime(2024, 6, 1, 12, 0, tzinfo=timezone.utc)
+NAMES = ["Anna", "bob", "Åsa", "carl", "Dora"]
+
+
+@pytest.mark.parametrize(
+    "sort,key",
+    [("slot", (4,)), ("name", ("asa", 7)), ("expiry", (0, 1717243200.5, 9))],
+)
+def test_cursor_round_trip(sort: str, key: tuple) -> None:
+    """A cursor decodes to the sort order and key it was made from."""
+    assert decode_cursor(encode_cursor(sort, key)) == (sort, *key)
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not base64!",
+        encode_cursor("slot", ("4",)),
+        encode_cursor("name", (3,)),
+        encode_cursor("size", (3,)),
+        "e30=",  # {}
+    ],
+)
+def test_invalid_cursors_are_rejected(cursor: str) -> None:
+    """Malformed cursors fail validation instead of reaching the indexes."""
+    with pytest.raises(vol.Invalid):
+        decode_cursor(cursor)
+
+
+def test_cursor_of_another_sort_order() -> None:
+    """A cursor only resumes the sort order it came from."""
+    data = vol.Schema(QUERY_SCHEMA)(
+        {"sort": "name", "cursor": encode_cursor("slot", (4,))}
+    )
+    with pytest.raises(CodeOperationError) as err:
+        CodeQuery.from_data(data)
+    assert err.value.code == "invalid_input"
+
+
+def test_plain_listing_is_not_a_query() -> None:
+    """Without query fields the caller lists everything."""
+    assert CodeQuery.from_data({"since_revision": 3}) is None
+
+
+async def _storage(hass) -> NimlykoderStorage:
+    storage = NimlykoderStorage(hass, save_delay=0, key="test_codes")
+    await storage.async_load()
+    for slot in range(1, 41):
+        name = f"{NAMES[slot % len(NAMES)]} {slot}"
+        if slot % 3 == 0:
+            expiry = (NOW + timedelta(hours=(slot * 7) % 48 - 24)).isoformat()
+            await storage.add(slot, name, TYPE_GUEST, expiry)
+        else:
+            await storage.add(slot, name, TYPE_PERMANENT)
+    await storage.remove(11)
+    return storage
+
+
+def _expected(storage: NimlykoderStorage, filters: dict, sort: str) -> list[int]:
+    """Answer a query by walking every entry."""
+    slots = []
+    for entry in storage.list_entries():
+        expires_at = storage.expires_at(entry.slot)
+        expired = expires_at is not None and expires_at <= NOW
+        if "type" in filters and entry.type != filters["type"]:
+            continue
+        if "expired" in filters and expired != filters["expired"]:
+            continue
+        if "expiring_within" in filters and not (
+            expires_at is not None
+            and NOW < expires_at <= NOW + timedelta(seconds=filters["expiring_within"])
+        ):
+            continue
+        if "name" in filters and fold_name(filters["name"]) not in fold_name(entry.name):
+            continue
+        slots.append(entry.slot)
+    if sort == "name":
+        slots.sort(key=lambda slot: (fold_name(storage.get(slot).name), slot))
+    elif sort == "expiry":
+        slots.sort(
+            key=lambda slot: (
+                storage.expires_at(slot) is None,
+                storage.expires_at(slot) or NOW,
+                slot,
+            )
+        )
+    return slots
+
+
+@pytest.mark.parametrize("sort", ["slot", "name", "expiry"])
+@pytest.mark.parametrize(
+    "filters",
+    [
+        {},
+        {"type": TYPE_GUEST},
+        {"expired": True},
+        {"expired": False},
+        {"expiring_within": 6 * 3600},
+        {"name": "a"},
+        {"type": TYPE_PERMANENT, "name": "ASA"},
+    ],
+)
+async def test_paged_query_matches_full_scan(hass, sort: str, filters: dict) -> None:
+    """Following next_cursor returns every match once, in order."""
+    storage = await _storage(hass)
+    schema = vol.Schema(QUERY_SCHEMA)
+
+    slots: list[int] = []
+    cursor = None
+    while True:
+        data = {"filter": filters, "sort": sort, "limit": 4}
+        if cursor is not None:
+            data["cursor"] = cursor
+        result = run_query(storage, CodeQuery.from_data(schema(data)), NOW)
+        assert len(result["codes"]) <= 4
+        slots += [code["slot"] for code in result["codes"]]
+        if (cursor := result["next_cursor"]) is None:
+            break
+
+    assert slots == _expected(storage, filters, sort)
+
+
+async def test_projection_and_not_modified(hass) -> None:
+    """Fields limit what is returned; the current revision is not_modified."""
+    storage = await _storage(hass)
+    query = CodeQuery.from_data({"fields": ["name"], "limit": 2})
+
+    result = run_query(storage, query, NOW)
+    assert result["codes"] == [
+        {"slot": 1, "name": "bob 1"},
+        {"slot": 2, "name": "Åsa 2"},
+    ]
+    assert run_query(storage, query, NOW, storage.revision) == {
+        "revision": storage.revision,
+        "not_modified": True,
+    }
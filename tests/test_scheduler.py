@@ -0,0 +1,62 @@
+"""Tests for the expiry scheduler."""
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from custom_components.nimlykoder import scheduler as scheduler_module
+from custom_components.nimlykoder.cleanup import cleanup_offset
+from custom_components.nimlykoder.scheduler import ExpiryScheduler
+
+NOW = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+MIDNIGHT = datetime(2026, 1, 2, 0, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def armed(monkeypatch: pytest.MonkeyPatch) -> list[datetime]:
+    """Record the instants timers are armed for instead of arming them."""
+    instants: list[datetime] = []
+
+    def track_point_in_time(hass, action, point_in_time):
+        instants.append(point_in_time)
+        return lambda: None
+
+    monkeypatch.setattr(
+        scheduler_module, "async_track_point_in_time", track_point_in_time
+    )
+    monkeypatch.setattr(scheduler_module.dt_util, "now", lambda: NOW)
+    return instants
+
+
+def _scheduler(hass, offset: float, jitter: float = 0) -> ExpiryScheduler:
+    storage = SimpleNamespace(next_expiry=lambda: MIDNIGHT)
+    scheduler = ExpiryScheduler(
+        hass, storage, lambda: None, offset=offset, jitter=jitter
+    )
+    scheduler._started = True
+    return scheduler
+
+
+async def test_locks_fire_at_their_own_offset(hass, armed: list[datetime]) -> None:
+    """Codes expiring at the same instant on two locks are removed apart."""
+    offsets = [cleanup_offset(entry_id, 1800) for entry_id in ("entry_a", "entry_b")]
+    assert offsets[0] != offsets[1]
+
+    for offset in offsets:
+        _scheduler(hass, offset)._async_arm()
+
+    assert armed == [MIDNIGHT + timedelta(seconds=offset) for offset in offsets]
+
+
+async def test_jitter_delays_within_bound(hass, armed: list[datetime]) -> None:
+    """The random jitter only ever adds up to `jitter` seconds."""
+    scheduler = _scheduler(hass, 60, jitter=5)
+    for _ in range(20):
+        scheduler._async_arm()
+
+    for instant in armed:
+        assert MIDNIGHT + timedelta(seconds=60) <= instant
+        assert instant <= MIDNIGHT + timedelta(seconds=65)
+    assert scheduler.next_run == armed[-1]
@@ -0,0 +1,81 @@
+"""Tests for the code storage."""
+from __future__ import annotations
+
+from custom_components.nimlykoder.const import TYPE_PERMANENT
+from custom_components.nimlykoder.storage import NimlykoderStorage
+
+
+async def _storage(hass) -> NimlykoderStorage:
+    storage = NimlykoderStorage(hass, save_delay=0, key="test_codes")
+    await storage.async_load()
+    return storage
+
+
+async def test_list_since_returns_copies(hass) -> None:
+    """Codes handed out by list_since do not alias the cached list."""
+    storage = await _storage(hass)
+    await storage.add(1, "Alice", TYPE_PERMANENT)
+
+    listing = storage.list_since()
+    listing["codes"][0]["name"] = "Mallory"
+    listing["codes"].clear()
+
+    assert storage.list_dicts()[0]["name"] == "Alice"
+    assert storage.list_since()["codes"][0]["name"] == "Alice"
+
+
+async def test_changes_since(hass) -> None:
+    """Changes after a revision are the changed entries and removed slots."""
+    storage = await _storage(hass)
+    await storage.add(1, "Alice", TYPE_PERMANENT)
+    await storage.add(2, "Bob", TYPE_PERMANENT)
+    start = storage.revision
+
+    await storage.update_name(1, "Alicia")
+    await storage.remove(2)
+    await storage.add(3, "Carol", TYPE_PERMANENT)
+
+    changed, removed = storage.changes_since(start)
+    assert [(entry["slot"], entry["name"]) for entry in changed] == [
+        (1, "Alicia"),
+        (3, "Carol"),
+    ]
+    assert removed == [2]
+    assert storage.changes_since(storage.revision) == ([], [])
+    assert storage.list_since(storage.revision) == {
+        "revision": storage.revision,
+        "not_modified": True,
+    }
+    # Ahead of storage: unknown
+    assert storage.changes_since(storage.revision + 1) is None
+
+
+async def test_revisions_are_not_reused_after_a_lost_write(hass) -> None:
+    """A crash that loses the last write does not repeat revisions."""
+    storage = NimlykoderStorage(hass, save_delay=10, key="test_codes")
+    await storage.async_load()
+    await storage.add(1, "Alice", TYPE_PERMANENT)
+    seen = storage.revision
+    # The delayed write never happens; restart from disk
+    storage = NimlykoderStorage(hass, save_delay=10, key="test_codes")
+    await storage.async_load()
+    await storage.add(1, "Mallory", TYPE_PERMANENT)
+
+    assert storage.revision != seen
+    assert storage.revision > seen
+    assert storage.changes_since(seen) is None
+    listing = storage.list_since(seen)
+    assert [code["name"] for code in listing["codes"]] == ["Mallory"]
+
+
+async def test_tokens_from_an_earlier_load_get_a_full_listing(hass) -> None:
+    """A revision handed out before a restart is answered with everything."""
+    storage = await _storage(hass)
+    await storage.add(1, "Alice", TYPE_PERMANENT)
+    before = storage.revision
+
+    storage = await _storage(hass)
+
+    assert storage.revision > before
+    assert "codes" in storage.list_since(before)
+    assert "codes" in storage.list_since(storage.revision - 1)